@@ -0,0 +1,10 @@
+# Benchmarks for the NFS QA checks
+#
+#   generate_csv.py - creates synthetic National Farm Survey csv files of any size
+#   run_benchmarks.py - times the main processing stages on the generated files and saves or compares a JSON baseline
+#
+#   Run from the directory containing nfs_document_checks.py, e.g.
+#       python -m benchmarks.generate_csv 10000 processing/synthetic.csv
+#       python -m benchmarks.run_benchmarks --sizes 1000 10000 --save benchmarks/baseline.json
+#       python -m benchmarks.run_benchmarks --sizes 1000 10000 --compare benchmarks/baseline.json
+#
@@ -0,0 +1,120 @@
+# Check that the persistent cache isn't reused across versions of the alignment and diff engines
+#
+#   For each alternative engine (the "dp" alignment engine and the "rapidfuzz" diff engine) the example values in
+#   fixtures.py are combined with component_compare into a new persistent cache. The cache is then reopened and the
+#   values combined again, which should find every result in the cache. The version of the engine in ENGINE_VERSIONS
+#   is then bumped and the cache reopened, which should find none of them, so that results from an older version of
+#   an engine are never reused. Changing the engine while the cache is open is checked in the same way. The
+#   engines, engine versions and caches are put back afterwards.
+#
+#   Usage: python -m benchmarks.check_cache_versions
+#
+
+# Functions:
+#   combine_examples()
+#   check_engine(cache_file, engine_type, engine)
+#   main()
+
+import contextlib, io, sys, tempfile
+from pathlib import Path
+from tabulate import tabulate
+
+import data_normalisation as dn
+from benchmarks import fixtures
+
+# Examples from fixtures.py combined into the cache
+EXAMPLE_GROUPS = ["names1", "names2", "names3", "address", "farm_name", "test", "test2", "test3"]
+
+# Function used to choose each type of engine
+ENGINE_SETTERS = {"alignment": dn.set_alignment_engine, "diff": dn.set_diff_engine}
+
+
+def combine_examples():
+    ''' Combines the example values with an empty in-memory cache, so that every result is either found in the persistent cache or worked out again
+
+        Returns:
+            Dictionary with the number of persistent cache hits and misses
+    '''
+
+    dn.clear_cache()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        for name in EXAMPLE_GROUPS:
+            dn.component_compare(getattr(fixtures, name))
+
+    info = dn.cache_info()["persistent"]
+    return {"hits": info["hits"], "misses": info["misses"]}
+
+
+def check_engine(cache_file, engine_type, engine):
+    ''' Fills a cache using an engine and checks that it is reused by the same version of the engine and not by a new version of it or by the default engine
+
+        Keyword Arguments:
+            cache_file - path to the SQLite file, which is removed first
+            engine_type - string with the type of engine: "alignment" or "diff"
+            engine - string with the name of the engine
+
+        Returns:
+            List of [engine, check, hits, misses, passed] for each check
+    '''
+
+    original_version = dn.ENGINE_VERSIONS.get(engine, "1")
+    default_engine = dn.ALIGNMENT_ENGINES[0] if engine_type == "alignment" else dn.DIFF_ENGINES[0]
+    results = []
+
+    if Path(cache_file).exists():
+        Path(cache_file).unlink()
+
+    try:
+        ENGINE_SETTERS[engine_type](engine)
+        dn.use_persistent_cache(cache_file)
+        cold = combine_examples()
+        results.append([engine, "new cache", cold["hits"], cold["misses"], cold["misses"] > 0])
+
+        dn.use_persistent_cache(cache_file)
+        warm = combine_examples()
+        results.append([engine, "reopened", warm["hits"], warm["misses"], warm["misses"] == 0 and warm["hits"] > 0])
+
+        dn.ENGINE_VERSIONS[engine] = original_version + ".check"
+        dn.use_persistent_cache(cache_file)
+        bumped = combine_examples()
+        results.append([engine, "engine version bumped", bumped["hits"], bumped["misses"], bumped["hits"] == 0])
+
+        # changing the engine with the cache open
+        ENGINE_SETTERS[engine_type](default_engine)
+        ENGINE_SETTERS[engine_type](engine)
+        switched = combine_examples()
+        results.append([engine, "engine changed while open", switched["hits"], switched["misses"], switched["hits"] == 0])
+    finally:
+        dn.ENGINE_VERSIONS[engine] = original_version
+        dn.close_persistent_cache()
+        ENGINE_SETTERS[engine_type](default_engine)
+        dn.clear_cache()
+
+    return results
+
+
+def main():
+    ''' Runs the checks from the command line
+
+        Returns:
+            Integer exit code, 1 if any check failed otherwise 0
+    '''
+
+    table = []
+
+    with tempfile.TemporaryDirectory() as work_folder:
+        cache_file = Path(work_folder, "normalisation_cache.sqlite")
+        table += check_engine(cache_file, "alignment", "dp")
+        table += check_engine(cache_file, "diff", "rapidfuzz")
+
+    print(tabulate(table, headers=["engine", "check", "persistent hits", "persistent misses", "passed"], tablefmt="grid"))
+
+    if False in [row[-1] for row in table]:
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
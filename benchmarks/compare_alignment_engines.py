@@ -0,0 +1,123 @@
+# Compare the alignment engines used by get_match_matrix
+#
+#   Builds a corpus of farm name, landowner, farmer and addressee variations from a synthetic csv file (see
+#   generate_csv.py) and the example values in fixtures.py, and combines each group with more than one distinct value
+#   using component_compare with each engine in data_normalisation.ALIGNMENT_ENGINES. The results of each engine are
+#   compared with the "anchor" engine and checked for malformed mark up with data_normalisation.is_well_formed: a
+#   bracket opened inside another addition (e.g. "((Near?) Gloucester?)"), brackets that aren't closed and empty
+#   additions (a "(?)" that doesn't follow alternatives such as "Burrows/Burroughs(?)"). Groups with brackets in the
+#   variations themselves (e.g. "(bailiff to J S Gibbons)") aren't checked for malformed mark up. The "dp" engine
+#   lines up the words differently from the anchor points, so the results are expected to differ, but it should never
+#   give malformed mark up.
+#
+#   Usage: python -m benchmarks.compare_alignment_engines [--rows 1000] [--seed 1] [--examples 10]
+#
+
+# Functions:
+#   build_groups(csv_file)
+#   compare_engines(groups, example_total=10)
+#   main()
+
+import argparse, contextlib, io, sys, tempfile, time
+from pathlib import Path
+from tabulate import tabulate
+
+import data_normalisation as dn
+from benchmarks import fixtures
+from benchmarks.generate_csv import generate_csv
+from benchmarks.run_benchmarks import collect_normalisation_inputs
+
+# Examples from fixtures.py added to the corpus
+EXAMPLE_GROUPS = ["names1", "names2", "names3", "address", "farm_name", "test", "test2", "test3"]
+
+
+def build_groups(csv_file):
+    ''' Gets the groups of variations to combine. Only groups with more than one distinct value are kept, as the others are never passed to the alignment engines.
+
+        Keyword Arguments:
+            csv_file - path to the generated csv file
+
+        Returns:
+            List of lists of variations, in the order they were found
+    '''
+
+    groups = list(collect_normalisation_inputs(csv_file)["component_groups"].values())
+
+    for name in EXAMPLE_GROUPS:
+        groups += list(getattr(fixtures, name).values())
+
+    return [component_list for component_list in groups if len(set([component for component in component_list if (component.strip() != "" and component.strip() != "*")])) > 1]
+
+
+def compare_engines(groups, example_total=10):
+    ''' Combines the groups with each engine and compares the results with the anchor engine, printing a table of the malformed values, differences and times and some examples of the malformed values
+
+        Keyword Arguments:
+            groups - list of lists of variations
+            example_total - optional integer with the number of malformed values to print for each engine, 10 by default
+
+        Returns:
+            Dictionary with the number of malformed values for each engine
+    '''
+
+    original_engine = dn.ALIGNMENT_ENGINE
+    checked = [i for i in range(0, len(groups)) if "(" not in "".join(groups[i]) and ")" not in "".join(groups[i])]
+    results = {}
+    table = []
+    malformed = {}
+
+    try:
+        for engine in dn.ALIGNMENT_ENGINES:
+            dn.set_alignment_engine(engine)
+            dn.clear_cache()
+
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                results[engine] = [dn.component_compare({"group": component_list})[0]["group"] for component_list in groups]
+            engine_time = time.perf_counter() - start
+
+            malformed_values = [i for i in checked if not dn.is_well_formed(results[engine][i])]
+            differences = [i for i in range(0, len(groups)) if results[engine][i] != results["anchor"][i]]
+            malformed[engine] = len(malformed_values)
+            table.append([engine, len(groups), len(malformed_values), len(differences), engine_time])
+
+            for i in malformed_values[:example_total]:
+                print(engine + ": " + str(groups[i]) + " -> " + results[engine][i])
+    finally:
+        dn.set_alignment_engine(original_engine)
+        dn.clear_cache()
+
+    print(tabulate(table, headers=["engine", "groups", "malformed values", "differences from anchor", "seconds"], floatfmt=".3f", tablefmt="grid"))
+
+    return malformed
+
+
+def main():
+    ''' Runs the comparison from the command line
+
+        Returns:
+            Integer exit code, 1 if the dp engine gave malformed mark up for any group otherwise 0
+    '''
+
+    parser = argparse.ArgumentParser(description="Compare the alignment engines used by get_match_matrix with the anchor engine")
+    parser.add_argument("--rows", type=int, default=1000, help="number of rows in the generated csv file")
+    parser.add_argument("--seed", type=int, default=1, help="seed for the generated csv file")
+    parser.add_argument("--examples", type=int, default=10, help="number of malformed values to print for each engine")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_folder:
+        csv_file = Path(work_folder, "alignment_corpus.csv")
+        generate_csv(csv_file, args.rows, args.seed)
+        groups = build_groups(csv_file)
+
+    print("Comparing " + str(len(groups)) + " groups")
+    malformed = compare_engines(groups, args.examples)
+
+    if malformed.get("dp", 0) > 0:
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
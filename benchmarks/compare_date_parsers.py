@@ -0,0 +1,182 @@
+# Compare the date parser used by date_check with the original date_check code
+#
+#   Builds a synthetic date column (see generate_csv.generate_date, which gives the layouts found in the transcriptions
+#   including some that aren't valid) and checks it with the original step by step date_check, with date_check one row
+#   at a time and with date_check_column in one go. The dates and warnings should be the same for every row. The
+#   date cache is cleared before each timed run so the times include parsing each distinct date once.
+#
+#   Usage: python -m benchmarks.compare_date_parsers [--rows 100000] [--seed 1] [--repeat 3]
+#
+
+# Functions:
+#   build_date_column(rows, seed=1)
+#   original_date_check(potential_date, row_num)
+#   compare_parsers(dates, repeat=3)
+#   main()
+
+import argparse, datetime, random, sys, time
+from tabulate import tabulate
+
+import date_parsing as dp
+import nfs_document_checks as nfs
+import nfs_warnings as nw
+from benchmarks.generate_csv import generate_date
+
+# Dates that aren't given by generate_date but can be found in the transcriptions
+EXTRA_DATES = ["1941", "5-6-1941", "05/05/41", "5 Sept 1941", "5 MAY 1941", "31 June 1941", "5 May 19411", "5 13 1941", "0 May 1941", "5 may 041", " 5 May 1941 ", "5 June-1941"]
+
+
+def build_date_column(rows, seed=1):
+    ''' Creates the dates to check, leaving out the blank values that date_processing doesn't check
+
+        Keyword Arguments:
+            rows - integer with the number of dates
+            seed - optional integer used to seed the random values, 1 by default
+
+        Returns:
+            List of date strings
+    '''
+
+    rng = random.Random(seed)
+    dates = []
+
+    while len(dates) < rows:
+        date = generate_date(rng) if rng.random() < 0.99 else rng.choice(EXTRA_DATES)
+        if date != "" and date != "*":
+            dates.append(date)
+
+    return dates
+
+
+def original_date_check(potential_date, row_num):
+    ''' date_check as it was before the date parser was added
+
+        Keyword Arguments:
+            potential_date - string containing the date value for checking
+            row_num - string with the number of the row in the source spreadsheet
+
+        Returns:
+            Tuple with either the date as a date object or the original string if it isn't a valid date and a set with any NFSWarning
+    '''
+
+    warnings = set()
+    potential_date = potential_date.strip()
+
+    try:
+        if "-" in potential_date:
+            day = int(potential_date.split("-")[0])
+            month = potential_date.split("-")[1]
+            year = potential_date.split("-")[2]
+        elif " " in potential_date:
+            day = int(potential_date.split(" ")[0])
+            month = potential_date.split(" ")[1]
+            year = potential_date.split(" ")[2]
+        elif "/" in potential_date:
+            day = int(potential_date.split("/")[0])
+            month = potential_date.split("/")[1]
+            year = potential_date.split("/")[2]
+        else:
+            raise ValueError("Date format not recognized")
+
+    except ValueError as ve:
+        warnings.add(nw.make_warning("DATE_FORMAT", potential_date, str(ve), row=row_num))
+        return (potential_date, warnings)
+
+    if len(year) == 2:
+        year = int(year)
+        year += 1900
+    elif len(year) != 4:
+        warnings.add(nw.make_warning("DATE_RANGE", potential_date, row=row_num))
+
+    year = int(year)
+
+    if month.isdigit():
+        month_number = int(month)
+    else:
+        try:
+            month_number = datetime.datetime.strptime(month, '%B').month
+        except ValueError as ve:
+            try:
+                month_number = datetime.datetime.strptime(month, '%b').month
+            except ValueError as ve:
+                month_number = 0
+
+            warnings.add(nw.make_warning("MONTH_FORMAT", month, row=row_num))
+
+    try:
+        date = datetime.datetime(year=year,month=month_number,day=int(day))
+    except ValueError as ve:
+        warnings.add(nw.make_warning("DATE_FORMAT", potential_date, str(ve), row=row_num))
+        date = potential_date
+
+    return (date, warnings)
+
+
+def compare_parsers(dates, repeat=3):
+    ''' Checks the dates with each parser, prints a table of the best time for each and compares the results with the original date_check
+
+        Keyword Arguments:
+            dates - list of date strings
+            repeat - optional integer with the number of times each parser is timed, 3 by default
+
+        Returns:
+            Integer with the number of dates with a different result to the original date_check
+    '''
+
+    row_nums = [str(row_num) for row_num in range(2, len(dates) + 2)]
+
+    parsers = [("original date_check", lambda: [original_date_check(date, row_num) for date, row_num in zip(dates, row_nums)]),
+               ("date_check", lambda: [nfs.date_check(date, row_num) for date, row_num in zip(dates, row_nums)]),
+               ("date_check_column", lambda: nfs.date_check_column(dates, row_nums))]
+
+    table = []
+    results = {}
+
+    for name, parser in parsers:
+        best_time = None
+        for i in range(0, repeat):
+            dp.clear_cache()
+            start = time.perf_counter()
+            results[name] = parser()
+            run_time = time.perf_counter() - start
+            if best_time is None or run_time < best_time:
+                best_time = run_time
+        table.append([name, len(dates), best_time, best_time * 1000000 / len(dates)])
+
+    mismatches = 0
+    for name, parser in parsers[1:]:
+        parser_mismatches = [i for i in range(0, len(dates)) if results[name][i] != results[parsers[0][0]][i]]
+        mismatches += len(parser_mismatches)
+        for i in parser_mismatches[:10]:
+            print(name + ": '" + dates[i] + "': " + str(results[parsers[0][0]][i]) + " -> " + str(results[name][i]))
+
+    print("Distinct dates: " + str(len(set(dates))))
+    print(tabulate(table, headers=["parser", "dates", "seconds", "us per date"], floatfmt=".3f", tablefmt="grid"))
+
+    return mismatches
+
+
+def main():
+    ''' Runs the comparison from the command line
+
+        Returns:
+            Integer exit code, 1 if any date gave a different result to the original date_check otherwise 0
+    '''
+
+    parser = argparse.ArgumentParser(description="Compare the date parser used by date_check with the original date_check code")
+    parser.add_argument("--rows", type=int, default=100000, help="number of dates in the column")
+    parser.add_argument("--seed", type=int, default=1, help="seed for the generated dates")
+    parser.add_argument("--repeat", type=int, default=3, help="number of times each parser is timed")
+    args = parser.parse_args()
+
+    mismatches = compare_parsers(build_date_column(args.rows, args.seed), args.repeat)
+
+    if mismatches > 0:
+        print(str(mismatches) + " dates with a different result")
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
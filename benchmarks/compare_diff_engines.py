@@ -0,0 +1,161 @@
+# Compare the diff engines used by combine_two_words with difflib.Differ
+#
+#   Builds a corpus of pairs of similar values from a synthetic csv file (see generate_csv.py) and the example values
+#   in fixtures.py: each pair of variations of a farm name, landowner, farmer or addressee, and each pair of
+#   similar words from them. For each engine in data_normalisation.DIFF_ENGINES the pairs are run through
+#   get_letter_diff and combine_two_words, and the results are compared with the ones given by the original
+#   difflib.Differ code. The "difflib" engine should match for every pair. The "rapidfuzz" engine moves the letters
+#   around doubled letters and repeated words to where difflib puts them, but difflib doesn't always find the most
+#   letters in common, so some pairs still differ (123 of the 7441 pairs with the default options).
+#
+#   Usage: python -m benchmarks.compare_diff_engines [--rows 5000] [--seed 1] [--examples 10]
+#
+
+# Functions:
+#   build_corpus(csv_file)
+#   differ_letter_diff(component1, component2)
+#   compare_engines(pairs, example_total=10)
+#   main()
+
+import argparse, itertools, sys, tempfile, time
+from pathlib import Path
+from rapidfuzz import fuzz
+from tabulate import tabulate
+
+import data_normalisation as dn
+from benchmarks import fixtures
+from benchmarks.generate_csv import generate_csv
+from benchmarks.run_benchmarks import collect_normalisation_inputs
+
+# Examples from fixtures.py added to the corpus
+EXAMPLE_GROUPS = ["names1", "names2", "names3", "address", "farm_name", "test", "test2", "test3"]
+
+
+def build_corpus(csv_file):
+    ''' Gets the pairs of values to compare. Words are only paired if they are similar enough for combine_two_words to compare them letter by letter.
+
+        Keyword Arguments:
+            csv_file - path to the generated csv file
+
+        Returns:
+            Sorted list of tuples with the two values
+    '''
+
+    groups = list(collect_normalisation_inputs(csv_file)["component_groups"].values())
+
+    for name in EXAMPLE_GROUPS:
+        groups += list(getattr(fixtures, name).values())
+
+    pairs = set()
+
+    for component_list in groups:
+        component_set = set([component.strip() for component in component_list if (component.strip() != "" and component.strip() != "*")])
+
+        for component1, component2 in itertools.combinations(sorted(component_set), 2):
+            pairs.add((component1, component2))
+
+            for word1 in component1.split():
+                for word2 in component2.split():
+                    if word1 != word2 and dn.ratio_check(len(word1), fuzz.ratio(word1, word2)):
+                        pairs.add((word1, word2))
+
+    return sorted(pairs)
+
+
+def differ_letter_diff(component1, component2):
+    ''' The letter by letter differences as worked out by combine_two_words before the diff engines were added
+
+        Keyword Arguments:
+            component1 - string with the first word
+            component2 - string with the second word
+
+        Returns:
+            List of strings, one for each letter
+    '''
+
+    diff = dn.difflib.Differ().compare(component1, component2)
+    return [s.strip() if s[0] == ' ' else '(' + s[-1] + '?)' for s in diff]
+
+
+def compare_engines(pairs, example_total=10):
+    ''' Runs the pairs through each engine and compares the results with difflib.Differ, printing a table of the mismatches and times and some examples of the mismatches
+
+        Keyword Arguments:
+            pairs - list of tuples with the two values
+            example_total - optional integer with the number of mismatches to print for each engine, 10 by default
+
+        Returns:
+            Dictionary with the number of combine_two_words mismatches for each engine
+    '''
+
+    original_engine = dn.DIFF_ENGINE
+    original_letter_diff = dn.get_letter_diff
+
+    start = time.perf_counter()
+    expected_letters = [differ_letter_diff(component1, component2) for component1, component2 in pairs]
+    differ_time = time.perf_counter() - start
+
+    # the original combine_two_words results, with get_letter_diff swapped for the Differ version
+    dn.get_letter_diff = differ_letter_diff
+    try:
+        expected_words = [dn.combine_two_words(component1, component2, {}) for component1, component2 in pairs]
+    finally:
+        dn.get_letter_diff = original_letter_diff
+
+    table = [["difflib.Differ", len(pairs), 0, 0, differ_time]]
+    mismatches = {}
+
+    try:
+        for engine in dn.DIFF_ENGINES:
+            dn.set_diff_engine(engine)
+
+            start = time.perf_counter()
+            letters = [dn.get_letter_diff(component1, component2) for component1, component2 in pairs]
+            engine_time = time.perf_counter() - start
+
+            words = [dn.combine_two_words(component1, component2, {}) for component1, component2 in pairs]
+
+            letter_mismatches = [i for i in range(0, len(pairs)) if letters[i] != expected_letters[i]]
+            word_mismatches = [i for i in range(0, len(pairs)) if words[i] != expected_words[i]]
+            mismatches[engine] = len(word_mismatches)
+            table.append([engine, len(pairs), len(letter_mismatches), len(word_mismatches), engine_time])
+
+            for i in word_mismatches[:example_total]:
+                print(engine + ": '" + pairs[i][0] + "' / '" + pairs[i][1] + "': " + str(expected_words[i][0]) + " -> " + str(words[i][0]))
+    finally:
+        dn.set_diff_engine(original_engine)
+
+    print(tabulate(table, headers=["engine", "pairs", "letter diff mismatches", "combine_two_words mismatches", "letter diff seconds"], floatfmt=".3f", tablefmt="grid"))
+
+    return mismatches
+
+
+def main():
+    ''' Runs the comparison from the command line
+
+        Returns:
+            Integer exit code, 1 if the difflib engine gave a different result to difflib.Differ for any pair otherwise 0
+    '''
+
+    parser = argparse.ArgumentParser(description="Compare the diff engines used by combine_two_words with difflib.Differ")
+    parser.add_argument("--rows", type=int, default=5000, help="number of rows in the generated csv file")
+    parser.add_argument("--seed", type=int, default=1, help="seed for the generated csv file")
+    parser.add_argument("--examples", type=int, default=10, help="number of mismatches to print for each engine")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_folder:
+        csv_file = Path(work_folder, "diff_corpus.csv")
+        generate_csv(csv_file, args.rows, args.seed)
+        pairs = build_corpus(csv_file)
+
+    print("Comparing " + str(len(pairs)) + " pairs")
+    mismatches = compare_engines(pairs, args.examples)
+
+    if mismatches.get("difflib", 0) > 0:
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
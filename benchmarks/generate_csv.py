@@ -0,0 +1,317 @@
+# Generate synthetic National Farm Survey csv files
+#
+#   The rows follow the 24 input columns documented at the top of nfs_document_checks.py. Each MAF 32 box starts with a
+#   cover row and has a run of farms, each with one or more forms (two images per form). Every farm has a farm name,
+#   landowner, farmer and addressee which are repeated on each of its forms, with the same sort of variations between
+#   forms as found in the transcriptions (the names1/names2/test3 examples in data_normalisation.py): spelling
+#   mistakes, initials for first names, punctuation and case differences, shortened or lengthened addresses, and
+#   blanks or asterisks. A small number of rows have additional farms, unexpected document types, odd filenames or
+#   dates in unexpected formats.
+#
+#   Usage: python -m benchmarks.generate_csv <number of rows> <output csv> [seed]
+#
+
+# Functions:
+#   generate_csv(output_file, row_total, seed=1)
+#   generate_rows(row_total, seed=1)
+#   generate_farm(rng)
+#   generate_party(rng, individual)
+#   make_variant(value, rng, value_type)
+#   misspell(word, rng)
+#   generate_date(rng)
+
+import csv, random, sys
+
+INPUT_COLUMNS = ["filename_1", "filename_2", "document_type", "county", "parish", "primary_farm_number", "additional_farms", "farm_name", "addressee_title", "addressee_individual_name", "addressee_group_names", "address", "owner_title", "owner_individual_name", "owner_group_names", "owner_address", "farmer_title", "farmer_individual_name", "farmer_group_names", "farmer_address", "acreage", "OS_map_sheet", "field_info_date", "primary_record_date"]
+
+FORM_TYPES = ["C51/SSY", "B496/EI", "C 47/SSY", "C 49/SSY", "SF", "SF C69/SSY"]
+COUNTIES = ["GL Gloucestershire", "HT Hertfordshire", "DB Derbyshire", "CU Cumberland", "WO Worcestershire"]
+PARISHES = ["Boddington", "Hayden", "Frizington", "South Normanton", "Park Street", "Charlton Kings", "Temple Guiting"]
+
+FIRST_NAMES = ["Harry", "Frank", "George", "Arthur", "William", "Richard", "John", "Charles", "Albert", "Edward", "Mary", "Elizabeth"]
+SHORT_NAMES = {"George": "Geo", "William": "Wm", "Charles": "Chas", "Richard": "Richd", "Elizabeth": "Eliz"}
+SURNAMES = ["Arkell", "Buckle", "Burroughs", "Cook", "Edmunds", "Cooper", "Hinton", "Rymer", "Spragg", "Bowl", "Tombs", "Wilkins", "Bendall", "Thomas", "Stacey", "Griffiths", "Fluck", "Raddy"]
+TITLES = ["Mr", "Mrs", "Miss", "Messrs", "Rev", "Capt"]
+GROUP_NAMES = ["Rowe and Raddy", "Smith Bros", "Executors of the late J Gibbons", "Ecclesiastical Commissioners", "Boddington Estate Co Ltd"]
+FARM_WORDS = ["Hill Top", "Holt", "Park Valley", "Home", "Old Parkbury", "Netherwylde", "Smug Oak", "Millhouse", "Little Munden", "Noke", "Pilgrove", "Whitehall", "Butlers Court", "Barrow Hill", "Brookes Laymes", "Withy Bridge", "Winstall", "Parkside"]
+STREETS = ["London Road", "High Street", "Montpellier Grove", "Foregate Street", "Hayden Hill", "Church Lane"]
+TOWNS = ["Cheltenham", "Worcester", "Alfreton", "St Albans", "Frizington", "Gloucester"]
+MONTHS = ["January", "February", "March", "April", "May", "June", "July", "August", "September", "October", "November", "December"]
+
+
+def generate_csv(output_file, row_total, seed=1):
+    ''' Saves a synthetic csv file with the NFS input columns
+
+        Keyword Arguments:
+            output_file - path to the csv file to be created
+            row_total - integer with the number of rows (not including the heading row) to generate
+            seed - optional integer used to seed the random values, 1 by default. The same seed and row total always give the same file.
+
+        Returns:
+            No return but throws OSError if the file can't be saved
+    '''
+
+    with open(output_file, "w", newline='', encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=INPUT_COLUMNS)
+        writer.writeheader()
+        writer.writerows(generate_rows(row_total, seed))
+
+
+def generate_rows(row_total, seed=1):
+    ''' Generates synthetic rows box by box and farm by farm until the required number of rows has been produced
+
+        Keyword Arguments:
+            row_total - integer with the number of rows to generate
+            seed - optional integer used to seed the random values, 1 by default
+
+        Returns:
+            Generator giving a dictionary for each row with the input column names as keys
+    '''
+
+    rng = random.Random(seed)
+    row_count = 0
+    county_num = 1
+    parish_num = 0
+
+    while row_count < row_total:
+        parish_num += 1
+        if parish_num > 60:
+            county_num += 1
+            parish_num = 1
+
+        box = str(county_num) + "-" + str(parish_num)
+        county = rng.choice(COUNTIES)
+        parish = str(parish_num) + " " + rng.choice(PARISHES)
+        image_num = 1
+
+        cover = dict.fromkeys(INPUT_COLUMNS, "")
+        cover.update({"filename_1": "MAF32-" + box + ".tif", "document_type": "Cover", "primary_farm_number": "*"})
+        yield cover
+        row_count += 1
+
+        for farm_num in range(1, rng.randint(5, 80) + 1):
+            if row_count >= row_total:
+                return
+
+            farm = generate_farm(rng)
+            additional_farms = ""
+            if rng.random() < 0.03:
+                additional_farms = ";".join(str(farm_num + 100 + i) for i in range(rng.randint(1, 2)))
+
+            for form in rng.sample(FORM_TYPES, rng.choice([1, 2, 2, 3, 3, 3, 4])):
+                if row_count >= row_total:
+                    return
+
+                filename_1 = "MAF32-" + box + "_" + str(image_num) + ".tif"
+                filename_2 = "MAF32-" + box + "_" + str(image_num + 1) + ".tif"
+                image_num += 2
+
+                # occasional problems with the filenames and document type
+                if rng.random() < 0.02:
+                    filename_2 = ""
+                elif rng.random() < 0.01:
+                    filename_2 = "MAF32-" + box + "_" + str(image_num + 3) + ".tif"
+                if rng.random() < 0.005:
+                    form = rng.choice(["C51", "SF form", "Other"])
+
+                row = {"filename_1": filename_1, "filename_2": filename_2, "document_type": form, "county": county, "parish": parish, "primary_farm_number": str(farm_num), "additional_farms": additional_farms}
+                row["farm_name"] = make_variant(farm["farm_name"], rng, "farm_name")
+
+                for party, prefix in [("addressee", "addressee_"), ("owner", "owner_"), ("farmer", "farmer_")]:
+                    details = farm[party]
+                    row[prefix + "title"] = make_variant(details["title"], rng, "title")
+                    row[prefix + "individual_name"] = make_variant(details["individual_name"], rng, "name")
+                    row[prefix + "group_names"] = make_variant(details["group_names"], rng, "group")
+                    address_column = "address" if party == "addressee" else prefix + "address"
+                    row[address_column] = make_variant(details["address"], rng, "address")
+
+                row["acreage"] = farm["acreage"] if rng.random() < 0.95 else farm["acreage"] + ";" + str(rng.randint(1, 300))
+                row["OS_map_sheet"] = farm["os_sheet"] if rng.random() < 0.9 else rng.choice(["", "*"])
+                row["field_info_date"] = generate_date(rng)
+                row["primary_record_date"] = generate_date(rng) if rng.random() < 0.95 else generate_date(rng) + ";" + generate_date(rng)
+
+                yield row
+                row_count += 1
+
+
+def generate_farm(rng):
+    ''' Creates the values for a farm which are then varied slightly on each of its forms
+
+        Keyword Arguments:
+            rng - random.Random instance
+
+        Returns:
+            Dictionary with the farm name, acreage, OS sheet and the details of the addressee, owner and farmer
+    '''
+
+    farm = {"farm_name": rng.choice(FARM_WORDS) + rng.choice([" Farm", " Farm", " Manor", ""])}
+    farm["acreage"] = str(round(rng.uniform(1, 400), rng.choice([0, 1, 2])))
+    farm["os_sheet"] = str(rng.randint(1, 60)) + "/" + str(rng.randint(1, 16))
+
+    farm["farmer"] = generate_party(rng, True)
+    # the owner and addressee are often the farmer
+    farm["owner"] = farm["farmer"] if rng.random() < 0.4 else generate_party(rng, rng.random() < 0.8)
+    farm["addressee"] = farm["farmer"] if rng.random() < 0.7 else dict(farm["owner"])
+
+    return farm
+
+
+def generate_party(rng, individual):
+    ''' Creates the title, name, group names and address for a landowner, farmer or addressee
+
+        Keyword Arguments:
+            rng - random.Random instance
+            individual - boolean. If True an individual name is created, otherwise group names are used
+
+        Returns:
+            Dictionary with the title, individual_name, group_names and address values
+    '''
+
+    if individual:
+        first_names = rng.sample(FIRST_NAMES, rng.choice([1, 1, 2]))
+        name = " ".join(first_names) + " " + rng.choice(SURNAMES)
+        if rng.random() < 0.02:
+            name += " (bailiff to " + rng.choice(FIRST_NAMES)[0] + " " + rng.choice(SURNAMES) + ")"
+        party = {"title": rng.choice(TITLES[:3]), "individual_name": name, "group_names": ""}
+    else:
+        party = {"title": rng.choice(["Messrs", ""]), "individual_name": "", "group_names": ";".join(rng.sample(GROUP_NAMES, rng.choice([1, 1, 2])))}
+
+    address_parts = []
+    if rng.random() < 0.1:
+        address_parts.append("c/o Mr " + rng.choice(FIRST_NAMES)[0] + " " + rng.choice(SURNAMES))
+    if rng.random() < 0.6:
+        address_parts.append(rng.choice(FARM_WORDS) + " Farm")
+    else:
+        address_parts.append(str(rng.randint(1, 200)) + " " + rng.choice(STREETS))
+    address_parts.append(rng.choice(PARISHES))
+    address_parts.append(rng.choice(["Near ", ""]) + rng.choice(TOWNS))
+    if rng.random() < 0.5:
+        address_parts.append(rng.choice(COUNTIES).split(" ", 1)[1])
+    party["address"] = ", ".join(address_parts)
+
+    return party
+
+
+def make_variant(value, rng, value_type):
+    ''' Returns the value as it might have been transcribed from one of the forms. Most of the time the value is unchanged.
+
+        Keyword Arguments:
+            value - string with the value for the farm
+            rng - random.Random instance
+            value_type - string with the type of value: "farm_name", "title", "name", "group" or "address"
+
+        Returns:
+            String with the transcribed value
+    '''
+
+    chance = rng.random()
+
+    if chance < 0.06:
+        return rng.choice(["", "*"])
+    elif chance < 0.75 or value == "":
+        return value
+
+    words = value.split(" ")
+
+    if value_type == "title":
+        return rng.choice([value + ".", value.upper(), rng.choice(TITLES)])
+    elif value_type == "name":
+        variation = rng.randint(1, 4)
+        if variation == 1:
+            # first names as initials (e.g. George Wilkins / G Wilkins), sometimes with full stops
+            stop = rng.choice(["", "."])
+            return " ".join([word[0] + stop if word in FIRST_NAMES else word for word in words])
+        elif variation == 2:
+            return " ".join([SHORT_NAMES.get(word, word) for word in words])
+        elif variation == 3:
+            words[-1] = misspell(words[-1], rng)
+            return " ".join(words)
+        else:
+            return rng.choice(TITLES[:3]) + " " + value
+    elif value_type == "group":
+        return value.replace(" and ", " & ") if rng.random() < 0.5 else misspell(value, rng)
+    elif value_type == "farm_name":
+        variation = rng.randint(1, 4)
+        if variation == 1:
+            return value.lower().capitalize()
+        elif variation == 2:
+            return value.replace(" ", "", 1)
+        elif variation == 3:
+            return value.replace(" Farm", "") if " Farm" in value else value + " Farm"
+        else:
+            return misspell(value, rng)
+    else:
+        parts = value.split(", ")
+        variation = rng.randint(1, 4)
+        if variation == 1 and len(parts) > 2:
+            return ", ".join(parts[:-1])
+        elif variation == 2:
+            return ", ".join(parts + [rng.choice(["Gloucestershire", "Near " + rng.choice(TOWNS)])])
+        elif variation == 3:
+            return ", ".join([part.replace(" Farm", "") for part in parts])
+        else:
+            return misspell(value, rng)
+
+
+def misspell(word, rng):
+    ''' Adds a single spelling mistake to the string by dropping, doubling or swapping a letter
+
+        Keyword Arguments:
+            word - string to be changed
+            rng - random.Random instance
+
+        Returns:
+            String with the spelling mistake
+    '''
+
+    if len(word) < 4:
+        return word
+
+    position = rng.randint(1, len(word) - 2)
+    variation = rng.randint(1, 3)
+
+    if variation == 1:
+        return word[:position] + word[position + 1:]
+    elif variation == 2:
+        return word[:position] + word[position] + word[position:]
+    else:
+        return word[:position] + word[position + 1] + word[position] + word[position + 2:]
+
+
+def generate_date(rng):
+    ''' Creates a date from the time of the survey in one of the formats found in the transcriptions, including some that aren't valid
+
+        Keyword Arguments:
+            rng - random.Random instance
+
+        Returns:
+            String with the date
+    '''
+
+    day = rng.randint(1, 28)
+    month = rng.randint(1, 12)
+    year = rng.choice([1940, 1941, 1941, 1942, 1943])
+    layout = rng.random()
+
+    if layout < 0.5:
+        return str(day) + " " + MONTHS[month - 1] + " " + str(year)
+    elif layout < 0.7:
+        return str(day) + "-" + MONTHS[month - 1][:3] + "-" + str(year)[2:]
+    elif layout < 0.85:
+        return str(day) + "/" + str(month) + "/" + str(year)
+    elif layout < 0.9:
+        return str(day) + " " + MONTHS[month - 1][:4] + " " + str(year)
+    elif layout < 0.93:
+        return MONTHS[month - 1] + " " + str(year)
+    elif layout < 0.95:
+        return "30 February " + str(year)
+    else:
+        return rng.choice(["", "*"])
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("Usage: python -m benchmarks.generate_csv <number of rows> <output csv> [seed]")
+        sys.exit(1)
+
+    generate_csv(sys.argv[2], int(sys.argv[1]), int(sys.argv[3]) if len(sys.argv) > 3 else 1)
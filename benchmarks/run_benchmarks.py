@@ -0,0 +1,400 @@
+# Benchmark the main processing stages
+#
+#   For each size a synthetic csv file is generated (see generate_csv.py) and the following stages are timed:
+#       extract_farms - reading the csv and checking and combining the values for each farm
+#       output_excel - saving the farms from extract_farms as a spreadsheet
+#       get_combined_farmer_details_by_ref - combining the farmer and addressee details of every farm in the csv
+#       component_compare, combine_two_phrases, reduce_multiple_variations, get_match_ratios - the data_normalisation
+#           entry points, run on the farm name, landowner, farmer and addressee variations from the csv grouped by farm
+#
+#   Each stage is run once for the time and (unless --no-memory is given) again with tracemalloc to get the peak
+#   memory, as tracing slows the code down. The normalisation caches are cleared before each run. The results can be
+#   saved as a JSON baseline and later runs compared against it.
+#
+#   The time taken to import nfs_document_checks in a new interpreter is also measured, as it is most of the start up
+#   time of the NFS_QA application, and the run fails if it is over the budget (--import-budget).
+#
+#   Usage: python -m benchmarks.run_benchmarks [--sizes 1000 10000 ...] [--save baseline.json] [--compare baseline.json] [--import-budget 0.5]
+#
+
+# Functions:
+#   run_benchmarks(sizes=BENCHMARK_SIZES, seed=1, measure_memory=True, stages=None)
+#   prepare_inputs(csv_file, work_folder)
+#   collect_normalisation_inputs(csv_file)
+#   measure(stage_function, inputs, measure_memory=True)
+#   measure_import_time(module="nfs_document_checks", repeat=5)
+#   save_baseline(results, baseline_file)
+#   compare_results(results, baseline, threshold=0.1)
+#   print_results(results)
+#   main()
+#   bench_extract_farms(inputs)
+#   bench_output_excel(inputs)
+#   bench_component_compare(inputs)
+#   bench_combine_two_phrases(inputs)
+#   bench_reduce_multiple_variations(inputs)
+#   bench_get_match_ratios(inputs)
+#   bench_get_combined_farmer_details_by_ref(inputs)
+
+import argparse, contextlib, csv, datetime, io, json, os, platform, subprocess, sys, tempfile, time, tracemalloc
+from pathlib import Path
+from tabulate import tabulate
+
+import data_normalisation as dn
+import nfs_document_checks as nfs
+from benchmarks.generate_csv import generate_csv
+
+BENCHMARK_SIZES = [1000, 10000, 100000, 1000000]
+
+# Maximum time in seconds for importing nfs_document_checks in a new interpreter
+IMPORT_TIME_BUDGET = 0.5
+
+
+def run_benchmarks(sizes=BENCHMARK_SIZES, seed=1, measure_memory=True, stages=None):
+    ''' Generates a csv file for each size and times each of the benchmark stages on it
+
+        Keyword Arguments:
+            sizes - optional list of integers with the number of csv rows to benchmark. 1k, 10k, 100k and 1M rows by default.
+            seed - optional integer used to generate the csv files, 1 by default
+            measure_memory - optional boolean, True by default. If True each stage is run a second time with tracemalloc to get the peak memory
+            stages - optional list of stage names to run (keys of BENCHMARK_STAGES). All the stages are run by default.
+
+        Returns:
+            Dictionary with details of the machine, the import time of nfs_document_checks and the results for each stage by stage name and then number of rows
+    '''
+
+    results = {"created": datetime.datetime.now().isoformat(timespec="seconds"), "python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count(), "seed": seed, "stages": {}}
+    results["import_seconds"] = measure_import_time()
+
+    with tempfile.TemporaryDirectory() as work_folder:
+        for size in sizes:
+            csv_file = Path(work_folder, "synthetic_" + str(size) + ".csv")
+            generate_csv(csv_file, size, seed)
+            print("Generated " + str(size) + " rows")
+
+            inputs = prepare_inputs(csv_file, work_folder)
+            inputs["rows"] = size
+
+            for stage_name, stage_function in BENCHMARK_STAGES.items():
+                if stages is not None and stage_name not in stages:
+                    continue
+
+                stage_result = measure(stage_function, inputs, measure_memory)
+                stage_result["rows_per_second"] = size / stage_result["seconds"] if stage_result["seconds"] > 0 else None
+                results["stages"].setdefault(stage_name, {})[str(size)] = stage_result
+                print("  " + stage_name + ": " + str(round(stage_result["seconds"], 3)) + "s")
+
+    return results
+
+
+def prepare_inputs(csv_file, work_folder):
+    ''' Gets the values needed by the stages that don't start from the csv file: the farms for output_excel, the raw farmer and addressee details for get_combined_farmer_details_by_ref and the grouped variations for the data_normalisation functions
+
+        Keyword Arguments:
+            csv_file - path to the generated csv file
+            work_folder - path to a folder for any files created by the stages
+
+        Returns:
+            Dictionary of inputs passed to each stage
+    '''
+
+    farms = {}
+    raw_farm_info = {}
+    row_counts = {}
+    ref_allocator = nfs.ReferenceAllocator(farms.keys())
+
+    # the rows are added in the same way as extract_farms so that the raw farmer and addressee details can be kept for get_combined_farmer_details_by_ref
+    with contextlib.redirect_stdout(io.StringIO()):
+        with open(csv_file, newline='') as f:
+            for row_num, row in enumerate(nfs.read_rows(f), 2):
+                ref_component, filename_warnings = nfs.filename_checks(row.filename_1.strip(), row.filename_2.strip(), row.document_type, str(row_num))
+                nfs.add_farm_row(row, row_num, ref_component, filename_warnings, farms, raw_farm_info, row_counts, ref_allocator)
+
+        farmer_details = {ref: farm_data.farmer for ref, farm_data in raw_farm_info.items() if farm_data.farmer is not None}
+        addressee_details = {ref: farm_data.addressee for ref, farm_data in raw_farm_info.items() if farm_data.addressee is not None}
+        nfs.combine_farm_details(farms, raw_farm_info)
+
+    inputs = {"csv_file": csv_file, "work_folder": work_folder, "farms": farms, "farmer_details": farmer_details, "addressee_details": addressee_details}
+    inputs.update(collect_normalisation_inputs(csv_file))
+    dn.clear_cache()
+
+    return inputs
+
+
+def collect_normalisation_inputs(csv_file):
+    ''' Groups the farm name, landowner, farmer and addressee values in the csv by farm (box and primary farm number) and sorts the groups into the shapes taken by each of the data_normalisation functions
+
+        Keyword Arguments:
+            csv_file - path to the generated csv file
+
+        Returns:
+            Dictionary with the groups for component_compare, the two variation groups for combine_two_phrases and get_match_ratios and the groups with more than two variations for reduce_multiple_variations
+    '''
+
+    columns = ["farm_name", "owner_individual_name", "owner_address", "farmer_individual_name", "farmer_address", "addressee_individual_name", "address"]
+    groups = {}
+
+    with open(csv_file, newline='') as f:
+        for row in csv.DictReader(f):
+            if row["document_type"] == "Cover":
+                continue
+
+            box = row["filename_1"].split("_")[0]
+            for column in columns:
+                groups.setdefault(box + "/" + row["primary_farm_number"] + ":" + column, []).append(row[column])
+
+    two_variations = []
+    multiple_variations = []
+
+    for component_list in groups.values():
+        component_set = set([component for component in component_list if (component.strip() != "" and component.strip() != "*")])
+        if len(component_set) == 2:
+            two_variations.append((component_set, component_list))
+        elif len(component_set) > 2:
+            multiple_variations.append((component_list, component_set))
+
+    return {"component_groups": groups, "two_variations": two_variations, "multiple_variations": multiple_variations}
+
+
+def measure(stage_function, inputs, measure_memory=True):
+    ''' Times a stage and, if required, runs it again with tracemalloc to find the peak memory used. Anything printed by the stage is discarded.
+
+        Keyword Arguments:
+            stage_function - function taking the inputs dictionary and returning the number of items processed
+            inputs - dictionary of inputs from prepare_inputs
+            measure_memory - optional boolean, True by default
+
+        Returns:
+            Dictionary with the time in seconds, the number of items processed, items per second and the peak memory in MB (None if not measured)
+    '''
+
+    dn.clear_cache()
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        items = stage_function(inputs)
+        seconds = time.perf_counter() - start
+
+    peak_memory = None
+    if measure_memory:
+        dn.clear_cache()
+        tracemalloc.start()
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                stage_function(inputs)
+            peak_memory = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+        finally:
+            tracemalloc.stop()
+
+    return {"seconds": seconds, "items": items, "items_per_second": items / seconds if seconds > 0 else None, "peak_memory_mb": peak_memory}
+
+
+def measure_import_time(module="nfs_document_checks", repeat=5):
+    ''' Times the import of a module in a new interpreter, using python -X importtime so that the start up of the interpreter isn't included. The modules it imports are counted, so this is the time added to the start up of anything that imports it.
+
+        Keyword Arguments:
+            module - optional string with the name of the module, nfs_document_checks by default
+            repeat - optional integer with the number of imports to time, 5 by default. The quickest is used as the others include noise from the rest of the machine.
+
+        Returns:
+            Float with the time in seconds. Throws RuntimeError if the module can't be imported
+    '''
+
+    import_times = []
+
+    for i in range(0, repeat):
+        completed = subprocess.run([sys.executable, "-X", "importtime", "-c", "import " + module], cwd=Path(nfs.__file__).parent, capture_output=True, text=True)
+        if completed.returncode != 0:
+            raise RuntimeError("Unable to import " + module + ": " + completed.stderr.strip().splitlines()[-1])
+
+        # lines are "import time: self [us] | cumulative | imported package"
+        for line in completed.stderr.splitlines():
+            parts = line.split("|")
+            if len(parts) == 3 and parts[2].strip() == module:
+                import_times.append(int(parts[1]) / 1000000)
+
+    return min(import_times)
+
+
+def save_baseline(results, baseline_file):
+    ''' Saves the benchmark results as a JSON baseline
+
+        Keyword Arguments:
+            results - dictionary of results from run_benchmarks
+            baseline_file - path to the JSON file
+
+        Returns:
+            No return but throws OSError if the file can't be saved
+    '''
+
+    with open(baseline_file, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+
+
+def compare_results(results, baseline, threshold=0.1):
+    ''' Prints a table comparing the throughput and peak memory of each stage and size with the baseline
+
+        Keyword Arguments:
+            results - dictionary of results from run_benchmarks
+            baseline - dictionary of results loaded from a saved baseline
+            threshold - optional float, 0.1 by default. A stage is marked as a regression if its throughput has dropped, or its peak memory has grown, by more than this fraction
+
+        Returns:
+            Integer with the number of regressions found
+    '''
+
+    table = []
+    regressions = 0
+
+    for stage_name, stage_results in results["stages"].items():
+        for size, result in stage_results.items():
+            baseline_result = baseline.get("stages", {}).get(stage_name, {}).get(size)
+            if baseline_result is None:
+                table.append([stage_name, size, result["rows_per_second"], None, None, result["peak_memory_mb"], None, "new"])
+                continue
+
+            speed_change = None
+            if result["rows_per_second"] and baseline_result.get("rows_per_second"):
+                speed_change = result["rows_per_second"] / baseline_result["rows_per_second"]
+
+            memory_change = None
+            if result["peak_memory_mb"] and baseline_result.get("peak_memory_mb"):
+                memory_change = result["peak_memory_mb"] / baseline_result["peak_memory_mb"]
+
+            status = "ok"
+            if (speed_change is not None and speed_change < 1 - threshold) or (memory_change is not None and memory_change > 1 + threshold):
+                status = "REGRESSION"
+                regressions += 1
+            elif speed_change is not None and speed_change > 1 + threshold:
+                status = "faster"
+
+            table.append([stage_name, size, result["rows_per_second"], baseline_result.get("rows_per_second"), speed_change, result["peak_memory_mb"], memory_change, status])
+
+    print(tabulate(table, headers=["stage", "rows", "rows/s", "baseline rows/s", "speed ratio", "peak MB", "memory ratio", "status"], floatfmt=".2f", tablefmt="grid"))
+
+    return regressions
+
+
+def print_results(results):
+    ''' Prints a table of the benchmark results
+
+        Keyword Arguments:
+            results - dictionary of results from run_benchmarks
+
+        Returns:
+            No return
+    '''
+
+    table = []
+    for stage_name, stage_results in results["stages"].items():
+        for size, result in stage_results.items():
+            table.append([stage_name, size, result["seconds"], result["rows_per_second"], result["items"], result["items_per_second"], result["peak_memory_mb"]])
+
+    print(tabulate(table, headers=["stage", "rows", "seconds", "rows/s", "items", "items/s", "peak MB"], floatfmt=".2f", tablefmt="grid"))
+    print("Import time (nfs_document_checks): " + str(round(results["import_seconds"], 3)) + "s")
+
+
+def main():
+    ''' Runs the benchmarks from the command line
+
+        Returns:
+            Integer exit code, 1 if a comparison with a baseline found any regressions or the import time is over the budget otherwise 0
+    '''
+
+    parser = argparse.ArgumentParser(description="Benchmark the NFS QA checks on synthetic csv files")
+    parser.add_argument("--sizes", type=int, nargs="+", default=BENCHMARK_SIZES, help="numbers of csv rows to benchmark")
+    parser.add_argument("--stages", nargs="+", choices=list(BENCHMARK_STAGES.keys()), help="stages to run (all by default)")
+    parser.add_argument("--seed", type=int, default=1, help="seed for the generated csv files")
+    parser.add_argument("--no-memory", action="store_true", help="don't measure the peak memory (halves the run time)")
+    parser.add_argument("--save", help="save the results as a JSON baseline")
+    parser.add_argument("--compare", help="compare the results with a saved JSON baseline")
+    parser.add_argument("--threshold", type=float, default=0.1, help="fractional change counted as a regression when comparing")
+    parser.add_argument("--import-budget", type=float, default=IMPORT_TIME_BUDGET, help="maximum time in seconds for importing nfs_document_checks")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.sizes, args.seed, not args.no_memory, args.stages)
+    print_results(results)
+
+    if args.save:
+        save_baseline(results, args.save)
+        print("Saved baseline to " + args.save)
+
+    exit_code = 0
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if compare_results(results, baseline, args.threshold) > 0:
+            exit_code = 1
+
+    if results["import_seconds"] > args.import_budget:
+        print("Import time is over the budget of " + str(args.import_budget) + "s")
+        exit_code = 1
+
+    return exit_code
+
+
+def bench_extract_farms(inputs):
+    ''' Reads the csv file and extracts the farms. Returns the number of items processed. '''
+
+    with open(inputs["csv_file"], newline='') as f:
+        farms = nfs.extract_farms(nfs.read_rows(f))
+    return len(farms)
+
+
+def bench_output_excel(inputs):
+    ''' Saves the farms from the csv file as a spreadsheet. Returns the number of items processed. '''
+
+    nfs.output_excel(Path(inputs["work_folder"], "benchmark.xlsx"), inputs["farms"])
+    return len(inputs["farms"])
+
+
+def bench_component_compare(inputs):
+    ''' Combines the variations for every farm name, landowner, farmer and addressee column by farm. Returns the number of items processed. '''
+
+    dn.component_compare(inputs["component_groups"])
+    return len(inputs["component_groups"])
+
+
+def bench_combine_two_phrases(inputs):
+    ''' Combines each group with two variations. Returns the number of items processed. '''
+
+    for component_set, component_list in inputs["two_variations"]:
+        dn.combine_two_phrases(set(component_set), list(component_list))
+    return len(inputs["two_variations"])
+
+
+def bench_reduce_multiple_variations(inputs):
+    ''' Reduces each group with more than two variations. Returns the number of items processed. '''
+
+    for component_list, component_set in inputs["multiple_variations"]:
+        dn.reduce_multiple_variations(list(component_list), set(component_set))
+    return len(inputs["multiple_variations"])
+
+
+def bench_get_match_ratios(inputs):
+    ''' Gets the word match ratios for each pair of variations. Returns the number of items processed. '''
+
+    for component_set, component_list in inputs["two_variations"]:
+        phrase1, phrase2 = sorted(component_set)
+        dn.get_match_ratios(phrase1.split(" "), phrase2.split(" "))
+    return len(inputs["two_variations"])
+
+
+def bench_get_combined_farmer_details_by_ref(inputs):
+    ''' Combines the farmer and addressee details for every farm. Returns the number of items processed. '''
+
+    nfs.get_combined_farmer_details_by_ref(inputs["farmer_details"], inputs["addressee_details"])
+    return len(inputs["farmer_details"].keys() | inputs["addressee_details"].keys())
+
+
+# Stages run for each size. Each takes the inputs from prepare_inputs and returns the number of items it processed.
+BENCHMARK_STAGES = {"extract_farms": bench_extract_farms,
+                    "output_excel": bench_output_excel,
+                    "get_combined_farmer_details_by_ref": bench_get_combined_farmer_details_by_ref,
+                    "component_compare": bench_component_compare,
+                    "combine_two_phrases": bench_combine_two_phrases,
+                    "reduce_multiple_variations": bench_reduce_multiple_variations,
+                    "get_match_ratios": bench_get_match_ratios}
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -11,6 +11,7 @@
 # Functions:
 #   component_compare (values_to_check, debug=False)
 #   reduce_multiple_variations(component_list, component_set, debug=False)
+#   get_pair_ratio(component1, component2, ratios)
 #   punctuated_title(to_convert)
 #   to_upper(match)
 #   to_lower(match)
@@ -23,6 +24,8 @@
 #   chunk_punctuated_string(string_to_process, all=True)
 #   combine_two_phrases(component_set, component_list, debug=False)
 #   combine_two_words (component1, component2, word_ratio, debug=False)
+#   get_letter_diff(component1, component2)
+#   align_repeated_letters(component1, component2, blocks)
 #   get_context(letter_group, phrase_string)
 #   align_two_phrases(string1, string2, component_list, debug=False)
 #   clean_string(string_to_clean)
@@ -30,6 +33,23 @@
 #   initials_replace(phrase_to_be_processed, phrase_for_comparison, debug=False)
 #   get_match_ratios(phrase1, phrase2, debug = False)
 #   get_match_matrix(first_phrase, second_phrase, component_list, debug=False)
+#   align_phrase_tokens(first_phrase, second_phrase, component_list, debug=False)
+#   get_token_score(token1, token2, ratio=None)
+#   get_annotated_words(phrase)
+#   is_annotated_match(tokens1, tokens2)
+#   is_marked_within_word(token)
+#   is_well_formed(value)
+#   set_alignment_engine(engine)
+#   set_diff_engine(engine)
+#   get_algorithm_version()
+#   get_cached_result(cache_key)
+#   store_result(cache_key, combined_value, warnings)
+#   use_persistent_cache(path, max_entries=100000)
+#   reopen_persistent_cache()
+#   close_persistent_cache()
+#   cache_info()
+#   set_cache_size(maxsize)
+#   clear_cache()
 
 #####################
 #   To Do:
@@ -39,9 +59,45 @@
 #   See if there is a better way to check mismatches based on match level of chunks since addresses with extra information are incorrectly identified as a mismatch.
 #   In combine_two_words - code for the case 'substr_count is > 1' hasn't been implemented
 
-from rapidfuzz import fuzz
+from rapidfuzz import fuzz, process
+from rapidfuzz.distance import Indel
+from normalisation_cache import LRUCache, PersistentCache
+import nfs_warnings as nw
 import difflib, re
 
+# Number of comparisons above which get_match_ratios scores the phrase sections using all the available cores
+PARALLEL_SCORE_THRESHOLD = 5000
+
+# Version of the normalisation code. Needs to be changed whenever a change affects the combined values or warnings so that results saved in a persistent cache by an older version aren't reused.
+ALGORITHM_VERSION = "2025.2"
+
+# How get_match_matrix lines up the words of two phrases: "anchor" finds the best matching words and works outwards from them, "dp" scores every alignment of the words at once (see align_phrase_tokens)
+ALIGNMENT_ENGINES = ["anchor", "dp"]
+ALIGNMENT_ENGINE = "anchor"
+
+# Settings for the "dp" alignment engine. Words are lined up if their similarity is above DP_MATCH_THRESHOLD, each word left out of the alignment costs DP_GAP_PENALTY (a perfect match scores 1) and the phrases are treated as distinct values if the average score for the words of the shorter phrase is below DP_MIN_ALIGNMENT
+DP_MATCH_THRESHOLD = 60
+DP_GAP_PENALTY = 0.2
+DP_MIN_ALIGNMENT = 0.5
+
+# Patterns for the letter corrections added by combine_two_words: a run of corrections such as (a?)(b?) and the brackets and question marks used to mark them
+CORRECTION_GROUP_PATTERN = re.compile(r'((\(\w+\?\))+)')
+CORRECTION_MARKS_PATTERN = re.compile(r'[\(\?\)]')
+# A "(?)" addition that doesn't follow alternatives such as "Burrows/Burroughs(?)", i.e. at the start of a value or after a space or bracket
+EMPTY_ADDITION_PATTERN = re.compile(r'(^|[\s()/])\(\?\)')
+
+# How combine_two_words works out the letter by letter differences of two words: "difflib" gives the same results as difflib.Differ (see get_letter_diff), "rapidfuzz" uses rapidfuzz's Indel.opcodes, which is faster but can line up the letters differently where difflib doesn't find the most letters in common (see align_repeated_letters)
+DIFF_ENGINES = ["difflib", "rapidfuzz"]
+DIFF_ENGINE = "difflib"
+
+# Versions of the alternative alignment and diff engines, added to the version by get_algorithm_version. Needs to be changed whenever a change to one of them affects the results so that results saved in a persistent cache by an older version aren't reused
+ENGINE_VERSIONS = {"dp": "2", "rapidfuzz": "2"}
+
+# Results of component_compare and combine_two_phrases keyed on the variations given (in sorted order), the debug flag and the alignment engine
+normalisation_cache = LRUCache(10000)
+# Optional SQLite cache of the same results shared across runs (see use_persistent_cache)
+persistent_cache = None
+
 
 def component_compare (values_to_check, debug=False):
     ''' Function to compare the components
@@ -59,6 +115,14 @@ def component_compare (values_to_check, debug=False):
     
     for key, component_list in values_to_check.items():
         
+        # the result only depends on the variations given and not their order, so they are sorted to give the same result whether or not it comes from the cache
+        component_list = sorted(component_list)
+        cache_key = ("component_compare", tuple(component_list), debug, ALIGNMENT_ENGINE, DIFF_ENGINE)
+        cached = get_cached_result(cache_key)
+        if cached is not None:
+            combined_values[key], warnings[key] = cached
+            continue
+        
         warnings[key] = set()
         component_set = set([component for component in component_list if (component.strip() != "" and component.strip() != "*")])   
         #component_list_caseless = [component.lower() for component in component_list if (component.strip() != "" and component.strip() != "*")]   
@@ -199,6 +263,8 @@ def component_compare (values_to_check, debug=False):
             combined_values[key] = reduced_values
             for reduced_warning in reduced_warnings:
                 warnings[key].add(reduced_warning)
+                
+        store_result(cache_key, combined_values[key], warnings[key])
     
     #print("Component compare combined values: " + str(combined_values))
     #print("Component compare warnings: " + str(warnings))
@@ -221,14 +287,17 @@ def reduce_multiple_variations(component_list, component_set, debug=False):
     
     #print(component_set)
     warnings = set()
-    warnings.add("Warning: Attempting to combine multiple (>2) variations.")
+    warnings.add(nw.make_warning("MULTIPLE_VARIATIONS"))
     distinct = []
     
+    # similarity of each pair of variations, kept between passes so that only the newly merged phrase needs scoring
+    ratios = {}
+    
     for component1 in component_set:
         max_ratio = 0
         for component2 in component_set:
             if component1 != component2:
-                ratio = fuzz.ratio(component1, component2)
+                ratio = get_pair_ratio(component1, component2, ratios)
                 if ratio > max_ratio:
                     max_ratio = ratio
                 #print(component1 + "-" + component2 + ": " + str(ratio))
@@ -254,7 +323,7 @@ def reduce_multiple_variations(component_list, component_set, debug=False):
         for component1 in similar:
             for component2 in similar:
                 if component1 != component2:
-                    ratio = fuzz.ratio(component1, component2)   
+                    ratio = get_pair_ratio(component1, component2, ratios)   
                     if ratio > best_match:
                         best_match = ratio
                         best_similar = {component1, component2}
@@ -285,6 +354,29 @@ def reduce_multiple_variations(component_list, component_set, debug=False):
         return (combined_phrases, warnings)
 
 
+def get_pair_ratio(component1, component2, ratios):
+    ''' Gets the similarity ratio for a pair of variations, only scoring the pair the first time it is seen
+    
+        Keyword arguments:
+        component1 - string with the first variation
+        component2 - string with the second variation
+        ratios - dictionary of the ratios already calculated, keyed on the ordered pair of variations. Updated with the new ratio if the pair hasn't been scored before.
+        
+        Returns
+            Float with the similarity ratio of the two variations
+    '''
+    
+    if component1 < component2:
+        pair = (component1, component2)
+    else:
+        pair = (component2, component1)
+        
+    if pair not in ratios:
+        ratios[pair] = fuzz.ratio(component1, component2)
+        
+    return ratios[pair]
+
+
 def punctuated_title(to_convert):
     ''' Converts string to punctuated title case
     
@@ -440,26 +532,23 @@ def combine_connected_letters(list_to_test, string_to_compare):
     #print("String to test: " + string_to_test + " , string to compare: " + string_to_compare)    
     string_to_test = ''.join(list_to_test)
     
-    replacements = re.findall(r'((\(\w+\?\))+)', string_to_test)
+    replacements = CORRECTION_GROUP_PATTERN.findall(string_to_test)
     if replacements:
         for match in replacements:
             group = match[0]           
-            group_clean = re.sub(r'[\(\?\)]', '', group)
+            group_clean = CORRECTION_MARKS_PATTERN.sub('', group)
             
-            longest_match_group = ""
+            # longest run of the corrected letters found in the string to compare (the first one in the group if there is more than one of the same length)
             #print("match_group: " + group_clean)
-            for s in range(0, len(group_clean)):
-                for i in range(1, len(group_clean) + 1):
-                    if i > s:
-                        substr = group_clean[s:i]
-                        #print("Checking: " + substr + " in " + string_to_compare)
-                        if substr in string_to_compare and len(substr) > len(longest_match_group):
-                            longest_match_group = substr
+            matcher = difflib.SequenceMatcher(None, group_clean, string_to_compare, autojunk=False)
+            longest_match = matcher.find_longest_match(0, len(group_clean), 0, len(string_to_compare))
+            longest_match_group = group_clean[longest_match.a:longest_match.a + longest_match.size]
                             
             if len(longest_match_group) > 1:
-                longest_match_group_split = re.sub(r'(\w)', r'\\(\1\\?\\)', longest_match_group)
+                # the letters are all word characters, so each one's correction can be found as plain text, e.g. (a?)(b?) -> (ab?)
+                longest_match_group_split = ''.join(['(' + letter + '?)' for letter in longest_match_group])
                 #print(longest_match_group_split + " in " + string_to_test)
-                result = re.sub(longest_match_group_split, r'(' + longest_match_group + '?)', string_to_test)
+                result = string_to_test.replace(longest_match_group_split, '(' + longest_match_group + '?)')
                 
                 #match_results = re.findall(r'((\(\w+\?\))|(\(\?\))|(.))', result)
                 #result_list = []
@@ -510,6 +599,14 @@ def combine_two_phrases(component_set, component_list, debug=False):
     #print(key + ": ")
     
     #debug = True
+    
+    component_list = sorted(component_list)
+    cache_key = ("combine_two_phrases", tuple(sorted(component_set)), tuple(component_list), debug, ALIGNMENT_ENGINE, DIFF_ENGINE)
+    cached = get_cached_result(cache_key)
+    if cached is not None:
+        return cached
+    
+    component_set = set(cache_key[1])
 
     split_components, count_of_component_lengths = get_tokens(component_set)
     #warnings = set()
@@ -524,6 +621,7 @@ def combine_two_phrases(component_set, component_list, debug=False):
         
     aligned_phrases, phrase_warnings = align_two_phrases(split_components[0], split_components[1], component_list, debug)
     #print(key + " aligned phrases: " + str(aligned_phrases))
+    store_result(cache_key, aligned_phrases, phrase_warnings)
     return (aligned_phrases, phrase_warnings) 
     
     '''
@@ -550,7 +648,7 @@ def combine_two_phrases(component_set, component_list, debug=False):
                     elif len(non_initials) < 1:
                         generated_component += initials[0]
                         
-                    warnings.add("Note: Combining initial and names.")
+                    warnings.add(nw.make_warning("COMBINING_INITIALS"))
                 else:
                     #print("Option A")
                     generated_component += " " + combine_two_words(list(parts.keys())[0], list(parts.keys())[1], distribution, debug)
@@ -561,10 +659,10 @@ def combine_two_phrases(component_set, component_list, debug=False):
             elif len(parts.keys()) == 2: # if there are two variations
                 #print("Option B")
                 generated_component += " " + combine_two_words(list(parts.keys())[0], list(parts.keys())[1], distribution, debug)
-                warnings.add("Note: Combining variations.")
+                warnings.add(nw.make_warning("COMBINING_VARIATIONS"))
             else: # if there are more than two versions
                 print(key + ": Option C")
-                warnings.add("Note: Combining variations.")
+                warnings.add(nw.make_warning("COMBINING_VARIATIONS"))
                     
         #print(key + ": " + generated_component.strip())
         return (generated_component.strip(), warnings)
@@ -639,17 +737,15 @@ def combine_two_words (component1, component2, word_ratio, debug=False):
                 component2_to_test = component2
                 
                 if "?)" in (component1 + component2):
-                    component1_to_test = re.sub(r'[\(\?\)]', '', component1)
-                    component2_to_test = re.sub(r'[\(\?\)]', '', component2)
+                    component1_to_test = CORRECTION_MARKS_PATTERN.sub('', component1)
+                    component2_to_test = CORRECTION_MARKS_PATTERN.sub('', component2)
 
                 if ratio_caseless > ratio:
                     component1_to_test = component1_to_test.lower()
                     component2_to_test = component2_to_test.lower()
                     
                     
-                diff = difflib.Differ().compare(component1_to_test, component2_to_test)                 
-                                   
-                generated_string_list = [s.strip() if s[0] == ' ' else '(' + s[-1] + '?)' for s in diff]
+                generated_string_list = get_letter_diff(component1_to_test, component2_to_test)
                 
                 section_split = chunk_punctuated_string(component1 + component2, False)
                 #print("Generated String: " + str(generated_string_list))
@@ -703,7 +799,7 @@ def combine_two_words (component1, component2, word_ratio, debug=False):
                                 
                                 # 2025-03-13: Not implemented yet
                                 print("2. WARNING! - substr_count is > 1 in combine_two_words. This code hasn't been implemented yet!")
-                                warnings.add("2. WARNING! - substr_count is > 1 in combine_two_words. This code hasn't been implemented yet!")
+                                warnings.add(nw.make_warning("SUBSTRING_COUNT"))
                                 
                                 print("Cleaned section: '" + cleaned_section + "'")
                                 print("Section: '" + section + "'")
@@ -772,6 +868,106 @@ def combine_two_words (component1, component2, word_ratio, debug=False):
         
     return (generated_string, warnings)
 
+def get_letter_diff(component1, component2):
+    ''' Works out the letter by letter differences of two words for combine_two_words. Letters found in both words are kept and the others are put in brackets with a question mark, e.g. "Burrows" and "Burroughs" give ['B', 'u', 'r', 'r', 'o', '(w?)', '(u?)', '(g?)', '(h?)', 's'].
+        
+        With the "difflib" engine the result is the same as going through difflib.Differ().compare letter by letter, but only the SequenceMatcher matching blocks are used. Differ looks for similar pairs of lines in each replaced section, which for single letters never finds any, so the letters from the shorter side of the section are always added first and the time spent comparing every pair of letters can be skipped. The "rapidfuzz" engine uses the matching blocks from Indel.opcodes in the same way, after moving the letters around doubled letters and repeated words to where difflib puts them (see align_repeated_letters).
+        
+        Key Arguments:
+            component1 - string with the first word
+            component2 - string with the second word
+            
+        Returns:
+            List of strings, one for each letter
+    '''
+    
+    if DIFF_ENGINE == "rapidfuzz":
+        blocks = align_repeated_letters(component1, component2, Indel.opcodes(component1, component2).as_matching_blocks())
+    elif len(component2) < 200:
+        blocks = difflib.SequenceMatcher(None, component1, component2).get_matching_blocks()
+    else:
+        # SequenceMatcher ignores popular letters in long strings and Differ then lines them up itself, so leave these to Differ
+        return [s.strip() if s[0] == ' ' else '(' + s[-1] + '?)' for s in difflib.Differ().compare(component1, component2)]
+    
+    generated_string_list = []
+    end1 = 0
+    end2 = 0
+    
+    for start1, start2, size in list(blocks) + [(len(component1), len(component2), 0)]:
+        # the letters between the blocks are in one word and not the other (or are replaced)
+        changed1 = component1[end1:start1]
+        changed2 = component2[end2:start2]
+        generated_string_list += ['(' + letter + '?)' for letter in (changed2 + changed1 if len(changed2) < len(changed1) else changed1 + changed2)]
+        generated_string_list += [letter.strip() for letter in component1[start1:start1 + size]]
+        end1 = start1 + size
+        end2 = start2 + size
+    
+    return generated_string_list
+
+
+def align_repeated_letters(component1, component2, blocks):
+    ''' Moves the letters that are only in one of the words to where difflib puts them. Where letters are doubled (e.g. "Charlton" and "Charltton") or a word is repeated there is more than one way to line up the words. difflib looks for the longest block of matching letters first, so the extra letters end up next to the shorter of the blocks either side of them, whereas Indel.opcodes can give any of them. Each section that is only in one word is moved as far as it can go towards the shorter block next to it, which gives the same result as difflib for most words. difflib doesn't always find the most letters in common, so where Indel.opcodes finds more the results still differ.
+        
+        Key Arguments:
+            component1 - string with the first word
+            component2 - string with the second word
+            blocks - list of (start in component1, start in component2, size) for each block of matching letters, in order
+            
+        Returns:
+            List of [start in component1, start in component2, size] for each block of matching letters, in order
+    '''
+    
+    blocks = [list(block) for block in blocks if block[2] > 0]
+    moved = True
+    
+    while moved:
+        moved = False
+        
+        for i in range(0, len(blocks) - 1):
+            start1, start2, size = blocks[i]
+            next_start1, next_start2, next_size = blocks[i + 1]
+            gap1 = next_start1 - start1 - size
+            gap2 = next_start2 - start2 - size
+            
+            # only a section that is in one word and not in the other can be moved
+            if (gap1 > 0) == (gap2 > 0):
+                continue
+            
+            if gap1 > 0:
+                letters, gap_start, gap_size = component1, start1 + size, gap1
+            else:
+                letters, gap_start, gap_size = component2, start2 + size, gap2
+            
+            shift = 0
+            if next_size >= size:
+                # move the section back while the letter before it is the same as its last letter
+                while shift < size and letters[gap_start - 1 - shift] == letters[gap_start + gap_size - 1 - shift]:
+                    shift += 1
+                shift = -shift
+            else:
+                # move the section on while the letter after it is the same as its first letter
+                while shift < next_size and letters[gap_start + shift] == letters[gap_start + gap_size + shift]:
+                    shift += 1
+            
+            if shift != 0:
+                blocks[i] = [start1, start2, size + shift]
+                blocks[i + 1] = [next_start1 + shift, next_start2 + shift, next_size - shift]
+                moved = True
+        
+        # drop the blocks that have been emptied and join up the ones that now touch
+        joined_blocks = []
+        for block in blocks:
+            if block[2] == 0:
+                continue
+            if len(joined_blocks) > 0 and joined_blocks[-1][0] + joined_blocks[-1][2] == block[0] and joined_blocks[-1][1] + joined_blocks[-1][2] == block[1]:
+                joined_blocks[-1][2] += block[2]
+            else:
+                joined_blocks.append(block)
+        blocks = joined_blocks
+    
+    return blocks
+
+
 def get_context(letter_group, phrase_string):
     ''' Finds the substring within the phrase and returns it with the immediately surrounding letters for every place it is found in the parent phrase
     
@@ -847,7 +1043,7 @@ def align_two_phrases(string1, string2, component_list, debug=False):
     
     combined = ""
     
-    warnings = {"Note: Combining multi-length or offset variations."}
+    warnings = {nw.make_warning("COMBINING_OFFSET_VARIATIONS")}
     
     if len(string1) > len(string2):
         longest = string1
@@ -948,6 +1144,8 @@ def initials_replace(phrase_to_be_processed, phrase_for_comparison, debug=False)
 def get_match_ratios(phrase1, phrase2, debug = False):
     ''' Loops over the chunks of phrase sections of phrase1 and compares with the incrementally combined sections from phrase2 and gets the similarity ratios for each comparison. Returns the ratio for the best match (or matches) and the details of what was compared and the ratio for each comparison
     
+        Each section is cleaned and lowercased once, every span of phrase2 is built once and all the (phrase1 section, phrase2 span) pairs are scored in a single batched call.
+    
         Key Arguments:
             phrase1 - list of phrase sections for comparison
             phrase2 - list of phrase sections for comparison
@@ -963,33 +1161,43 @@ def get_match_ratios(phrase1, phrase2, debug = False):
     
     if debug:
         print("get_match_ratios called with phrase1: " + str(phrase1) + ", phrase2: " + str(phrase2))
+        
+    if len(phrase1) == 0 or len(phrase2) == 0:
+        return (anchor_ratio, match_matrix)
+    
+    phrase1_no_punc = [clean_string(section).lower() for section in phrase1]
+    phrase2_no_punc = [clean_string(section).lower() for section in phrase2]
+    
+    # spans are in the same order as the original nested loops (by start position then end position) so that the first best match is kept
+    spans = []
+    span_keys = []
+    for j1 in range(0, len(phrase2)):
+        combined_string_no_punc = ""
+        for j2 in range (j1, len(phrase2)):
+            combined_string_no_punc += phrase2_no_punc[j2]
+            spans.append(combined_string_no_punc)
+            span_keys.append(str(j1) + ":" + str(j2+1))
+    
+    if len(phrase1) * len(spans) >= PARALLEL_SCORE_THRESHOLD:
+        workers = -1
+    else:
+        workers = 1
+        
+    ratios = process.cdist(phrase1_no_punc, spans, scorer=fuzz.ratio, dtype="float64", workers=workers)
     
     for i in range(0, len(phrase1)):
-        max_ratio = 0
-        for j1 in range(0, len(phrase2)):
-            for j2 in range (j1, len(phrase2)):
-                combined_string = ''.join(phrase2[j1:j2+1])
-                key = str(j1) + ":" + str(j2+1)
-                
-                combined_string_no_punc = clean_string(combined_string)
-                phrase2_no_punc = clean_string(phrase1[i])
-                
-                if debug:
-                    print(combined_string_no_punc)
-                    print(phrase2_no_punc)
-                
-                ratio = fuzz.ratio(phrase2_no_punc.lower(), combined_string_no_punc.lower())
-                
-                if debug: 
-                    combo = "A" + str(i) + "-B" + ": " + str(j1) + "-" + str(j2) + " (" + phrase2[i].lower() + "-" + combined_string.lower() +  ") = " + str(ratio)
-                    print(combo)
-                    
-                if ratio > max_ratio:
-                    match_matrix[i] = (key, ratio)
-                    max_ratio = ratio
-                    
-                if ratio >= anchor_ratio:
-                    anchor_ratio = ratio  
+        best_span = int(ratios[i].argmax())
+        max_ratio = float(ratios[i][best_span])
+        
+        if debug: 
+            for j, key in enumerate(span_keys):
+                print("A" + str(i) + "-B" + ": " + key + " (" + phrase1_no_punc[i] + "-" + spans[j] +  ") = " + str(ratios[i][j]))
+        
+        if max_ratio > 0:
+            match_matrix[i] = (span_keys[best_span], max_ratio)
+            
+        if max_ratio >= anchor_ratio:
+            anchor_ratio = max_ratio  
                     
     return (anchor_ratio, match_matrix)
 
@@ -1007,6 +1215,10 @@ def get_match_matrix(first_phrase, second_phrase, component_list, debug=False):
     #debug = True
     if debug:
         print("Match matrix called with " + str(first_phrase) + " and " + str(second_phrase))
+        
+    if ALIGNMENT_ENGINE == "dp":
+        return align_phrase_tokens(first_phrase, second_phrase, component_list, debug)
+        
     match_warnings = set()
     
     #match_matrix_by_phrase2 = {}
@@ -1258,7 +1470,7 @@ def get_match_matrix(first_phrase, second_phrase, component_list, debug=False):
             print(anchored_list)        
         
     else:
-        match_warnings.add("Could not find any strong anchor points. '" + " ".join(phrase2) + "' and '" + " ".join(phrase1) + "' appear to be distinct values.")
+        match_warnings.add(nw.make_warning("NO_ANCHOR_POINTS", " ".join(phrase2), " ".join(phrase1)))
         anchored_list = phrase2 + ["/"] + phrase1 
         
     '''
@@ -1321,111 +1533,473 @@ def get_match_matrix(first_phrase, second_phrase, component_list, debug=False):
     return (' '.join(anchored_list), match_warnings)
         
     #print(match_matrix)
-  
-        
-
-
-names1 = {"1":["H Arkell", "H Arkell", "H Arkell", "H Arkell"], 
-         "2":["", "W H Buckle", "W H Buckle", "W H Buckle"], 
-         "3":["R A Burroghs", "R Burroughs", "R Burroughs", "R Burroughs"],
-         "6":["A E Cook", "A E Cook", "A E Cook", "A E Cook"],
-         "7":["A G Griffiths", "W L Edmunds", "W L Edmunds", "W L Edmunds"],
-         "9":["E Stacey", "A G Cooper bailiff for J S Gibbons Esq", "A G Cooper (bailiff to J S Gibbons)", "A G Cooper bailiff for J S Gibbons Esq"],
-         "10":["", "F W Hinton", "", "F W Hinton"],
-         "14":["G P Rymer", "G P Rymer", "G P Rymer", "G P Rymer"],
-         "15":["A Spragg", "A Spragg", "A Spragg", "A Spragg"],
-         "16":["H Bowl", "Harry Bowl", "H Bowl", "Harry Bowl"],
-         "18":["A Tombs", "A Tombs", "A Tombs", "A Tombs"],
-         "19":["C Tombs", "C Toombs", "C Toombs", "C Toombs"],
-         "20":["G O Tombs", "G O Tombs", "G O Tombs", "G O Tombs"],
-         "22":["G Wilkins", "G Wilkins", "Geo Wilkin", "G Wilkins"],
-         "31":["", "F Bendall", "F Bendall", "F Bendall"],
-         "33":["F Thomas", "Frank Thomas", "F. Thomas", "Frank Thomas"]
-         }
-
-names2 = {"1": ["R A Burroghs", "R Burroughs", "R Burroughs", "R Burroughs"],
-         "2": ["R Burroughs", "R Burroughs", "R Burroughs", "R Burroughs"],
-         "3": ["R Burroghs", "R Burroughs", "R Burroughs", "R Burroughs"],
-         "4": ["R Burroughs", "J Burroghs", "J Burroughs", "R Burroughs"], 
-         "5": ["R J Burroghs", "J Burroughs", "J Burroughs", "J Burroughs"],
-         "6": ["J R Burroghs", "J Burroughs", "J Burroughs", "J Burroughs"], 
-         "7": ["J R Burrows", "J Burroughs", "J Burroughs", "J Burroughs"], 
-         "8": ["R J Burroughs", "R L Burroughs", "R Burroughs", "R Burroughs"],
-         "9": ["R J Burrows", "R L Burroughs", "J Burroughs", "J Burroughs"],
-         "10": ["R J Burrows", "R L Burroughs", "R Burroughs", "R Burroughs"],
-         "11": ["R Burrows", "R Burroughs", "R Burroughs", "F Rymer"],
-         "12": ["R Burrows", "R Burroughs", "R Burroughs", "R Rymer"],
-         "13": ["R Burrows", "F Burroughs", "R Burroughs", "F Rymer"],
-         "14": ["R Burrows", "R F Burroughs", "R Burroughs", "F Rymer"],
-         "15": ["R J Burrows", "F Burroughs", "R Burroughs", "F Rymer"],
-         "16": ["R J Burrows", "R Burroughs", "R Burroughs", "R J Burroghs"],
-         "17": ["R J Burrows", "A E Cook", "G P Rymer", "Geo Wilkin"],
-         "18": ["R J Burrows", "R Burroughs", "G P Rymer", "Geo Wilkin"],
-         "19": ["R J Burrows", "R Burroughs", "R Burroghs", "R J Burroghs"],
-         "20": ["E Stacey", "A G Cooper bailiff for J S Gibbons Esq", "A G Cooper (bailiff to J S Gibbons)", "A G Cooper bailiff for J S Gibbons Esq"]                
-        }
-
-names3 = {"1": ["Messrs Rowe and Raddy", "Mr A C Raddy for Rowe and Raddy"]}
-
-
-address = {#"1":["Butlers Court Farm, Boddington, Gloucestershire", "Butlers Court, Boddington, Near Cheltenham", "Butlers Court, Boddington", "Butlers Court Farm, Boddington, Gloucestershire"], 
-         #"2":["Whitehall, Hayden Hill, Cheltenham, Gloucestershire", "Whitehall Farm, Hayden, Cheltenham", "Whitehall Farm, Hayden, Cheltenham", "Whitehall, Hayden Hill, Cheltenham, Gloucestershire"], 
-         "3":["Boddington House Farm, Boddington, Gloucestershire", "Boddington House Farm, Boddington, Cheltenham", "Boddington House Farm, Near Cheltenham", "Boddington House, Boddington, Gloucestershire"],
-         #"6":["Slate Mill, Boddington, Near Cheltenham, Gloucestershire","Slade Mill, Boddington, Cheltenham", "Slate Mill, Boddington", "Slate Mill, Boddington, Near Cheltenham, Gloucestershire"],
-         #"7":["Barrow Court, Boddington, Cheltenham, Gloucestershire", "14, Foregate Street, Worcester", "Barrow Court, Boddington", "Barrow Court, Boddington, Cheltenham, Gloucestershire"],
-         #"9":["Manor Farm, Boddington, Near Cheltenham, Gloucestershire", "Guiting House, Temple Guiting, Gloucestershire", "Manor Farm, Boddington", "Manor Farm, Boddington, Near Cheltenham, Gloucestershire"],
-         #"10":["c/o Mr S Fluck, Pilgrove Farm, Hayden Hill, Cheltenham", "192 High Street, Cheltenham", "Pilgrove Farm, Hayden Hill, Cheltenham", "c/o Mr G Fluck, Pilgrove Farm, Hayden Hill, Cheltenham, Gloucestershire"],
-         #"14":["14 Montpellier Grove, Cheltenham, Gloucestershire", "The Laurels, Charlton Kings, Cheltenham", "The Laurels, London Road, Charlton Kings", "The Laurels, London Road"],
-         #"15":["Withy Bridge Farm, Boddington, Near Cheltenham, Gloucestershire", "Mill House Farm, Boddington, Near Cheltenham", "Withybridge Farm, Boddington", "Withy Bridge Farm, Boddington, Near Cheltenham, Gloucestershire"],
-         #"16":["Barrow Hill Farm, Boddington, Cheltenham, Gloucestershire", "Barrow Hill Farm, Boddington, Cheltenham", "Barrow Hill Farm, Boddington", "Barrow Hill Farm, Boddington, Cheltenham, Gloucestershire"],
-         #"18":["Brookes Laymes Farm, Boddington, Gloucestershire", "Brooklaines Farm, Boddington, Cheltenham", "Brookes Laymes Farm, Boddington", "Brookes Laymes Farm, Boddington, Gloucestershire"],
-         #"19":["Boddington, Gloucestershire", "Brooklaines Farm, Boddington, Cheltenham", "Boddington", "Boddington, Gloucestershire"],
-         #"20":["Hayden Farm, Boddington, Near Cheltenham, Gloucestershire", "Hayden Farm, Hayden, Cheltenham", "Hayden Farm, Boddington", "Hayden Farm, Boddington, Near Cheltenham, Gloucestershire"],
-         #"22":["Wilkins Farm, Barrow, Boddington, Cheltenham, Gloucestershire", "Wilkins Farm, Boddington, Cheltenham", "Wilkins Farm, Barrow, Boddington", "Wilkins Farm, Barrow, Boddington, Cheltenham, Gloucestershire"],
-         #"31":["1 Hayden Hill Villas, Hayden Hill, Boddington, Cheltenham, Gloucestershire", "1 Hayden Hill Villas, Hayden Hill, Boddington", "Hayden Hill Villas, Hayden Hill, Boddington, Cheltenham, Gloucestershire"],
-         #"33":["Pilgrove, Hayden Hill, Near Cheltenham, Gloucestershire", "Pilgrove, Hayden Hill, Boddington, Gloucestershire", "Pilgrove, Hayden Hill, Cheltenham", "Pilgrove, Hayden Hilll, Near Cheltenham, Gloucestershire"]
-         }
-
-farm_name = {"1":["*", "Holt Farm", "", ""], 
-         "2":["*", "Park Valley Farm", "", ""], 
-         "3":["Home Farm", "Serge Hill", "", ""],
-         "4":["Buckmans Farm etc", "Cuckmans Farm", "", ""],
-         "5":["Old Parkbury Farm", "Old Parkbury", "", ""],
-         "6":["*", "Netherwylde Farm", "", ""],
-         "8":["*", "Smug Oak Farm", "", ""],
-         "9":["*", "Garston Manor", "", ""],
-         "10":["*", "Silver Birches", "", ""],
-         "11":["*", "Spooners", "", ""],
-         "12A":["", "Land at Ninnings Farm", "", ""],
-         "12B":["Millhouse Farm", "Millhouse Farm", "", ""],
-         "13":["*", "Harperbury", "", ""],
-         "17":["*", "Land at Park Street", "", ""],
-         "18":["*", "Home Farm", "", ""],
-         "19":["Little Munden Farm", "Little Munden Farm", "", ""],
-         "20":["Noke Farm", "Noke Farm", "", ""]
-         }
-
-test = {"1":["Hill Top Farm", "Hilltop farm", "Hill top farm"],
-        "2": ["Hill Top Farm", "Hilltop farm", "Hilltop farm"],
-        "3": ["Hill Top Farm", "Hill top farm", "Hill Top farm"],
-        "4": ["Hill Top Farm", "Hilltop farm"],
-        "5": ["HillTop Farm", "Hilltop farm"]}
-
-test2 = {"1": ["Winstall Farm, South Normanton, Alfreton, Derbyshire", "South Normanton, near Alfreton, Derbyshire", "Winstall Farm, South Normanton, Alfreton, Derbyshire"]}
-
-test3 = {"1": ["c/o Mr S Fluck, Pilgrove Farm, Hayden Hill, Cheltenham", "Pilgrove Farm, Hayden Hill, Cheltenham", "c/o Mr G Fluck, Pilgrove Farm, Hayden Hill, Cheltenham, Gloucestershire"],
-         "2": ["14, Montpellier Grove, Cheltenham, Gloucestershire", "The Laurels, London Road, Charlton Kings"],
-         "3": ["14, Montpellier Grove, Cheltenham, Gloucestershire", "The Laurels, London Road, Charlton Kings", "The Laurels, London Road"],
-         "4": ['Parkside, Frizington, Cumberland', 'Parkside Farm, Frizington', 'Parkside, Frizington, Cumberland']
-        }
-
-#print(component_compare(names1))
-#print(component_compare(names2))
-#print(component_compare(names3))
-#print(component_compare(address))
-#print(component_compare(farm_name))
-#print(component_compare(test))
-#print(component_compare(test2))
-#print(component_compare(test3))
-
-#punctuated_title("fiNd o(u)t")
\ No newline at end of file
+
+
+def align_phrase_tokens(first_phrase, second_phrase, component_list, debug=False):
+    ''' Alternative to the anchor points in get_match_matrix (used when ALIGNMENT_ENGINE is "dp"). The similarity of every word in one phrase to every word in the other is worked out in one go and the best alignment of the words is found with a Needleman-Wunsch style dynamic program, so extra words such as "Near" or "c/o" are left out as gaps. A word can also be lined up with two words from the other phrase (e.g. "Hilltop" and "Hill Top"). Words that are lined up are combined with combine_two_words, words missing from one phrase are added as "(words?)" and words that differ in both phrases are combined with combine_two_words, in the same way as the anchor points. Words already marked up by an earlier combination are never put in brackets again (see is_annotated_match), so the result has no nested brackets or empty "(?)" additions.
+    
+        Key Arguments:
+            first_phrase - list of the words in the first phrase
+            second_phrase - list of the words in the second phrase
+            component_list - list of the original variations (not used, kept to match get_match_matrix)
+            debug - boolean, False by default, if True print out debug
+            
+        Returns:
+            Tuple with string containing combined values and warnings
+    '''
+    
+    match_warnings = set()
+    
+    # as for get_match_matrix, phrase1 should be shorter or the same length as phrase2
+    if len(first_phrase) > len(second_phrase):
+        phrase1 = second_phrase
+        phrase2 = first_phrase
+    else:
+        phrase1 = first_phrase
+        phrase2 = second_phrase
+    
+    if len(phrase1) == 0:
+        match_warnings.add(nw.make_warning("NO_ANCHOR_POINTS", " ".join(phrase2), " ".join(phrase1)))
+        return (' '.join(phrase2 + ["/"] + phrase1), match_warnings)
+    
+    phrase1_clean = [clean_string(token).lower() for token in phrase1]
+    phrase2_clean = [clean_string(token).lower() for token in phrase2]
+    # words already marked up by an earlier combination (e.g. "(Near?)" or "Burro(u?)ghs") are only lined up with the same words or, if the mark up is within the word, words with the same letters. Otherwise they are left as they are
+    phrase1_annotated = get_annotated_words(phrase1)
+    phrase2_annotated = get_annotated_words(phrase2)
+    ratios = process.cdist(phrase1_clean, phrase2_clean, scorer=fuzz.ratio, dtype="float64").tolist()
+    
+    # steps through the table as (step, words used from phrase1, words used from phrase2)
+    moves = [("match", 1, 1), ("merge", 1, 2), ("merge", 2, 1), ("merge", 2, 2), ("gap", 0, 1), ("gap", 1, 0)]
+    
+    # best score for aligning the first i words of phrase1 with the first j words of phrase2, and the step taken to get there
+    scores = [[0.0] * (len(phrase2) + 1) for i in range(0, len(phrase1) + 1)]
+    steps = [[None] * (len(phrase2) + 1) for i in range(0, len(phrase1) + 1)]
+    
+    for i in range(0, len(phrase1) + 1):
+        for j in range(0, len(phrase2) + 1):
+            if i == 0 and j == 0:
+                continue
+            
+            best_score = None
+            for move in moves:
+                step, phrase1_count, phrase2_count = move
+                if phrase1_count > i or phrase2_count > j:
+                    continue
+                
+                # initials aren't joined on to other words
+                if step == "merge" and min([len(token) for token in phrase1_clean[i-phrase1_count:i] + phrase2_clean[j-phrase2_count:j]]) < 2:
+                    continue
+                
+                annotated = True in phrase1_annotated[i-phrase1_count:i] + phrase2_annotated[j-phrase2_count:j]
+                
+                # two words are only lined up with two for a marked up word split by a space, such as "Street,( ?)Worcester"
+                if step == "merge" and phrase1_count == phrase2_count and not annotated:
+                    continue
+                
+                if step == "gap":
+                    move_score = -DP_GAP_PENALTY
+                elif annotated and is_annotated_match(phrase1[i-phrase1_count:i], phrase2[j-phrase2_count:j]):
+                    move_score = 1 if step == "match" else 1 - DP_GAP_PENALTY / 2
+                elif annotated:
+                    # a word with corrections within it can be combined with a similar word that isn't marked up, giving the two as alternatives
+                    if step == "merge" or not is_marked_within_word(phrase1[i-1] if phrase1_annotated[i-1] else phrase2[j-1]) or (phrase1_annotated[i-1] and phrase2_annotated[j-1]):
+                        continue
+                    move_score = get_token_score(phrase1_clean[i-1], phrase2_clean[j-1], ratios[i-1][j-1])
+                    if move_score <= 0:
+                        continue
+                elif step == "match":
+                    move_score = get_token_score(phrase1_clean[i-1], phrase2_clean[j-1], ratios[i-1][j-1])
+                else:
+                    # one word against two joined words, with a small penalty so that a plain match is preferred when it is as good
+                    move_score = get_token_score("".join(phrase1_clean[i-phrase1_count:i]), "".join(phrase2_clean[j-phrase2_count:j])) - DP_GAP_PENALTY / 2
+                
+                score = scores[i-phrase1_count][j-phrase2_count] + move_score
+                if best_score is None or score > best_score:
+                    best_score = score
+                    steps[i][j] = (move, move_score)
+            
+            scores[i][j] = best_score
+    
+    # trace back through the steps to get the alignment as a list of (step, phrase1 positions, phrase2 positions)
+    alignment = []
+    matched_score = 0
+    i = len(phrase1)
+    j = len(phrase2)
+    while i > 0 or j > 0:
+        move, move_score = steps[i][j]
+        step, phrase1_count, phrase2_count = move
+        
+        # words lined up with a score below 0 are treated as different in both phrases
+        if step != "gap" and move_score <= 0:
+            step = "gap"
+        elif step != "gap":
+            matched_score += move_score
+            
+        alignment.append((step, list(range(i - phrase1_count, i)), list(range(j - phrase2_count, j))))
+        i -= phrase1_count
+        j -= phrase2_count
+    alignment.reverse()
+    
+    if debug:
+        print("DP alignment of " + str(phrase1) + " and " + str(phrase2) + ": " + str(alignment))
+        print("Matched score: " + str(matched_score))
+    
+    if matched_score / len(phrase1) < DP_MIN_ALIGNMENT:
+        match_warnings.add(nw.make_warning("NO_ANCHOR_POINTS", " ".join(phrase2), " ".join(phrase1)))
+        return (' '.join(phrase2 + ["/"] + phrase1), match_warnings)
+    
+    anchored_list = []
+    position = 0
+    # number of brackets left open by the words added so far
+    bracket_depth = 0
+    
+    while position < len(alignment):
+        step, phrase1_positions, phrase2_positions = alignment[position]
+        position += 1
+        
+        # gather up a run of words that aren't lined up with anything, up to the next word that is already marked up
+        annotated = True in [phrase1_annotated[i] for i in phrase1_positions] + [phrase2_annotated[j] for j in phrase2_positions]
+        if step == "gap" and not annotated:
+            while position < len(alignment) and alignment[position][0] == "gap" and True not in [phrase1_annotated[i] for i in alignment[position][1]] + [phrase2_annotated[j] for j in alignment[position][2]]:
+                phrase1_positions = phrase1_positions + alignment[position][1]
+                phrase2_positions = phrase2_positions + alignment[position][2]
+                position += 1
+        
+        phrase1_token = ' '.join([phrase1[i] for i in phrase1_positions])
+        phrase2_token = ' '.join([phrase2[j] for j in phrase2_positions])
+        
+        if phrase1_token == phrase2_token:
+            combined_token = phrase1_token
+        elif annotated and (phrase1_token == "" or phrase2_token == "" or is_annotated_match([phrase1[i] for i in phrase1_positions], [phrase2[j] for j in phrase2_positions])):
+            # a word that is already marked up isn't put in brackets again. It is either a word from one of the phrases or lined up with a word with the same letters, which it already covers
+            combined_token = phrase1_token if True in [phrase1_annotated[i] for i in phrase1_positions] else phrase2_token
+        elif bracket_depth > 0 and (phrase1_token == "" or phrase2_token == ""):
+            # words from one of the phrases within a section that is already marked up
+            combined_token = phrase1_token + phrase2_token
+        elif phrase1_token == "" or phrase2_token == "":
+            # words from only one of the phrases. A comma at the end of the last word before the gap is kept outside of the brackets
+            if phrase1_token != "":
+                gap_token = phrase1_token
+                previous_token = phrase1[phrase1_positions[0] - 1] if phrase1_positions[0] > 0 else ""
+            else:
+                gap_token = phrase2_token
+                previous_token = phrase2[phrase2_positions[0] - 1] if phrase2_positions[0] > 0 else ""
+            
+            if len(anchored_list) > 0 and previous_token != "" and str(anchored_list[-1])[-1] == "," and previous_token[-1] != "," and gap_token[-1] == "," and gap_token != ",":
+                anchored_list[-1] = str(anchored_list[-1])[:-1]
+                combined_token = "(" + gap_token[:-1] + "?),"
+            else:
+                combined_token = "(" + gap_token + "?)"
+        else:
+            phrase2_token = initials_replace(phrase2_token, phrase1_token, debug)
+            phrase1_token = initials_replace(phrase1_token, phrase2_token, debug)
+            token_ratio = token_distribution([phrase2_token, phrase1_token], [phrase2_token, phrase1_token], debug)
+            combined_token, combination_warnings = combine_two_words(phrase1_token, phrase2_token, token_ratio, debug)
+            
+            if annotated and not is_well_formed(combined_token):
+                # the corrections already in the word have been marked up again, so keep the word as it is and add the other word as missing
+                if True in [phrase1_annotated[i] for i in phrase1_positions]:
+                    combined_token = phrase1_token + " (" + phrase2_token + "?)"
+                else:
+                    combined_token = "(" + phrase1_token + "?) " + phrase2_token
+            else:
+                match_warnings.update(combination_warnings)
+        
+        if combined_token.strip() != '':
+            anchored_list.append(combined_token)
+            bracket_depth = max(bracket_depth + combined_token.count("(") - combined_token.count(")"), 0)
+    
+    if debug:
+        print(anchored_list)
+        
+    return (' '.join(anchored_list), match_warnings)
+
+
+def get_token_score(token1, token2, ratio=None):
+    ''' Scores how well two words line up for align_phrase_tokens: 1 for a perfect match falling to 0 at DP_MATCH_THRESHOLD and below 0 for words that don't match. An initial matching the first letter of the other word counts as half a match.
+    
+        Key Arguments:
+            token1 - cleaned lower case string with the first word
+            token2 - cleaned lower case string with the second word
+            ratio - optional float with the similarity of the words if it has already been worked out
+            
+        Returns:
+            Float with the score
+    '''
+    
+    if token1 == "" or token2 == "":
+        return -1
+    
+    if token1 == token2:
+        return 1
+    
+    if (len(token1) == 1 and token2[0] == token1) or (len(token2) == 1 and token1[0] == token2):
+        return 0.5
+    
+    if ratio is None:
+        ratio = fuzz.ratio(token1, token2)
+        
+    return (ratio - DP_MATCH_THRESHOLD) / (100 - DP_MATCH_THRESHOLD)
+
+
+def get_annotated_words(phrase):
+    ''' Finds the words of a phrase that are already marked up by an earlier combination for align_phrase_tokens: words with brackets, such as "(Near?)", "Burrows/Burroughs(?)" or "Burro(u?)ghs", and any words between an opening and closing bracket, such as "St" in "(Near St Albans?)".
+    
+        Key Arguments:
+            phrase - list of the words in the phrase
+            
+        Returns:
+            List of booleans, True for each word that is marked up
+    '''
+    
+    annotated = []
+    depth = 0
+    
+    for token in phrase:
+        annotated.append(depth > 0 or "(" in token or ")" in token)
+        depth = max(depth + token.count("(") - token.count(")"), 0)
+        
+    return annotated
+
+
+def is_annotated_match(tokens1, tokens2):
+    ''' Checks whether words that are already marked up can be lined up by align_phrase_tokens. They can if they are the same or if the words of only one side are marked up, the brackets are closed within the words (e.g. "Burro(u?)ghs" or "Street,( ?)Worcester" but not "(Near" from "(Near St?)"), and the letters are the same. The marked up words then stand for both sides without being combined again.
+    
+        Key Arguments:
+            tokens1 - list of words from the first phrase
+            tokens2 - list of words from the second phrase
+            
+        Returns:
+            Boolean, True if the words can be lined up
+    '''
+    
+    if tokens1 == tokens2:
+        return True
+    
+    if True in get_annotated_words(tokens1) and True in get_annotated_words(tokens2):
+        return False
+    
+    for tokens in [tokens1, tokens2]:
+        depth = 0
+        for letter in "".join(tokens):
+            if letter == "(":
+                depth += 1
+            elif letter == ")":
+                depth -= 1
+                if depth < 0:
+                    return False
+        if depth != 0:
+            return False
+    
+    return "".join(clean_string("".join(tokens1)).lower().split()) == "".join(clean_string("".join(tokens2)).lower().split())
+
+
+def is_marked_within_word(token):
+    ''' Checks whether the mark up of a word is only corrections within the word (e.g. "Burro(u?)ghs") rather than the whole word being in brackets or given as alternatives (e.g. "(Near?)" or "Burrows/Burroughs(?)")
+    
+        Key Arguments:
+            token - string with the word
+            
+        Returns:
+            Boolean, True if the mark up is within the word
+    '''
+    
+    return token.count("(") == token.count(")") and not token.startswith("(") and "/" not in token
+
+
+def is_well_formed(value):
+    ''' Checks the mark up of a combined value: every bracket is closed, no bracket is opened inside another and there are no empty "(?)" additions (a "(?)" is only used after alternatives such as "Burrows/Burroughs(?)")
+    
+        Key Arguments:
+            value - string with the combined value
+            
+        Returns:
+            Boolean, True if the mark up is well formed
+    '''
+    
+    depth = 0
+    
+    for letter in value:
+        if letter == "(":
+            depth += 1
+            if depth > 1:
+                return False
+        elif letter == ")":
+            depth -= 1
+            if depth < 0:
+                return False
+    
+    return depth == 0 and EMPTY_ADDITION_PATTERN.search(value) is None
+
+
+def set_alignment_engine(engine):
+    ''' Chooses how get_match_matrix lines up the words of two phrases. If a persistent cache is in use it is reopened for the new engine
+    
+        Key Arguments:
+            engine - string with one of the ALIGNMENT_ENGINES: "anchor" (the default) or "dp"
+            
+        Returns:
+            No return but raises ValueError if the engine isn't recognised
+    '''
+    
+    global ALIGNMENT_ENGINE
+    
+    if engine not in ALIGNMENT_ENGINES:
+        raise ValueError("Unknown alignment engine '" + str(engine) + "'. Expected one of: " + ", ".join(ALIGNMENT_ENGINES))
+        
+    ALIGNMENT_ENGINE = engine
+    reopen_persistent_cache()
+
+
+def set_diff_engine(engine):
+    ''' Chooses how combine_two_words works out the letter by letter differences of two words (see get_letter_diff). If a persistent cache is in use it is reopened for the new engine
+    
+        Key Arguments:
+            engine - string with one of the DIFF_ENGINES: "difflib" (the default) or "rapidfuzz"
+            
+        Returns:
+            No return but raises ValueError if the engine isn't recognised
+    '''
+    
+    global DIFF_ENGINE
+    
+    if engine not in DIFF_ENGINES:
+        raise ValueError("Unknown diff engine '" + str(engine) + "'. Expected one of: " + ", ".join(DIFF_ENGINES))
+        
+    DIFF_ENGINE = engine
+    reopen_persistent_cache()
+
+
+def get_algorithm_version():
+    ''' Gets the version of the normalisation code including the alignment and diff engines in use, so that results saved using one engine aren't reused with another
+    
+        Returns:
+            String with the version
+    '''
+    
+    version = ALGORITHM_VERSION
+    
+    if ALIGNMENT_ENGINE != "anchor":
+        version += "+" + ALIGNMENT_ENGINE + "." + ENGINE_VERSIONS.get(ALIGNMENT_ENGINE, "1")
+        
+    if DIFF_ENGINE != "difflib":
+        version += "+" + DIFF_ENGINE + "." + ENGINE_VERSIONS.get(DIFF_ENGINE, "1")
+        
+    return version
+
+
+def get_cached_result(cache_key):
+    ''' Looks up a result in the in-memory cache and then, if one is in use, the persistent cache
+    
+        Key Arguments:
+            cache_key - tuple with the name of the function, the sorted variations and the debug flag
+            
+        Returns:
+            Tuple with the combined value and a new set of the warnings (so the cached entry can't be changed), or None if the result hasn't been cached
+    '''
+    
+    cached = normalisation_cache.get(cache_key)
+    
+    if cached is None and persistent_cache is not None:
+        stored = persistent_cache.get(cache_key)
+        if stored is not None:
+            cached = (stored[0], frozenset([nw.from_json(warning) for warning in stored[1]]))
+            normalisation_cache.put(cache_key, cached)
+    
+    if cached is not None:
+        return (cached[0], set(cached[1]))
+    else:
+        return None
+
+def store_result(cache_key, combined_value, warnings):
+    ''' Adds a result to the in-memory cache and, if one is in use, the persistent cache
+    
+        Key Arguments:
+            cache_key - tuple with the name of the function, the sorted variations and the debug flag
+            combined_value - string with the combined value
+            warnings - set of NFSWarning (see nfs_warnings.py)
+            
+        Returns:
+            No return
+    '''
+    
+    normalisation_cache.put(cache_key, (combined_value, frozenset(warnings)))
+    
+    if persistent_cache is not None:
+        persistent_cache.put(cache_key, [combined_value, [warning.to_json() for warning in sorted(warnings, key=str)]])
+
+def use_persistent_cache(path, max_entries=100000):
+    ''' Opens (or creates) an SQLite file to save the normalisation results in so that they can be reused by later runs. Any cache already in use is closed first. Results saved by a different version (see get_algorithm_version) are removed from the file.
+    
+        Key Arguments:
+            path - string or path to the SQLite file
+            max_entries - integer with the maximum number of results to keep in the file. 100000 by default.
+            
+        Returns:
+            No return
+    '''
+    
+    global persistent_cache
+    
+    close_persistent_cache()
+    # the engine versions are part of the version, so results from another engine or an older version of one aren't reused
+    persistent_cache = PersistentCache(path, get_algorithm_version(), max_entries)
+
+def reopen_persistent_cache():
+    ''' Reopens the persistent cache, if one is in use, when the version has changed since it was opened (i.e. the alignment or diff engine has been changed), so that it only gives results for the engines in use
+    
+        Returns:
+            No return
+    '''
+    
+    if persistent_cache is not None and persistent_cache.version != get_algorithm_version():
+        use_persistent_cache(persistent_cache.path, persistent_cache.max_entries)
+
+def close_persistent_cache():
+    ''' Saves and closes the persistent cache if one is in use
+    
+        Returns:
+            No return
+    '''
+    
+    global persistent_cache
+    
+    if persistent_cache is not None:
+        persistent_cache.close()
+        persistent_cache = None
+
+def cache_info():
+    ''' Gets the hit, miss and eviction counts for the normalisation cache used by component_compare and combine_two_phrases
+    
+        Returns:
+            Dictionary with the number of hits, misses and evictions and the current and maximum size of the cache. If a persistent cache is in use then its counters are included under the "persistent" key.
+    '''
+    
+    info = normalisation_cache.info()
+    
+    if persistent_cache is not None:
+        info["persistent"] = persistent_cache.info()
+        
+    return info
+
+def set_cache_size(maxsize):
+    ''' Sets the maximum number of results kept in the normalisation cache
+    
+        Key Arguments:
+            maxsize - integer with the maximum number of entries. If 0 results are not cached.
+            
+        Returns:
+            No return
+    '''
+    
+    normalisation_cache.resize(maxsize)
+    
+def clear_cache():
+    ''' Empties the normalisation cache and resets its counters
+    
+        Returns:
+            No return
+    '''
+    
+    normalisation_cache.clear()
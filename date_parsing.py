@@ -0,0 +1,242 @@
+# Parser for the field information and primary record dates
+#
+#   The same few dates come up on row after row for a parish, so each date string is only parsed once and the result
+#   (the date, its text for the output and the codes and values of any warnings, without the row number) is kept in an
+#   LRU cache. Dates in one of the usual layouts (day, month and year separated by "-", " " or "/", with the month as a
+#   number or a name) are matched with the compiled pattern for the layout and the month is looked up in MONTH_NUMBERS.
+#   Anything else goes through the original step by step checks in parse_date_parts, so every date gives the same
+#   result and warnings as before.
+#
+
+# Functions:
+#   parse_date(potential_date)
+#   parse_dates(potential_dates)
+#   match_date(potential_date)
+#   parse_date_parts(potential_date)
+#   get_date(potential_date, year, month, day, warning_specs)
+#   get_date_warnings(warning_specs, row_num)
+#   cache_info()
+#   set_cache_size(maxsize)
+#   clear_cache()
+
+import datetime, re
+import nfs_warnings as nw
+from normalisation_cache import LRUCache
+
+# Month number for each full month name and abbreviation (lower case). Abbreviations are accepted but give a MONTH_FORMAT warning.
+MONTH_NAMES = ["january", "february", "march", "april", "may", "june", "july", "august", "september", "october", "november", "december"]
+MONTH_NUMBERS = {name: (i + 1, False) for i, name in enumerate(MONTH_NAMES)}
+MONTH_NUMBERS.update({name[:3]: (i + 1, True) for i, name in enumerate(MONTH_NAMES) if name != "may"})
+
+# Pattern for each layout, in the order the separators are checked. The day and year are digits and the month is digits or letters, with no other separators in the date.
+DATE_LAYOUTS = [("-", re.compile(r"^([0-9]+)-([0-9]+|[A-Za-z]+)-([0-9]+)$")),
+                (" ", re.compile(r"^([0-9]+) ([0-9]+|[A-Za-z]+) ([0-9]+)$")),
+                ("/", re.compile(r"^([0-9]+)/([0-9]+|[A-Za-z]+)/([0-9]+)$"))]
+
+# Parsed dates by date string
+date_cache = LRUCache(5000)
+
+
+def parse_date(potential_date):
+    ''' Parses a date, using the cached result if the same date string has been parsed before
+
+        Keyword Arguments:
+            potential_date - string containing the date value for checking
+
+        Returns:
+            Tuple with the date as a datetime (or the stripped string if it isn't a valid date), the text of the date for the output (e.g. "05 May 1941", or the string if it isn't a valid date) and a tuple of (code, params) for each warning (see get_date_warnings)
+    '''
+
+    potential_date = potential_date.strip()
+
+    parsed = date_cache.get(potential_date)
+
+    if parsed is None:
+        parsed = match_date(potential_date)
+        if parsed is None:
+            parsed = parse_date_parts(potential_date)
+        date_cache.put(potential_date, parsed)
+
+    return parsed
+
+
+def parse_dates(potential_dates):
+    ''' Parses a column of dates in one go. Each distinct date string is only looked up once.
+
+        Keyword Arguments:
+            potential_dates - list of date strings
+
+        Returns:
+            List with the parsed date tuple (see parse_date) for each date string
+    '''
+
+    parsed_dates = {}
+
+    for potential_date in potential_dates:
+        if potential_date not in parsed_dates:
+            parsed_dates[potential_date] = parse_date(potential_date)
+
+    return [parsed_dates[potential_date] for potential_date in potential_dates]
+
+
+def match_date(potential_date):
+    ''' Parses a date in one of the layouts in DATE_LAYOUTS
+
+        Keyword Arguments:
+            potential_date - stripped string containing the date value
+
+        Returns:
+            Parsed date tuple (see parse_date), or None if the date isn't in one of the layouts
+    '''
+
+    for separator, pattern in DATE_LAYOUTS:
+        if separator in potential_date:
+            m = pattern.match(potential_date)
+            if m is None:
+                return None
+
+            day, month, year = m.groups()
+            warning_specs = []
+
+            if month.isdigit():
+                month_number = int(month)
+            else:
+                month_number, abbreviated = MONTH_NUMBERS.get(month.lower(), (0, True))
+                if abbreviated:
+                    warning_specs.append(("MONTH_FORMAT", (month,)))
+
+            if len(year) == 2:
+                year_number = int(year) + 1900
+            else:
+                if len(year) != 4:
+                    warning_specs.append(("DATE_RANGE", (potential_date,)))
+                year_number = int(year)
+
+            return get_date(potential_date, year_number, month_number, int(day), warning_specs)
+
+    return None
+
+
+def parse_date_parts(potential_date):
+    ''' Parses a date by splitting it on the first separator found, as date_check did before the layouts were added. Used for the dates that don't match one of DATE_LAYOUTS so they get the same result and warnings as before.
+
+        Keyword Arguments:
+            potential_date - stripped string containing the date value
+
+        Returns:
+            Parsed date tuple (see parse_date)
+    '''
+
+    warning_specs = []
+
+    try:
+        if "-" in potential_date:
+            day = int(potential_date.split("-")[0])
+            month = potential_date.split("-")[1]
+            year = potential_date.split("-")[2]
+        elif " " in potential_date:
+            day = int(potential_date.split(" ")[0])
+            month = potential_date.split(" ")[1]
+            year = potential_date.split(" ")[2]
+        elif "/" in potential_date:
+            day = int(potential_date.split("/")[0])
+            month = potential_date.split("/")[1]
+            year = potential_date.split("/")[2]
+        else:
+            raise ValueError("Date format not recognized")
+
+    except ValueError as ve:
+        return (potential_date, potential_date, (("DATE_FORMAT", (potential_date, str(ve))),))
+
+    if len(year) == 2:
+        year = int(year)
+        year += 1900
+    elif len(year) != 4:
+        warning_specs.append(("DATE_RANGE", (potential_date,)))
+
+    year = int(year)
+
+    if month.isdigit():
+        month_number = int(month)
+    else:
+        try:
+            month_number = datetime.datetime.strptime(month, '%B').month
+        except ValueError as ve:
+            try:
+                month_number = datetime.datetime.strptime(month, '%b').month
+            except ValueError as ve:
+                month_number = 0
+
+            warning_specs.append(("MONTH_FORMAT", (month,)))
+
+    return get_date(potential_date, year, month_number, day, warning_specs)
+
+
+def get_date(potential_date, year, month, day, warning_specs):
+    ''' Creates the date from its parts
+
+        Keyword Arguments:
+            potential_date - stripped string containing the date value
+            year - integer
+            month - integer
+            day - integer
+            warning_specs - list of (code, params) for the warnings found so far
+
+        Returns:
+            Parsed date tuple (see parse_date)
+    '''
+
+    try:
+        date = datetime.datetime(year=year, month=month, day=day)
+    except ValueError as ve:
+        warning_specs.append(("DATE_FORMAT", (potential_date, str(ve))))
+        return (potential_date, potential_date, tuple(warning_specs))
+
+    return (date, date.strftime('%d %B %Y'), tuple(warning_specs))
+
+
+def get_date_warnings(warning_specs, row_num):
+    ''' Creates the warnings for a parsed date
+
+        Keyword Arguments:
+            warning_specs - tuple of (code, params) from the parsed date tuple
+            row_num - integer or string with the number of the row in the source spreadsheet
+
+        Returns:
+            Set of NFSWarning
+    '''
+
+    return set([nw.make_warning(code, *params, row=row_num) for code, params in warning_specs])
+
+
+def cache_info():
+    ''' Gets the statistics for the cache of parsed dates
+
+        Returns:
+            Dictionary with the hits, misses, evictions, current size and maximum size of the cache
+    '''
+
+    return date_cache.info()
+
+
+def set_cache_size(maxsize):
+    ''' Changes the maximum number of parsed dates that are kept
+
+        Keyword Arguments:
+            maxsize - integer with the maximum number of entries. 0 turns the cache off.
+
+        Returns:
+            No return
+    '''
+
+    date_cache.resize(maxsize)
+
+
+def clear_cache():
+    ''' Empties the cache of parsed dates
+
+        Returns:
+            No return
+    '''
+
+    date_cache.clear()
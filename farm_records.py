@@ -0,0 +1,251 @@
+# Records for the values collected for each farm
+#
+#   FarmRecord holds the checked values and warnings for a farm as it is built up row by row, with a field for each of
+#   the output columns (apart from the reference, which is the key of the farms dictionary). RawFarmInfo holds the
+#   uncombined farm names and the landowner, farmer and addressee details, each as a PartyDetails with a list for each
+#   of the title, individual name, group names and addresses columns, until they are combined. RowCounts holds the
+#   number of rows for each farm with a value in each column. The records use slots rather than a dictionary for each
+#   farm, and the output column names are only used when the farms are saved (see FarmRecord.to_columns) or the
+#   combined values are saved in the manifest. ReferenceAllocator gives out the references for the farms.
+#
+
+# Classes:
+#   FarmRecord
+#   RowCounts
+#   RawFarmInfo
+#   PartyDetails
+#   ReferenceAllocator
+
+from dataclasses import dataclass, field
+
+# Output column for each FarmRecord field, in the order of the output
+FARM_RECORD_COLUMNS = {"Reference Warnings": "reference_warnings",
+                       "Filenames": "filenames",
+                       "Filename Warnings": "filename_warnings",
+                       "Type": "types",
+                       "Type Warnings": "type_warnings",
+                       "Farm Number": "farm_numbers",
+                       "Farm Number Warnings": "farm_number_warnings",
+                       "Farm Name": "farm_name",
+                       "Farm Name Warnings": "farm_name_warnings",
+                       "Landowner": "landowner",
+                       "Landowner Warnings": "landowner_warnings",
+                       "Farmer": "farmer",
+                       "Farmer Warnings": "farmer_warnings",
+                       "Acreage": "acreage",
+                       "Acreage Warnings": "acreage_warnings",
+                       "OS Sheet Number": "os_sheet_numbers",
+                       "Field Date": "field_dates",
+                       "Field Date Warnings": "field_date_warnings",
+                       "Primary Date": "primary_dates",
+                       "Primary Date Warnings": "primary_date_warnings"}
+
+
+@dataclass(slots=True)
+class FarmRecord:
+    ''' Checked values and warnings for a farm. Each field is None until a value is found for it, which is output as an empty cell.
+
+        Keyword arguments:
+            types - list of the document types of the rows for the farm
+            and a set (or a list for the combined values) for each of the other output columns, see FARM_RECORD_COLUMNS
+    '''
+
+    types: list
+    reference_warnings: set = None
+    filenames: set = None
+    filename_warnings: set = None
+    type_warnings: set = None
+    farm_numbers: set = None
+    farm_number_warnings: set = None
+    farm_name: list = None
+    farm_name_warnings: set = None
+    landowner: list = None
+    landowner_warnings: set = None
+    farmer: list = None
+    farmer_warnings: set = None
+    acreage: set = None
+    acreage_warnings: set = None
+    os_sheet_numbers: set = None
+    field_dates: set = None
+    field_date_warnings: set = None
+    primary_dates: set = None
+    primary_date_warnings: set = None
+
+    def get_column(self, column):
+        ''' Gets the values for an output column
+
+            Keyword Arguments:
+                column - string with the output column name (a key of FARM_RECORD_COLUMNS)
+
+            Returns:
+                Set or list of values, or None if there are no values for the column
+        '''
+
+        return getattr(self, FARM_RECORD_COLUMNS[column])
+
+    def set_column(self, column, values):
+        ''' Sets the values for an output column, e.g. the combined values saved in the manifest by a previous run
+
+            Keyword Arguments:
+                column - string with the output column name (a key of FARM_RECORD_COLUMNS)
+                values - set or list of values
+
+            Returns:
+                No return
+        '''
+
+        setattr(self, FARM_RECORD_COLUMNS[column], values)
+
+    def to_columns(self):
+        ''' Gets the values for the farm by output column name, as used by the output writers
+
+            Returns:
+                Dictionary with the output column name as the key and the values as the value. Columns without any values are left out.
+        '''
+
+        columns = {}
+
+        for column, field_name in FARM_RECORD_COLUMNS.items():
+            values = getattr(self, field_name)
+            if values is not None:
+                columns[column] = values
+
+        return columns
+
+
+@dataclass(slots=True)
+class RowCounts:
+    ''' Number of rows for a farm, and the number with a value in each of the counted columns
+
+        Keyword arguments:
+            total - integer with the number of rows
+            row - integer with the row number of the first row for the farm
+    '''
+
+    total: int
+    row: int
+    farm_number: int = 0
+    types: int = 0
+    filenames: int = 0
+    acreage: int = 0
+    os_sheet_number: int = 0
+    field_date: int = 0
+    primary_date: int = 0
+
+
+@dataclass(slots=True)
+class PartyDetails:
+    ''' Uncombined details for the landowner, farmer or addressee of a farm, with a value in each list for each row
+
+        Keyword arguments:
+            titles - list of strings
+            individual_names - list of strings
+            group_names - list of lists of strings (the semi-colon separated group names)
+            addresses - list of lists of strings (the semi-colon separated addresses)
+    '''
+
+    titles: list = field(default_factory=list)
+    individual_names: list = field(default_factory=list)
+    group_names: list = field(default_factory=list)
+    addresses: list = field(default_factory=list)
+
+    def add_row(self, title, individual_name, group_names, addresses):
+        ''' Adds the values from a row
+
+            Keyword Arguments:
+                title - string
+                individual_name - string
+                group_names - string with the semi-colon separated group names
+                addresses - string with the semi-colon separated addresses
+
+            Returns:
+                No return
+        '''
+
+        self.titles.append(title)
+        self.individual_names.append(individual_name)
+        self.group_names.append(group_names.split(";"))
+        self.addresses.append(addresses.split(";"))
+
+    def to_dict(self):
+        ''' Gets the details by component name, as used by get_combined_details_by_ref
+
+            Returns:
+                Dictionary with the lists for 'Title', 'Individual Name', 'Group Names' and 'Addresses'
+        '''
+
+        return {"Title": self.titles, "Individual Name": self.individual_names, "Group Names": self.group_names, "Addresses": self.addresses}
+
+
+@dataclass(slots=True)
+class RawFarmInfo:
+    ''' Uncombined values for a farm, which are combined once all the rows for the farm have been read. Each field is None if no row had a value for it.
+
+        Keyword arguments:
+            farm_names - list of strings
+            landowner - PartyDetails
+            farmer - PartyDetails
+            addressee - PartyDetails
+    '''
+
+    farm_names: list = None
+    landowner: PartyDetails = None
+    farmer: PartyDetails = None
+    addressee: PartyDetails = None
+
+    def to_dict(self):
+        ''' Gets the values in the nested dictionary layout used before the records were added, which is what is hashed for the manifest (see processing_manifest.get_details_hash)
+
+            Returns:
+                Dictionary with any of 'Farm Name', 'Landowner', 'Farmer' and 'Addressee' that have values
+        '''
+
+        details = {}
+
+        if self.farm_names is not None:
+            details["Farm Name"] = self.farm_names
+
+        for name, party in (("Landowner", self.landowner), ("Farmer", self.farmer), ("Addressee", self.addressee)):
+            if party is not None:
+                details[name] = party.to_dict()
+
+        return details
+
+
+class ReferenceAllocator:
+    ''' Gives out references that aren't already in use, in the same way as nfs_document_checks.generate_ref: the proposed reference if it isn't in use, otherwise the part before the first hyphen followed by "-1", "-2" and so on, using the first one that isn't in use. Instead of trying every suffix from 1 each time, the first suffix that could be free is kept for each reference, so giving out a reference takes the same time however many times it has been used.
+
+        The references in use can only be added to (e.g. the keys of the farms dictionary as the rows are added), so a suffix that has been found to be in use stays in use.
+
+        Keyword arguments:
+            existing_refs - collection of the references in use (e.g. farms.keys()), which is checked each time a reference is given out
+    '''
+
+    __slots__ = ("existing_refs", "next_suffixes")
+
+    def __init__(self, existing_refs):
+        self.existing_refs = existing_refs
+        self.next_suffixes = {}
+
+    def allocate(self, base_ref):
+        ''' Gets a reference that isn't in use. The reference isn't added to the references in use.
+
+            Keyword Arguments:
+                base_ref - string with the proposed reference
+
+            Returns:
+                Reference string
+        '''
+
+        if base_ref not in self.existing_refs:
+            return base_ref
+
+        ref_stem = base_ref.split("-")[0]
+        suffix = self.next_suffixes.get(ref_stem, 1)
+
+        while ref_stem + "-" + str(suffix) in self.existing_refs:
+            suffix += 1
+
+        self.next_suffixes[ref_stem] = suffix
+
+        return ref_stem + "-" + str(suffix)
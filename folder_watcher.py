@@ -0,0 +1,76 @@
+# Watcher for the csv files in the processing folder
+#
+#   Used by the watch mode of nfs_document_checks (see watch_processing_folder) to find the csv files that need to be
+#   processed without any OS specific file notification APIs. The folder is polled and the size and modification time
+#   of each csv file are compared with the last poll. A file is only handed back once it has been the same on two polls
+#   in a row, so a file that is still being copied or saved into the folder is left until it has been fully written.
+#   Each file is handed back once for each new version, and a file that is removed and put back is handed back again.
+#
+
+# Classes:
+#   FolderWatcher(folder, pattern="*.csv")
+#       poll()
+#       retry(file)
+
+from pathlib import Path
+
+
+class FolderWatcher:
+    ''' Polls a folder for files that are new or have changed since they were last handed back
+
+        Keyword arguments:
+            folder - path to the folder to watch
+            pattern - optional glob pattern for the files to watch, "*.csv" by default
+    '''
+
+    def __init__(self, folder, pattern="*.csv"):
+        self.folder = Path(folder)
+        self.pattern = pattern
+        # (size, modification time) of each file found on the last poll that hasn't been handed back yet
+        self.pending = {}
+        # (size, modification time) of each file when it was last handed back
+        self.handed_back = {}
+
+    def poll(self):
+        ''' Checks the folder for files that have finished changing. Empty files are left until something has been written to them.
+
+            Returns:
+                List of paths of the files that are new or have changed and have had the same size and modification time since the last poll, in name order
+        '''
+
+        ready_files = []
+        current_files = {}
+
+        for file in sorted(self.folder.glob(self.pattern)):
+            try:
+                stat = file.stat()
+            except OSError:
+                # removed since the folder was listed
+                continue
+
+            signature = (stat.st_size, stat.st_mtime_ns)
+            current_files[file] = signature
+
+            if stat.st_size == 0 or self.handed_back.get(file) == signature:
+                continue
+
+            if self.pending.get(file) == signature:
+                ready_files.append(file)
+                self.handed_back[file] = signature
+
+        self.pending = {file: signature for file, signature in current_files.items() if self.handed_back.get(file) != signature}
+        self.handed_back = {file: signature for file, signature in self.handed_back.items() if file in current_files}
+
+        return ready_files
+
+    def retry(self, file):
+        ''' Hands a file back again on a later poll, even if it hasn't changed (e.g. if it couldn't be read because it was open in another program)
+
+            Keyword Arguments:
+                file - path of a file handed back by poll
+
+            Returns:
+                No return
+        '''
+
+        self.handed_back.pop(Path(file), None)
@@ -0,0 +1,104 @@
+# Reader for the rows of the csv files
+#
+#   The header is checked once when the file is opened and each of the input columns is mapped to its position, so a
+#   file without one of the columns fails straight away rather than part way through. Each row is then handed back as
+#   an InputRow, a named tuple with the input columns in a fixed order, instead of the dictionary built for every row by
+#   csv.DictReader. The values are read as attributes (e.g. row.county) and any extra columns are left out. The values
+#   of the columns in INTERNED_COLUMNS (the county, parish, document type and titles) are the same on row after row, so
+#   they are interned and every row shares the one string for each value.
+#
+#   Blank lines are skipped and short rows are padded with None, as csv.DictReader does, so the row numbers and values
+#   are the same as before.
+#
+
+# Functions:
+#   read_rows(csv_file)
+#   get_column_positions(header)
+#   get_rows(reader, positions, row_length)
+
+# Classes:
+#   InputRow
+
+import csv, sys
+from collections import namedtuple
+from operator import itemgetter
+
+# Input columns used by nfs_document_checks, in the order of the InputRow fields
+INPUT_COLUMNS = ("filename_1", "filename_2", "document_type", "county", "parish", "primary_farm_number", "additional_farms", "farm_name", "addressee_title", "addressee_individual_name", "addressee_group_names", "address", "owner_title", "owner_individual_name", "owner_group_names", "owner_address", "farmer_title", "farmer_individual_name", "farmer_group_names", "farmer_address", "acreage", "OS_map_sheet", "field_info_date", "primary_record_date")
+
+# Input columns with a small number of distinct values, which are interned
+INTERNED_COLUMNS = ("document_type", "county", "parish", "addressee_title", "owner_title", "farmer_title")
+
+# Values of a csv row with a field for each of INPUT_COLUMNS
+InputRow = namedtuple("InputRow", INPUT_COLUMNS)
+
+
+def read_rows(csv_file):
+    ''' Reads the header of a csv file and gets the rows as InputRow. A file with no header (an empty file) gives no rows.
+
+        Keyword Arguments:
+            csv_file - file object for the csv file, opened with newline=''
+
+        Returns:
+            Generator giving an InputRow for each row. Throws ValueError if any of the input columns are missing from the header
+    '''
+
+    reader = csv.reader(csv_file)
+    header = next(reader, None)
+
+    if header is None:
+        return iter(())
+
+    return get_rows(reader, get_column_positions(header), len(header))
+
+
+def get_column_positions(header):
+    ''' Gets the position of each input column in the header. If a column name is repeated the last one is used, as with csv.DictReader.
+
+        Keyword Arguments:
+            header - list of column names from the first row of the csv file
+
+        Returns:
+            List with the position of each of INPUT_COLUMNS in the row. Throws ValueError if any of the input columns are missing
+    '''
+
+    header_positions = {column: position for position, column in enumerate(header)}
+    missing_columns = [column for column in INPUT_COLUMNS if column not in header_positions]
+
+    if len(missing_columns) > 0:
+        raise ValueError("Missing input column(s): " + ", ".join(missing_columns) + ". The first row of the csv file must have the column names: " + ", ".join(INPUT_COLUMNS))
+
+    return [header_positions[column] for column in INPUT_COLUMNS]
+
+
+def get_rows(reader, positions, row_length):
+    ''' Gets the input columns from each row of a csv reader
+
+        Keyword Arguments:
+            reader - csv reader, after the header row
+            positions - list with the position of each of INPUT_COLUMNS (see get_column_positions)
+            row_length - integer with the number of columns in the header
+
+        Returns:
+            Generator giving an InputRow for each row
+    '''
+
+    get_values = itemgetter(*positions)
+    make_row = InputRow._make
+    intern = sys.intern
+    interned_positions = [positions[INPUT_COLUMNS.index(column)] for column in INTERNED_COLUMNS]
+    padding = [None] * row_length
+
+    for row in reader:
+        if len(row) == 0:
+            continue
+
+        if len(row) < row_length:
+            row += padding[len(row):]
+
+        for position in interned_positions:
+            value = row[position]
+            if value is not None:
+                row[position] = intern(value)
+
+        yield make_row(get_values(row))
@@ -1,20 +1,36 @@
 # Create a QA spreadsheet
 # 
-# Input Columns: filename_1, filename_2, document_type, county, parish, primary_farm_number, additional_farms, farm_name, addressee_title, addressee_individual_name, addressee_group_names, address, owner_title, owner_individual_name, owner_group_names, owner_address, farmer_title, farmer_individual_name, farmer_group_names, farmer_address, acreage, OS_map_sheet, field_info_date, primary_record_date
+# Input Columns: filename_1, filename_2, document_type, county, parish, primary_farm_number, additional_farms, farm_name, addressee_title, addressee_individual_name, addressee_group_names, address, owner_title, owner_individual_name, owner_group_names, owner_address, farmer_title, farmer_individual_name, farmer_group_names, farmer_address, acreage, OS_map_sheet, field_info_date, primary_record_date (see input_rows.py)
 #    
 # Output Columns: Expected Ref, Ref Warnings, Filenames, File Warnings, Type, Type Warnings, Farm Number, Farm Warnings, Farm Name, Farm Name Warnings, Landowner, Landowner Warnings, Farmer, Farmer Warnings, Acreage, OS Sheet Num, OS Warnings, Field Date, Field Date Warnings, Primary Date, Primary Date Warnings
 #
 # Need to match rows on filenames (before underscore) + farm number
 
 # Functions:
-#   load_spreadsheet_data(processing_folder)
-#   output_excel(output_file, values) 
+#   main(argv=None)
+#   load_spreadsheet_data(processing_folder, workers=1, streaming=False, persistent_cache=False, output_format="xlsx", incremental=False, profile=False, ref_workers=1, output_folder=None)
+#   watch_processing_folder(processing_folder, workers=1, streaming=False, persistent_cache=False, output_format="xlsx", profile=False, ref_workers=1, output_folder=None, poll_interval=WATCH_POLL_INTERVAL, max_polls=None)
+#   is_read_error(error, csv_file)
+#   process_watched_files(files, output_folder, streaming, output_format, manifest, pool=None)
+#   initialise_worker(cache_file=None, profile=False, alignment_engine=None, diff_engine=None)
+#   start_ref_pool(ref_workers, cache_file=None)
+#   close_ref_pool()
+#   process_csv_file(csv_file, output_folder, streaming=False, output_format="xlsx", previous_details=None, new_details=None)
+#   update_csv_file(csv_file, output_folder, streaming=False, output_format="xlsx", manifest_entry=None)
 #   filename_pattern_check(filename, row_num)
 #   reference_pattern_check(ref, row_num)
 #   filename_checks(filename1, filename2, type, row_num)
 #   doc_type_check(type, row_num)
-#   extract_farms(full_csv)
-#   generate_references(box_string, primary_farm_string, additional_farm_string, farm_type, row_num, existing_refs)
+#   extract_farms(full_csv, previous_details=None, new_details=None, row_nums=None, row_counts=None)
+#   extract_farms_by_box(full_csv, previous_details=None, new_details=None)
+#   rename_repeated_refs(farms, box, box_refs, box_ref_allocators)
+#   add_farm_row(row, row_num, ref_component, filename_warnings, farms, raw_farm_info, row_counts, ref_allocator=None)
+#   combine_farm_details(farms, raw_farm_info, previous_details=None, new_details=None)
+#   get_saved_column(farm, column)
+#   get_combined_ref_details(raw_farm_info)
+#   combine_ref_chunk(raw_farm_info)
+#   add_combined_ref_details(farms, combined_details)
+#   generate_references(box_string, primary_farm_string, additional_farm_string, farm_type, row_num, ref_allocator)
 #   generate_ref(base_ref, existing_refs)
 #   generate_farm_number_for_record(county, parish, farm_nums, ref)
 #   generate_farm_numbers(county, parish, farm_nums)
@@ -25,9 +41,14 @@
 #   generate_name(title_value, name_value, group_value, addy_value)
 #   array_zip(details_array, key = "")
 #   dic_merge(dic1, dic2)
+#   add_ref_results(values, warnings, new_values, new_warnings)
 #   date_processing(field_date, primary_dates, row_num)
 #   date_check(potential_date, row_num)
+#   date_check_column(potential_dates, row_nums)
 #   get_similarity_range(values, get_min = True, get_max = True)
+#   get_similarity_ranges(value_groups)
+#   is_similarity_below(values, threshold)
+#   get_distinct_values(values)
 
 
 #####################
@@ -37,85 +58,438 @@
 #   Create full range of test spreadsheets
 
 
-import csv, re, datetime
+import argparse, re, datetime, multiprocessing, multiprocessing.util, sys, time
 import data_normalisation as dn
+import date_parsing as dp
+import nfs_warnings as nw
+import processing_manifest as pm
+import profiling
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment
-#from openpyxl.worksheet.dimensions import ColumnDimension, DimensionHolder
-from openpyxl.utils import get_column_letter
-from rapidfuzz import fuzz
+from farm_records import FarmRecord, RowCounts, RawFarmInfo, PartyDetails, ReferenceAllocator
+from folder_watcher import FolderWatcher
+from input_rows import read_rows
+# output_excel is also imported so that existing code calling nfs_document_checks.output_excel keeps working
+from output_writers import get_output_writer, save_output, output_excel, OUTPUT_WRITERS
+from rapidfuzz import fuzz, process
 
-def load_spreadsheet_data(processing_folder):
-    ''' Processes any csv files in the designated processing folder
+# Name of the SQLite file in the processing folder used to save normalisation results between runs
+NORMALISATION_CACHE_FILE = "normalisation_cache.sqlite"
+
+# Output columns filled in by combine_farm_details
+COMBINED_COLUMNS = ["Farm Name", "Farm Name Warnings", "Landowner", "Landowner Warnings", "Farmer", "Farmer Warnings"]
+
+# Number of references combined in each task when the combination passes are run on the reference pool (see start_ref_pool). Boxes with fewer references than this are combined in the current process.
+REF_CHUNK_SIZE = 25
+
+# Number of pairs of values above which get_similarity_ranges scores the pairs in one batch with process.cpdist rather than one at a time
+SIMILARITY_BATCH_THRESHOLD = 25
+
+# Number of seconds between checks of the processing folder in watch mode (see watch_processing_folder)
+WATCH_POLL_INTERVAL = 5
+
+# Pool of processes used by combine_farm_details, None if the combination passes are run in the current process
+ref_pool = None
+
+def main(argv=None):
+    ''' Processes the csv files in a processing folder from the command line, e.g. "python nfs_document_checks.py processing --workers 4 --format csv". With no arguments the csv files in the processing folder are processed one at a time and saved as spreadsheets in processing/output, as when the NFS_QA application is double clicked.
+    
+        Keyword Arguments:
+            argv - optional list of command line arguments. None by default, in which case sys.argv is used
+            
+        Returns:
+            Integer exit code, 1 if any of the files couldn't be processed otherwise 0
+    '''
+    
+    parser = argparse.ArgumentParser(description="Check the National Farm Survey csv files in a processing folder and save the QA results")
+    parser.add_argument("processing_folder", nargs="?", default="processing", help="folder containing the csv files (processing by default)")
+    parser.add_argument("-o", "--output-folder", help="folder the results are saved in (the output folder in the processing folder by default). Created if it doesn't exist.")
+    parser.add_argument("-w", "--workers", type=int, default=1, help="number of files processed at once (1 by default, 0 for one per CPU core)")
+    parser.add_argument("--ref-workers", type=int, default=1, help="number of processes used to combine the values of a single file (1 by default, 0 for one per CPU core)")
+    parser.add_argument("-f", "--format", choices=list(OUTPUT_WRITERS.keys()), default="xlsx", help="format of the output files (xlsx by default)")
+    parser.add_argument("--streaming", action="store_true", help="combine and save the farms one MAF 32 box at a time")
+    parser.add_argument("--persistent-cache", action="store_true", help="save the combined values in the processing folder to be reused by later runs")
+    parser.add_argument("--incremental", action="store_true", help="skip the files that haven't changed since the last run")
+    parser.add_argument("--profile", action="store_true", help="print and save the time spent in each stage")
+    parser.add_argument("--alignment-engine", choices=dn.ALIGNMENT_ENGINES, default=dn.ALIGNMENT_ENGINE, help="how the words of two variations are lined up (" + dn.ALIGNMENT_ENGINE + " by default). dp scores every alignment of the words at once and can line up one word with two.")
+    parser.add_argument("--diff-engine", choices=dn.DIFF_ENGINES, default=dn.DIFF_ENGINE, help="how the letters of two similar words are lined up (" + dn.DIFF_ENGINE + " by default). rapidfuzz is faster but gives slightly different corrections for some words.")
+    parser.add_argument("--watch", action="store_true", help="keep running and process each csv file as soon as it is added to or changed in the processing folder (stop with Ctrl+C). Unchanged files are skipped as with --incremental.")
+    parser.add_argument("--poll-interval", type=float, default=WATCH_POLL_INTERVAL, help="number of seconds between checks of the processing folder in watch mode (" + str(WATCH_POLL_INTERVAL) + " by default)")
+    args = parser.parse_args(argv)
+    
+    dn.set_alignment_engine(args.alignment_engine)
+    dn.set_diff_engine(args.diff_engine)
+    
+    if args.output_folder is not None:
+        Path(args.output_folder).mkdir(parents=True, exist_ok=True)
+    
+    if args.watch:
+        watch_processing_folder(args.processing_folder, args.workers, args.streaming, args.persistent_cache, args.format, args.profile, args.ref_workers, args.output_folder, args.poll_interval)
+        return 0
+    
+    results = load_spreadsheet_data(args.processing_folder, args.workers, args.streaming, args.persistent_cache, args.format, args.incremental, args.profile, args.ref_workers, args.output_folder)
+    
+    for output_file, error in results.values():
+        if error != "":
+            return 1
+    
+    return 0
+
+
+def load_spreadsheet_data(processing_folder, workers=1, streaming=False, persistent_cache=False, output_format="xlsx", incremental=False, profile=False, ref_workers=1, output_folder=None):
+    ''' Processes any csv files in the designated processing folder. If more than one worker is requested then the files are shared out across a pool of processes, with each file processed in its own worker. The output files are the same as for a sequential run.
 
         Keyword Arguments:
             processing_folder - string with path to folder
+            workers - optional integer with the number of worker processes to use. 1 by default which processes the files one at a time in the current process. If 0 or None then one worker per CPU core is used.
+            streaming - optional boolean, False by default. If True the farms are combined and written out one MAF 32 box at a time (see extract_farms_by_box) to keep memory use down on large files
+            persistent_cache - optional boolean, False by default. If True the combined names, owner and farmer details are saved in an SQLite file in the processing folder and reused by later runs, so a rerun only has to combine the values that have changed
+            output_format - optional string with the format of the output files: "xlsx" (default), "csv", "jsonl" or "parquet" (see output_writers.py)
+            incremental - optional boolean, False by default. If True a manifest of the processed files is kept in the output folder (see processing_manifest.py). Files that haven't changed since the last run are skipped and, for files that have changed, the combined values are reused for any reference whose rows haven't changed.
+            profile - optional boolean, False by default. If True the time spent in each stage and the number of fuzz and difflib calls are recorded for each file (see profiling.py), printed as a table and saved as JSON next to the output file
+            ref_workers - optional integer with the number of processes used to run the farm name, landowner and farmer combination passes for each file (see start_ref_pool). 1 by default which runs them in the same process as the rest of the file. If 0 or None then one process per CPU core is used. Only used when the files are processed one at a time (workers is 1 or there is a single file), so that a single large file can use every core.
+            output_folder - optional path to the folder the output files (and the manifest) are saved in. None by default, which uses the output folder in the processing folder.
             
         Returns:
-            No returns but throws OSError is file can't be read
+            Dictionary with the path of each csv file as the key and a tuple containing the path to the saved output file (None if the file failed) and a string with the error message ("" if the file was processed). Throws ValueError if the output format isn't recognised
     '''
     
-    try: 
-        for file in Path(processing_folder).glob("*.csv"):     
-  
-            base_filename = Path(file).stem
-            print("Processing file:" + str(base_filename))   
-                        
-            with open(file, newline='') as f:
-                values = csv.DictReader(f) 
-                farm_values = extract_farms(values)  
-                #print(farm_values)                
+    # check the format before any files are processed
+    get_output_writer(output_format)
+    
+    if output_folder is None:
+        output_folder = Path(processing_folder, "output")
+    else:
+        output_folder = Path(output_folder)
+    files = sorted(Path(processing_folder).glob("*.csv"))
+    results = {}
+    
+    if persistent_cache:
+        cache_file = Path(processing_folder, NORMALISATION_CACHE_FILE)
+    else:
+        cache_file = None
+    
+    if incremental:
+        manifest_file = Path(output_folder, pm.MANIFEST_FILE)
+        manifest = pm.load_manifest(manifest_file, dn.get_algorithm_version())
+        tasks = {file: (update_csv_file, (file, output_folder, streaming, output_format, manifest["files"].get(file.name))) for file in files}
+    else:
+        tasks = {file: (process_csv_file, (file, output_folder, streaming, output_format)) for file in files}
+    
+    if workers == 1 or len(files) < 2:
+        initialise_worker(cache_file, profile)
+        
+        if ref_workers != 1:
+            start_ref_pool(ref_workers, cache_file)
             
-            #print(file)    
-            output_excel(Path(processing_folder, "output", base_filename + ".xlsx"), farm_values)
+        try:
+            for file, task in tasks.items():
+                function, args = task
+                try:
+                    results[file] = (function(*args), "")
+                except Exception as e:
+                    results[file] = (None, str(e))
+        finally:
+            close_ref_pool()
                 
-    except OSError as e:
-        print("Error in data loading: " + e)
+        dn.close_persistent_cache()
+        profiling.disable()
+    else:
+        # each worker opens its own connection to the persistent cache, keeps its own profile and is given the alignment engine in use here
+        with ProcessPoolExecutor(max_workers=workers or None, initializer=initialise_worker, initargs=(cache_file, profile, dn.ALIGNMENT_ENGINE, dn.DIFF_ENGINE)) as pool:
+            futures = {file: pool.submit(function, *args) for file, (function, args) in tasks.items()}
+            
+            for file, future in futures.items():
+                try:
+                    results[file] = (future.result(), "")
+                except Exception as e:
+                    results[file] = (None, str(e))
+    
+    if incremental:
+        # files that failed or are no longer in the processing folder are dropped from the manifest so they are processed in full next time
+        manifest["files"] = {}
+        for file, result in results.items():
+            file_result, error = result
+            if error == "":
+                output_file, manifest_entry = file_result
+                manifest["files"][file.name] = manifest_entry
+                results[file] = (output_file, error)
+        
+        try:
+            pm.save_manifest(manifest_file, manifest)
+        except OSError as e:
+            print("Error in saving manifest: " + str(e))
+    
+    for file, result in results.items():
+        output_file, error = result
+        if error != "":
+            print("Error in data loading (" + str(Path(file).name) + "): " + error)
+                
+    return results
         
 
-def output_excel(output_file, values):
-    ''' Saves a spreadsheet containing the processed values for QA checking
+def watch_processing_folder(processing_folder, workers=1, streaming=False, persistent_cache=False, output_format="xlsx", profile=False, ref_workers=1, output_folder=None, poll_interval=WATCH_POLL_INTERVAL, max_polls=None):
+    ''' Watch mode. Keeps running and processes each csv file in the processing folder as soon as it has been fully written (see folder_watcher.py), and again whenever it is changed. The worker processes and the normalisation caches are kept between files, so each file is processed without the start up time of a new run. As with an incremental run the manifest is kept in the output folder, so files that haven't changed since they were last processed are skipped and the combined values are reused for any reference whose rows haven't changed. The output files are written under a temporary name and moved into place once they are complete (see output_writers.save_output). A file that couldn't be read (e.g. because it is open in another program) is tried again on the next poll, but a file that couldn't be processed or saved is left until it is changed.
     
-        keyword Arguments:
-            output_file - path to output file
-            values - nested dictionary of values to be output. The top keys are the unique reference for each farm and nested below that are the values for that farm with the column name as the keys
+        Keyword Arguments:
+            processing_folder - string with path to folder
+            workers - optional integer with the number of worker processes, 1 by default. The files found on each poll are shared out across the workers (see load_spreadsheet_data).
+            streaming - optional boolean, False by default (see load_spreadsheet_data)
+            persistent_cache - optional boolean, False by default (see load_spreadsheet_data)
+            output_format - optional string with the format of the output files, "xlsx" by default (see load_spreadsheet_data)
+            profile - optional boolean, False by default (see load_spreadsheet_data)
+            ref_workers - optional integer, 1 by default (see load_spreadsheet_data)
+            output_folder - optional path to the folder the output files are saved in, None by default (see load_spreadsheet_data)
+            poll_interval - optional number of seconds between checks of the folder, WATCH_POLL_INTERVAL by default
+            max_polls - optional integer with the number of checks of the folder to make before stopping. None by default, which keeps watching until stopped with Ctrl+C.
             
-        Outputs:
-            No return but throws OSError if the specified file can't be saved. 
+        Returns:
+            No return. Throws ValueError if the output format isn't recognised
+    '''
+    
+    get_output_writer(output_format)
+    
+    if output_folder is None:
+        output_folder = Path(processing_folder, "output")
+    else:
+        output_folder = Path(output_folder)
+    
+    if persistent_cache:
+        cache_file = Path(processing_folder, NORMALISATION_CACHE_FILE)
+    else:
+        cache_file = None
+    
+    # nothing else on the watch path creates the output folder
+    output_folder.mkdir(parents=True, exist_ok=True)
+    
+    manifest_file = Path(output_folder, pm.MANIFEST_FILE)
+    manifest = pm.load_manifest(manifest_file, dn.get_algorithm_version())
+    watcher = FolderWatcher(processing_folder)
+    pool = None
+    polls = 0
+    
+    if workers == 1:
+        initialise_worker(cache_file, profile)
+        if ref_workers != 1:
+            start_ref_pool(ref_workers, cache_file)
+    else:
+        pool = ProcessPoolExecutor(max_workers=workers or None, initializer=initialise_worker, initargs=(cache_file, profile, dn.ALIGNMENT_ENGINE, dn.DIFF_ENGINE))
+    
+    print("Watching " + str(processing_folder) + " for csv files (Ctrl+C to stop)")
+    
+    try:
+        while max_polls is None or polls < max_polls:
+            files = watcher.poll()
+            
+            if len(files) > 0:
+                for file, error in process_watched_files(files, output_folder, streaming, output_format, manifest, pool).items():
+                    if error is not None:
+                        print("Error in data loading (" + file.name + "): " + str(error))
+                        # files that couldn't be read (e.g. open in another program) are tried again. Other errors, such as an output file that couldn't be saved, would happen again on every poll, so the file is left until it is changed
+                        if is_read_error(error, file):
+                            watcher.retry(file)
+                
+                manifest["files"] = {name: entry for name, entry in manifest["files"].items() if Path(processing_folder, name).exists()}
+                try:
+                    pm.save_manifest(manifest_file, manifest)
+                except OSError as e:
+                    print("Error in saving manifest: " + str(e))
+            
+            polls += 1
+            if max_polls is None or polls < max_polls:
+                time.sleep(poll_interval)
+    except KeyboardInterrupt:
+        print("Stopped watching " + str(processing_folder))
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+        close_ref_pool()
+        dn.close_persistent_cache()
+        profiling.disable()
+
+
+def is_read_error(error, csv_file):
+    ''' Checks whether an error raised when processing a file in watch mode came from reading the csv file (e.g. because it is open in another program), rather than from processing it or saving the output
+    
+        Keyword Arguments:
+            error - exception raised when processing the file
+            csv_file - path to the csv file
+            
+        Returns:
+            Boolean, True if the csv file couldn't be read
+    '''
+    
+    return isinstance(error, OSError) and error.filename is not None and Path(error.filename).resolve() == Path(csv_file).resolve()
+
+
+def process_watched_files(files, output_folder, streaming, output_format, manifest, pool=None):
+    ''' Processes the files found by a poll of the processing folder in watch mode, skipping any that haven't changed since they were last processed (see update_csv_file)
+    
+        Keyword Arguments:
+            files - list of paths to the csv files
+            output_folder - path to the folder where the output is saved
+            streaming - boolean. If True the farms are extracted and written one MAF 32 box at a time
+            output_format - string with the format of the output files
+            manifest - dictionary with the manifest, which is updated with the new entry for each file. The entry for a file that fails is removed so it is processed in full next time.
+            pool - optional ProcessPoolExecutor to process the files in. None by default, in which case they are processed one at a time in the current process.
+            
+        Returns:
+            Dictionary with the path of each csv file as the key and the exception raised when processing it (None if the file was processed) as the value
     '''
     
-    wb = Workbook()
-    sheet = wb.active
+    errors = {}
+    tasks = {file: (file, output_folder, streaming, output_format, manifest["files"].get(file.name)) for file in files}
     
-    headings = ["Reference", "Reference Warnings", "Filenames", "Filename Warnings", "Type", "Type Warnings", "Farm Number", "Farm Number Warnings", "Farm Name", "Farm Name Warnings", "Landowner", "Landowner Warnings", "Farmer", "Farmer Warnings", "Acreage", "Acreage Warnings", "OS Sheet Number", "Field Date", "Field Date Warnings", "Primary Date", "Primary Date Warnings"]
-    default_widths = [20, 20, 30, 20, 15, 20, 15, 20, 30, 20, 30, 20, 30, 20,15, 20, 15, 15, 20, 15, 20]
+    if pool is not None:
+        futures = {file: pool.submit(update_csv_file, *args) for file, args in tasks.items()}
+    
+    for file, args in tasks.items():
+        try:
+            if pool is not None:
+                output_file, manifest_entry = futures[file].result()
+            else:
+                output_file, manifest_entry = update_csv_file(*args)
+            manifest["files"][file.name] = manifest_entry
+            errors[file] = None
+        except Exception as e:
+            manifest["files"].pop(file.name, None)
+            errors[file] = e
     
-    for i in range(0, len(headings)):
-        column = headings[i]
-        col_num = i+1
+    return errors
+
+
+def initialise_worker(cache_file=None, profile=False, alignment_engine=None, diff_engine=None):
+    ''' Sets up the persistent cache and profiling for the process the files are processed in. Run in the current process for sequential runs and at the start of each worker process for parallel runs.
+    
+        Keyword Arguments:
+            cache_file - optional path to the SQLite file for the persistent cache. None by default, in which case no persistent cache is used
+            profile - optional boolean, False by default. If True profiling is enabled
+            alignment_engine - optional string with the alignment engine for data_normalisation to use (see data_normalisation.set_alignment_engine). None by default, in which case the engine isn't changed
+            diff_engine - optional string with the diff engine for data_normalisation to use (see data_normalisation.set_diff_engine). None by default, in which case the engine isn't changed
+            
+        Returns:
+            No return
+    '''
+    
+    if alignment_engine is not None:
+        dn.set_alignment_engine(alignment_engine)
         
-        sheet.cell(1, col_num, column).font = Font(bold=True)
-        sheet.column_dimensions[get_column_letter(col_num)].width = default_widths[i]  
+    if diff_engine is not None:
+        dn.set_diff_engine(diff_engine)
+    
+    if cache_file is not None:
+        dn.use_persistent_cache(cache_file)
+        # worker processes are stopped when their pool is shut down, so the cache is closed (saving anything not yet flushed) as the process exits
+        if multiprocessing.parent_process() is not None:
+            multiprocessing.util.Finalize(None, dn.close_persistent_cache, exitpriority=10)
         
-        row = 2
-        for ref in values:
-            sheet.cell(row, 1, ref)
+    if profile:
+        profiling.enable(sys.modules[__name__])
+
+
+def start_ref_pool(ref_workers, cache_file=None):
+    ''' Starts the pool of processes used by combine_farm_details to run the combination passes. The references are independent of each other, so they are split into chunks of REF_CHUNK_SIZE which are combined in parallel and added back to the farms in reference order. The output is the same as when the passes are run in the current process. Any pool that has already been started is closed first.
+    
+        Keyword Arguments:
+            ref_workers - integer with the number of processes. If 0 or None then one process per CPU core is used.
+            cache_file - optional path to the SQLite file for the persistent cache, None by default
             
-            farm_values = values[ref]
-            #print(ref + ": " + ", ".join(farm_values))
+        Returns:
+            No return
+    '''
+    
+    global ref_pool
+    
+    close_ref_pool()
+    
+    # the processes use the same cache and engines as this one but aren't profiled, so when profiling the time spent in the combination passes only shows up in extract_farms
+    ref_pool = ProcessPoolExecutor(max_workers=ref_workers or None, initializer=initialise_worker, initargs=(cache_file, False, dn.ALIGNMENT_ENGINE, dn.DIFF_ENGINE))
+
+
+def close_ref_pool():
+    ''' Shuts down the pool started by start_ref_pool, if there is one, so that combine_farm_details goes back to running the combination passes in the current process
+    
+        Returns:
+            No return
+    '''
+    
+    global ref_pool
+    
+    if ref_pool is not None:
+        ref_pool.shutdown()
+        ref_pool = None
+
+
+def process_csv_file(csv_file, output_folder, streaming=False, output_format="xlsx", previous_details=None, new_details=None):
+    ''' Reads a single csv file, extracts the farm values and saves them in a file with the same name in the output folder. Used directly for sequential runs and as the task run by each worker when files are processed in parallel.
+    
+        Keyword Arguments:
+            csv_file - path to the csv file
+            output_folder - path to the folder where the spreadsheet is saved
+            streaming - optional boolean, False by default. If True the farms are extracted and written one MAF 32 box at a time
+            output_format - optional string with the format of the output file, "xlsx" by default. Also used as the file extension.
+            previous_details - optional dictionary of combined values from a previous run by details hash, passed on to combine_farm_details
+            new_details - optional dictionary which is updated with the combined values for this run by details hash, passed on to combine_farm_details
+            
+        Returns:
+            Path to the saved output file. Throws OSError if the file can't be read or the output can't be saved and ValueError if any of the input columns are missing from the file
+    '''
+    
+    base_filename = Path(csv_file).stem
+    print("Processing file:" + str(base_filename))   
+    output_writer = get_output_writer(output_format)
+    
+    if profiling.is_enabled():
+        profiling.reset()
+    output_file = Path(output_folder, base_filename + "." + output_format)
+                
+    with open(csv_file, newline='') as f:
+        values = read_rows(f)
+        if streaming:
+            farm_values = extract_farms_by_box(values, previous_details, new_details)
+        else:
+            farm_values = extract_farms(values, previous_details, new_details)  
+        
+        save_output(output_writer, output_file, farm_values)
+    
+    # save the results added to the persistent cache so they aren't lost if a worker process is stopped
+    if dn.persistent_cache is not None:
+        dn.persistent_cache.flush()
+    
+    if profiling.is_enabled():
+        profiling.print_summary(base_filename)
+        profiling.save_report(output_file)
+    
+    return output_file
+
 
-            if column != "Reference" and column in farm_values.keys():
-                sheet.cell(row, headings.index(column)+1, ",\n".join(farm_values[column])).alignment = Alignment(wrap_text=True, vertical='top')
+def update_csv_file(csv_file, output_folder, streaming=False, output_format="xlsx", manifest_entry=None):
+    ''' Incremental version of process_csv_file. If the csv file and settings are the same as when the file was last processed and the output file is still there then the file is skipped. Otherwise the file is processed, reusing the combined values from the last run for any reference whose rows haven't changed.
+    
+        Keyword Arguments:
+            csv_file - path to the csv file
+            output_folder - path to the folder where the output is saved
+            streaming - optional boolean, False by default. If True the farms are extracted and written one MAF 32 box at a time
+            output_format - optional string with the format of the output file, "xlsx" by default
+            manifest_entry - optional dictionary with the manifest entry for the file from the last run. None if the file hasn't been processed before.
             
-            sheet.row_dimensions[row].height = None
-            row+=1
+        Returns:
+            Tuple containing the path to the output file and the new manifest entry for the file. Throws OSError if the file can't be read or the output can't be saved
+    '''
     
-    try:           
-        wb.save(output_file)
-        print("Saving " + str(output_file))       
-    except OSError as e:
-        print("Error in saving spreadsheet: " + e)
+    output_file = Path(output_folder, Path(csv_file).stem + "." + output_format)
+    file_hash = pm.get_file_hash(csv_file, [dn.get_algorithm_version(), output_format, streaming])
+    
+    if manifest_entry is not None and manifest_entry["hash"] == file_hash and manifest_entry["output_file"] == output_file.name and output_file.exists():
+        print("Skipping unchanged file:" + str(Path(csv_file).stem))
+        return (output_file, manifest_entry)
+    
+    previous_details = manifest_entry["references"] if manifest_entry is not None else {}
+    new_details = {}
+    
+    output_file = process_csv_file(csv_file, output_folder, streaming, output_format, previous_details, new_details)
+    
+    return (output_file, {"hash": file_hash, "output_file": output_file.name, "references": new_details})
         
 
 def filename_pattern_check(filename, row_num):
@@ -126,25 +500,25 @@ def filename_pattern_check(filename, row_num):
         row_num - string with number of row in spreadsheet
         
     Returns:
-        Tuple containing the central part of the filename and the final count at the end of the filename, a warning or raises an ValueError  
+        Tuple containing the central part of the filename, the final count at the end of the filename and an NFSWarning (None if there is no warning), or raises a WarningError (a ValueError carrying the NFSWarning)  
     '''
     
     if filename != "":
         if m := re.match(r"^MAF32-(\d*-\d*)( Pt\d*)?_(\d*).tif$", filename):
             ref_component = m.group(1)
             iteration_num = m.group(3)
-            return (ref_component, iteration_num, "")
+            return (ref_component, iteration_num, None)
         if m := re.match(r"^MAF32-(\d*-\d*)( Pt\d*)?.tif$", filename):
             ref_component = m.group(1)
-            return (ref_component, 0, "Row " + row_num + ": " + filename + " matches expected cover pattern. Error is this is not a cover.")
+            return (ref_component, 0, nw.make_warning("FILENAME_COVER_PATTERN", filename, row=row_num))
         elif m := re.match(r"^MAF32-(\d*-\d*).*(\d*)?.tif$", filename):
             ref_component = m.group(1)
             iteration_num = m.group(2)
-            return (ref_component, iteration_num, "Row " + row_num + ": " + filename + " does not match expected pattern. Provisional values have been extracted to use in the reference but their accuracy cannot be guaranteed.")                       
+            return (ref_component, iteration_num, nw.make_warning("FILENAME_PROVISIONAL", filename, row=row_num))                       
         else:   
-            raise ValueError("Row " + row_num + ": " + filename + " does not match expected pattern. Further checks on filenames could not be carried out and an accurate reference could not be generated.")
+            raise nw.WarningError(nw.make_warning("FILENAME_PATTERN", filename, row=row_num))
     else:
-        raise ValueError("Row " + row_num + ": Error - Blank filename found. Further checks on the filename could not be carried out and an accurate reference could not be generated.")        
+        raise nw.WarningError(nw.make_warning("FILENAME_BLANK", row=row_num))        
 
 
 def reference_pattern_check(ref, row_num):
@@ -155,7 +529,7 @@ def reference_pattern_check(ref, row_num):
         row_num - string with number of row in spreadsheet
         
     Returns:   
-        The reference value or raises a ValueError   
+        The reference value or raises a WarningError (a ValueError carrying the NFSWarning)   
     '''
     
     if ref != "":
@@ -164,9 +538,9 @@ def reference_pattern_check(ref, row_num):
             return (ref)
         else:
             #print(ref + " not match pattern.")
-            raise ValueError("Row " + row_num + ": " + ref + " does not match expected pattern. Further work with this reference may contain inaccuracies.")
+            raise nw.WarningError(nw.make_warning("REFERENCE_PATTERN", ref, row=row_num))
     else:
-        raise ValueError("Row " + row_num + ": Error - Blank reference found. Further work with this reference could not be carried out and farm information could not be generated.")        
+        raise nw.WarningError(nw.make_warning("REFERENCE_BLANK", row=row_num))        
         
          
 # Group 1: Filenames 
@@ -188,7 +562,7 @@ def filename_checks(filename1, filename2, type, row_num):
             row_num - string with number of row in spreadsheet 
             
         Returns:
-            Tuple containing the central part of the filename for use in the reference and a set of warnings
+            Tuple containing the central part of the filename for use in the reference and a set of NFSWarning
     '''
     warnings = set()
     
@@ -198,10 +572,10 @@ def filename_checks(filename1, filename2, type, row_num):
         try:
             ref_part1, iteration_num1, warning = filename_pattern_check(filename1, row_num)
             #print(row_num + ": " + ref_part1 + ", warning: " + warning)
-            if warning != "":
+            if warning is not None:
                 warnings.add(warning)
         except ValueError as e:
-            warnings.add(str(e))
+            warnings.add(nw.get_error_warning(e, row_num))
             ref_part1 = ""
             iteration_num1 = -1
             #print(iteration_num1 + ": " + iteration_num2)
@@ -210,7 +584,7 @@ def filename_checks(filename1, filename2, type, row_num):
         try:
             if filename2 != "":
                 ref_part2, iteration_num2, warning = filename_pattern_check(filename2, row_num)
-                if warning != "":
+                if warning is not None:
                     warnings.add(warning)
             else:
                 ref_part2 = ""
@@ -219,17 +593,17 @@ def filename_checks(filename1, filename2, type, row_num):
             if type != "Cover" and (type == "Other" and ref_part2 != ""):
                 # check two - centre sections match
                 if ref_part1 != ref_part2 and ref_part1 != "":
-                    warnings.add("Row " + row_num + ": Mismatch in the file names: " + filename1 + ", " + filename2)
+                    warnings.add(nw.make_warning("FILENAME_MISMATCH", filename1, filename2, row=row_num))
                 
                 # check three - sequence
                 if (iteration_num1 != "" and iteration_num2 != "") and (int(iteration_num1) != int(iteration_num2) + 1) and (int(iteration_num1) != int(iteration_num2) - 1) and int(iteration_num1) > 0:
-                    warnings.add("Row " + row_num + ": File names (" + iteration_num1 + " and " + iteration_num2 + ") are not consecutive")
+                    warnings.add(nw.make_warning("FILENAME_NOT_CONSECUTIVE", iteration_num1, iteration_num2, row=row_num))
             
             # check four - number of filenames
             if (ref_part1 == "" or ref_part2 == "") and type != "Cover" and type != "Other":
-                warnings.add("Row " + row_num + ": Only one file name given (" + iteration_num1 + iteration_num2 + ")")                    
+                warnings.add(nw.make_warning("FILENAME_SINGLE", iteration_num1 + iteration_num2, row=row_num))                    
             elif type == "Cover" and ref_part2 != "":
-                warnings.add("Row " + row_num + ": Type is cover but two file names given (" + iteration_num1 + iteration_num2 + ")")
+                warnings.add(nw.make_warning("FILENAME_COVER_TWO", iteration_num1 + iteration_num2, row=row_num))
  
 
             #print(iteration_num1 + ": " + iteration_num2)
@@ -241,10 +615,10 @@ def filename_checks(filename1, filename2, type, row_num):
                 return (ref_part2, warnings)            
         
         except ValueError as e:
-            warnings.add(str(e))
+            warnings.add(nw.get_error_warning(e, row_num))
             return ("0-0", warnings)
     else:
-        warnings.add("Row " + row_num + ": Error - File names missing")
+        warnings.add(nw.make_warning("FILENAMES_MISSING", row=row_num))
         return ("0-0", warnings)
         
     
@@ -264,7 +638,7 @@ def doc_type_check(type, row_num):
             row_num - string with number of row in spreadsheet        
              
         Returns: 
-            Type value as string or raises a ValueError
+            Type value as string or raises a WarningError (a ValueError carrying the NFSWarning)
     '''
     
     allowed_types = ["B496/EI", "C 47/SSY", "C 49/SSY", "C51/SSY", "SF", "SF C69/SSY", "Other", "Cover"]
@@ -272,382 +646,587 @@ def doc_type_check(type, row_num):
     if type in allowed_types:
         return type
     else:
-        raise ValueError("Row " + row_num + ": Unknown document type (" + type + ") found.")
+        raise nw.WarningError(nw.make_warning("UNKNOWN_TYPE", type, row=row_num))
     
 
-def extract_farms(full_csv):
+def extract_farms(full_csv, previous_details=None, new_details=None, row_nums=None, row_counts=None):
     ''' Extracts the data for each farm from the CSV data, checks it and returns the collated data and warnings for each farm (by reference)
     
         Keyword Arguments:
-            full_csv - dictionary with the values from the CSV and the column headings as keys
+            full_csv - iterable of InputRow with the values from each row of the CSV (see input_rows.read_rows)
+            previous_details - optional dictionary of combined values from a previous run by details hash (see combine_farm_details)
+            new_details - optional dictionary which is updated with the combined values for this run by details hash (see combine_farm_details)
+            row_nums - optional iterable with the number of each row in the spreadsheet, for when only some of the rows are given (e.g. a shard, see shards.py). None by default, in which case the rows are numbered from 2.
+            row_counts - optional dictionary which is updated with the RowCounts for each reference, including the number of the first row for the farm. None by default.
     
         Returns:
-            Farm values and warnings in a nested dictionary using the farm reference as a keys and the output column names as the second level keys
+            Dictionary with a FarmRecord with the farm values and warnings for each farm, using the farm reference as the key
     '''
     
     farms = {}
-    row_counts = {}
     raw_farm_info = {}    
+    ref_allocator = ReferenceAllocator(farms.keys())
+    
+    if row_counts is None:
+        row_counts = {}
+    
+    if row_nums is None:
+        numbered_rows = enumerate(full_csv, 2)
+    else:
+        numbered_rows = zip(row_nums, full_csv)
+    
+    for row_num, row in numbered_rows:
+        ref_component, filename_warnings = filename_checks(row.filename_1.strip(), row.filename_2.strip(), row.document_type, str(row_num))
+        add_farm_row(row, row_num, ref_component, filename_warnings, farms, raw_farm_info, row_counts, ref_allocator)
+    
+    combine_farm_details(farms, raw_farm_info, previous_details, new_details)
+                
+    return (farms)  
+
+
+def extract_farms_by_box(full_csv, previous_details=None, new_details=None):
+    ''' Streaming version of extract_farms. Rows are read one at a time and, as soon as a row from a new MAF 32 box is found, the farms for the completed box are combined and handed back before being dropped from memory. The peak memory used depends on the size of the largest box rather than the size of the file.
+    
+        Rows that don't give a valid box (where the filename checks fall back to "0-0") do not count as the start of a new box and are handed back after the last box. If the rows for a box are split up in the file then the later rows are handed back separately and a warning is added to the affected references. The references handed back for each box are kept for the whole file, so a farm in the later rows that was already handed back gets a new reference (e.g. "MAF 32/1/2/3-1", see rename_repeated_refs) rather than repeating it.
+    
+        Keyword Arguments:
+            full_csv - iterable of InputRow with the values from each row of the CSV (see input_rows.read_rows)
+            previous_details - optional dictionary of combined values from a previous run by details hash (see combine_farm_details)
+            new_details - optional dictionary which is updated with the combined values for this run by details hash (see combine_farm_details)
+    
+        Returns:
+            Generator giving a dictionary of FarmRecord by reference for each box
+    '''
+    
+    farms = {}
+    row_counts = {}
+    raw_farm_info = {}
+    ref_allocator = ReferenceAllocator(farms.keys())
+    
+    unknown_box_farms = {}
+    unknown_box_row_counts = {}
+    unknown_box_raw_farm_info = {}
+    unknown_box_ref_allocator = ReferenceAllocator(unknown_box_farms.keys())
+    
+    current_box = None
+    completed_boxes = set()
+    box_refs = {}
+    box_ref_allocators = {}
     
     for row_num, row in enumerate(full_csv, 2):
-        file1 = row['filename_1']
-        file2 = row['filename_2']
-        form = row['document_type']
-        ref_component, filename_warnings = filename_checks(file1.strip(), file2.strip(), form, str(row_num))
+        ref_component, filename_warnings = filename_checks(row.filename_1.strip(), row.filename_2.strip(), row.document_type, str(row_num))
+        
+        if ref_component == "0-0":
+            add_farm_row(row, row_num, ref_component, filename_warnings, unknown_box_farms, unknown_box_raw_farm_info, unknown_box_row_counts, unknown_box_ref_allocator)
+            continue
+        
+        if ref_component != current_box:
+            if current_box is not None:
+                combine_farm_details(farms, raw_farm_info, previous_details, new_details)
+                yield rename_repeated_refs(farms, current_box, box_refs, box_ref_allocators)
+                completed_boxes.add(current_box)
+                
+                farms = {}
+                row_counts = {}
+                raw_farm_info = {}
+                ref_allocator = ReferenceAllocator(farms.keys())
                 
-        primary_farm_number = row['primary_farm_number']
-        additional_farm_number = row['additional_farms']
+            current_box = ref_component
 
-        form = form.strip()
+        if ref_component in completed_boxes:
+            filename_warnings.add(nw.make_warning("BOX_SPLIT", ref_component.replace("-","/"), row=row_num))
         
-        type_warnings = set()
-        try:
-            doc_type_check(form, str(row_num))
-        except ValueError as ve:
-            type_warnings.update([str(ve)])
-
-        farm_refs, ref_warnings = generate_references(ref_component.replace("-","/"), primary_farm_number.strip(), additional_farm_number.strip(), form, str(row_num), farms.keys())
-        
-        #print("Row: " + str(row_num) + ", Farm refs (" + ref_component.replace("-","/") + ", farm_num: " + primary_farm_number.strip() + ") :")
-        #print(farm_refs)
-        #print()
-        #print(ref_warnings)
-
-        for temp_ref in farm_refs.keys():
-            #core_ref = temp_ref.split("-")[0]
-            ref = temp_ref.split("-")[0]
-            #print("Checking: " + core_ref + ": " + form)
-            if ref in farms.keys() and form not in farms[ref]["Type"]: 
-                #ref = core_ref            
-                farms[ref]["Type"] += [form]
-                #print("Row " + str(row_num) +  ": Core ref in dict, form not in dict. Adding " + form + " to " + ref)       
-            elif ref in farms.keys() and form in farms[ref]["Type"]:
-                #ref = temp_ref
-                #print("Row " + str(row_num) + ": Core ref (" + ref + ") in dict and form in dict")
-                if ref in farms.keys():
-                    farms[ref]["Type"] += [form]
-                else:
-                    farms[ref] = {"Type": [form]}  
-                                 
-                type_warnings.add("Row " + str(row_num) + ": Warning - Multiple '" + form + "' forms for " + ref)
-            else:
-                #ref = core_ref 
-                farms[ref] = {"Type": [form]}
-                if ref not in raw_farm_info.keys():
-                    raw_farm_info[ref] = dict()
-                #print("Row " + str(row_num) + ": Neither Core ref or form in dict. Adding " + form + " to " + ref)
-
-            # count rows
-            if ref in row_counts.keys():
-                row_counts[ref]["Total"] += 1
-            else:
-                row_counts[ref] = {"Total":1, "Row": row_num}
-        
-            # generate farm number    
-            county = row['county']
-            parish = row['parish']
-                           
-            if farm_refs[temp_ref] == "Primary":
-                farm_numbers = row['primary_farm_number']     
-            else:
-                farm_numbers = row['additional_farms']
-            
-            farm_nums = generate_farm_number_for_record(county, parish, farm_numbers, ref)
+        add_farm_row(row, row_num, ref_component, filename_warnings, farms, raw_farm_info, row_counts, ref_allocator)
+    
+    if current_box is not None:
+        combine_farm_details(farms, raw_farm_info, previous_details, new_details)
+        yield rename_repeated_refs(farms, current_box, box_refs, box_ref_allocators)
+    
+    if len(unknown_box_farms) > 0:
+        combine_farm_details(unknown_box_farms, unknown_box_raw_farm_info, previous_details, new_details)
+        yield unknown_box_farms
 
-            if "Farm number" in farms[ref].keys():
-                farms[ref]["Farm Number"].update(farm_nums)
-                if len(farm_nums) == 1:
-                    row_counts[ref]["Farm Number"] += 1
-            else:
-                farms[ref]["Farm Number"] = farm_nums
-                if len(farm_nums) == 1:
-                    row_counts[ref].update({"Farm Number":1})
 
+def rename_repeated_refs(farms, box, box_refs, box_ref_allocators):
+    ''' Gives a new reference to each farm whose reference has already been handed back for the same box by extract_farms_by_box, which happens when the rows for a box are split up in the file, so that no reference is output twice
+    
+        Keyword Arguments:
+            farms - dictionary of FarmRecord by reference for the rows of the box
+            box - string with the box returned by filename_checks
+            box_refs - dictionary of the set of references handed back by box, which is updated with the references given out
+            box_ref_allocators - dictionary of ReferenceAllocator for the references handed back by box, which is updated with a new one for a new box. The same one is kept for the whole file so the suffixes carry on from those given out before.
             
-            # Type counts            
-            if "Type" in row_counts[ref].keys() and form != "":
-                row_counts[ref]["Type"] += 1
-            elif form != "":
-                row_counts[ref].update({"Type":1})                       
-        
-            # Filenames
-            if "Filenames" in farms[ref].keys():
-                if file1 != "" and file2 != "":
-                    farms[ref]["Filenames"].update({file1, file2})  
-                    row_counts[ref]["Filenames"] += 1
-                elif file1 != "":
-                    farms[ref]["Filenames"].update({file1})  
-                else:
-                    farms[ref]["Filenames"].update({file2})  
-            else:                
-                if file1 != "" and file2 != "":
-                    farms[ref]["Filenames"] = {file1, file2} 
-                    row_counts[ref].update({"Filenames":1})
-                elif file1 != "":
-                    farms[ref]["Filenames"] = {file1}
-                    row_counts[ref].update({"Filenames":0}) 
-                else:
-                    farms[ref]["Filenames"] = {file2}
-                    row_counts[ref].update({"Filenames":0}) 
-                
-            if "Filename Warnings" in farms[ref].keys():
-                farms[ref]["Filename Warnings"].update(filename_warnings)
-            else:
-                farms[ref]["Filename Warnings"] = filename_warnings
-                
-            # H (farm_name)
-            farm_name = row['farm_name']
-            if farm_name != "" and farm_name != "*":
-                if "Farm Name" in raw_farm_info[ref].keys():
-                    raw_farm_info[ref]["Farm Name"] += [farm_name]
+        Returns:
+            Dictionary of FarmRecord by reference, in the same order as farms
+    '''
+    
+    if box not in box_refs:
+        box_refs[box] = set()
+        box_ref_allocators[box] = ReferenceAllocator(box_refs[box])
+    
+    used_refs = box_refs[box]
+    ref_allocator = box_ref_allocators[box]
+    unique_farms = {}
+    
+    for ref, farm in farms.items():
+        if ref in used_refs:
+            ref = ref_allocator.allocate(ref)
+        
+        used_refs.add(ref)
+        unique_farms[ref] = farm
+    
+    return unique_farms
 
-                else:
-                    raw_farm_info[ref].update({"Farm Name": [farm_name]})
 
+def add_farm_row(row, row_num, ref_component, filename_warnings, farms, raw_farm_info, row_counts, ref_allocator=None):
+    ''' Checks a single row of CSV data and adds its values and warnings to the farms it refers to
+    
+        Keyword Arguments:
+            row - InputRow with the values from the CSV row (see input_rows.py)
+            row_num - integer with the number of the row in the spreadsheet
+            ref_component - string with the central part of the filename (the box) returned by filename_checks
+            filename_warnings - set of NFSWarning returned by filename_checks
+            farms - dictionary of FarmRecord by reference which is updated with the row values
+            raw_farm_info - dictionary of RawFarmInfo (the uncombined farm name, landowner, farmer and addressee values) by reference which is updated with the row values
+            row_counts - dictionary of RowCounts by reference which is updated with the row values
+            ref_allocator - optional ReferenceAllocator for the keys of farms, kept for all the rows added to the same farms dictionary. If None one is created for the row.
             
-            # M (owner_title), N (owner_individual_name), O (owner_group_names - semi-colon separated list), P (owner_address - semi-colon separated list)
-            owner_title = row['owner_title']
-            owner_individual_name = row['owner_individual_name']
-            owner_group_names = row['owner_group_names']
-            owner_addresses = row['owner_address']
-            
-            combined = owner_title + owner_individual_name + owner_group_names + owner_addresses
-            combined = combined.replace("*", "")
-            
-            # If N/'individual name' contains asterisk, data from O/'group names) should be taken
-            
-            if len(combined) > 0:
-                if "Landowner" in raw_farm_info[ref].keys():
-                    raw_farm_info[ref]["Landowner"]["Title"] += [owner_title]
-                    raw_farm_info[ref]["Landowner"]["Individual Name"] += [owner_individual_name]
-                    raw_farm_info[ref]["Landowner"]["Group Names"] += [owner_group_names.split(";")]
-                    raw_farm_info[ref]["Landowner"]["Addresses"] += [owner_addresses.split(";")]
-                    
-                else:
-                    raw_farm_info[ref].update({"Landowner": {"Title": [owner_title]}})
-                    raw_farm_info[ref]["Landowner"].update({"Individual Name": [owner_individual_name]})
-                    raw_farm_info[ref]["Landowner"].update({"Group Names": [owner_group_names.split(";")]})
-                    raw_farm_info[ref]["Landowner"].update({"Addresses": [owner_addresses.split(";")]}) 
-                    
-                #print(raw_farm_info[ref]["Landowner"])                                
-
-            # Input columns: I (addressee_title), J (addressee_individual_name), K (addressee_group_names), L (address) 
-            # Input columns: Q (farmer_title), R (farmer_individual_name), S (farmer_group_names), T (farmer_address)
-            addressee_title = row['addressee_title']
-            addressee_individual_name = row['addressee_individual_name']
-            addressee_group_names = row['addressee_group_names']
-            addresses = row['address']
-            farmer_title = row['farmer_title']
-            farmer_individual_name = row['farmer_individual_name']
-            farmer_group_names = row['farmer_group_names']
-            farmer_addresses = row['farmer_address']
-            
-            #combined = addressee_title + addressee_individual_name + addressee_group_names + addresses + farmer_title + farmer_individual_name + farmer_group_names + farmer_addresses
-            #combined = combined.replace("*", "")
+        Returns:
+            No return, the farms, raw_farm_info and row_counts dictionaries are updated in place
+    '''
+    
+    file1 = row.filename_1
+    file2 = row.filename_2
+    form = row.document_type
+    
+    primary_farm_number = row.primary_farm_number
+    additional_farm_number = row.additional_farms
+
+    form = form.strip()
+    
+    type_warnings = set()
+    try:
+        doc_type_check(form, str(row_num))
+    except ValueError as ve:
+        type_warnings.add(nw.get_error_warning(ve, row_num))
+
+    if ref_allocator is None:
+        ref_allocator = ReferenceAllocator(farms.keys())
+    
+    farm_refs, ref_warnings = generate_references(ref_component.replace("-","/"), primary_farm_number.strip(), additional_farm_number.strip(), form, str(row_num), ref_allocator)
+    
+    #print("Row: " + str(row_num) + ", Farm refs (" + ref_component.replace("-","/") + ", farm_num: " + primary_farm_number.strip() + ") :")
+    #print(farm_refs)
+    #print()
+    #print(ref_warnings)
+
+    for temp_ref in farm_refs.keys():
+        #core_ref = temp_ref.split("-")[0]
+        ref = temp_ref.split("-")[0]
+        #print("Checking: " + core_ref + ": " + form)
+        if ref in farms.keys() and form not in farms[ref].types: 
+            #ref = core_ref            
+            farms[ref].types.append(form)
+            #print("Row " + str(row_num) +  ": Core ref in dict, form not in dict. Adding " + form + " to " + ref)       
+        elif ref in farms.keys() and form in farms[ref].types:
+            #ref = temp_ref
+            #print("Row " + str(row_num) + ": Core ref (" + ref + ") in dict and form in dict")
+            farms[ref].types.append(form)
+                             
+            type_warnings.add(nw.make_warning("MULTIPLE_FORMS", form, ref, row=row_num))
+        else:
+            #ref = core_ref 
+            farms[ref] = FarmRecord(types=[form])
+            if ref not in raw_farm_info.keys():
+                raw_farm_info[ref] = RawFarmInfo()
+            #print("Row " + str(row_num) + ": Neither Core ref or form in dict. Adding " + form + " to " + ref)
+        
+        farm = farms[ref]
+        raw_info = raw_farm_info[ref]
+
+        # count rows
+        if ref in row_counts.keys():
+            row_counts[ref].total += 1
+        else:
+            row_counts[ref] = RowCounts(total=1, row=row_num)
+        counts = row_counts[ref]
+    
+        # generate farm number    
+        county = row.county
+        parish = row.parish
+                       
+        if farm_refs[temp_ref] == "Primary":
+            farm_numbers = row.primary_farm_number     
+        else:
+            farm_numbers = row.additional_farms
+        
+        farm_nums = generate_farm_number_for_record(county, parish, farm_numbers, ref)
+
+        # the farm number from the latest row for the farm is kept
+        farm.farm_numbers = farm_nums
+        if len(farm_nums) == 1:
+            counts.farm_number = 1
+        
+        # Type counts            
+        if form != "":
+            counts.types += 1
+    
+        # Filenames
+        if file1 != "" and file2 != "":
+            filenames = {file1, file2}
+            counts.filenames += 1
+        elif file1 != "":
+            filenames = {file1}
+        else:
+            filenames = {file2}
             
-            addressee_combined = addressee_title + addressee_individual_name + addressee_group_names + addresses
-            farmer_combined = farmer_title + farmer_individual_name + farmer_group_names + farmer_addresses
-            addressee_combined = addressee_combined.replace("*", "")
-            farmer_combined = farmer_combined.replace("*", "")
+        if farm.filenames is not None:
+            farm.filenames.update(filenames)
+        else:
+            farm.filenames = filenames
             
-            #print("Ref: " + ref)
-            #print("Farmer: " + farmer_combined)
-            #print("Addressee: " + addressee_combined)
+        if farm.filename_warnings is not None:
+            farm.filename_warnings.update(filename_warnings)
+        else:
+            farm.filename_warnings = filename_warnings
             
-            if len(farmer_combined) > 0:            
-                if "Farmer" in raw_farm_info[ref].keys():
-                    raw_farm_info[ref]["Farmer"]["Title"] += [farmer_title]
-                    raw_farm_info[ref]["Farmer"]["Individual Name"] += [farmer_individual_name]
-                    raw_farm_info[ref]["Farmer"]["Group Names"] += [farmer_group_names.split(";")]
-                    raw_farm_info[ref]["Farmer"]["Addresses"] += [farmer_addresses.split(";")]                                     
-                else:
-                    raw_farm_info[ref].update({"Farmer": {"Title": [farmer_title]}})
-                    raw_farm_info[ref]["Farmer"].update({"Individual Name": [farmer_individual_name]})
-                    raw_farm_info[ref]["Farmer"].update({"Group Names": [farmer_group_names.split(";")]})
-                    raw_farm_info[ref]["Farmer"].update({"Addresses": [farmer_addresses.split(";")]})                 
-
-            if len(addressee_combined) > 0:            
-                if "Addressee" in raw_farm_info[ref].keys():
-                    raw_farm_info[ref]["Addressee"]["Title"] += [addressee_title]
-                    raw_farm_info[ref]["Addressee"]["Individual Name"] += [addressee_individual_name]
-                    raw_farm_info[ref]["Addressee"]["Group Names"] += [addressee_group_names.split(";")]
-                    raw_farm_info[ref]["Addressee"]["Addresses"] += [addresses.split(";")]                                     
-                else:
-                    raw_farm_info[ref].update({"Addressee": {"Title": [addressee_title]}})
-                    raw_farm_info[ref]["Addressee"].update({"Individual Name": [addressee_individual_name]})
-                    raw_farm_info[ref]["Addressee"].update({"Group Names": [addressee_group_names.split(";")]})
-                    raw_farm_info[ref]["Addressee"].update({"Addresses": [addresses.split(";")]})  
+        # H (farm_name)
+        farm_name = row.farm_name
+        if farm_name != "" and farm_name != "*":
+            if raw_info.farm_names is not None:
+                raw_info.farm_names.append(farm_name)
+            else:
+                raw_info.farm_names = [farm_name]
 
-            
-            # Group 7: Acreage
-            # Input column: U (acreage - semi-colon separated list)
-            # Expecting 1 row of data
-            # Return value [Output column: M (Acreage)]
-            # Warning if multiple values     
-            acreage = row['acreage']
-            if acreage != "":
-                if "Acreage" in farms[ref].keys():
-                    farms[ref]["Acreage"].update({acreage})
-                else:
-                    farms[ref].update({"Acreage": {acreage}})
-                    
+        
+        # M (owner_title), N (owner_individual_name), O (owner_group_names - semi-colon separated list), P (owner_address - semi-colon separated list)
+        owner_title = row.owner_title
+        owner_individual_name = row.owner_individual_name
+        owner_group_names = row.owner_group_names
+        owner_addresses = row.owner_address
+        
+        combined = owner_title + owner_individual_name + owner_group_names + owner_addresses
+        combined = combined.replace("*", "")
+        
+        # If N/'individual name' contains asterisk, data from O/'group names) should be taken
+        
+        if len(combined) > 0:
+            if raw_info.landowner is None:
+                raw_info.landowner = PartyDetails()
+            raw_info.landowner.add_row(owner_title, owner_individual_name, owner_group_names, owner_addresses)
                 
-                if "Acreage" in row_counts[ref].keys():
-                    row_counts[ref]["Acreage"] += 1
-                else:
-                    row_counts[ref].update({"Acreage":1}) 
+            #print(raw_info.landowner)                                
+
+        # Input columns: I (addressee_title), J (addressee_individual_name), K (addressee_group_names), L (address) 
+        # Input columns: Q (farmer_title), R (farmer_individual_name), S (farmer_group_names), T (farmer_address)
+        addressee_title = row.addressee_title
+        addressee_individual_name = row.addressee_individual_name
+        addressee_group_names = row.addressee_group_names
+        addresses = row.address
+        farmer_title = row.farmer_title
+        farmer_individual_name = row.farmer_individual_name
+        farmer_group_names = row.farmer_group_names
+        farmer_addresses = row.farmer_address
+        
+        #combined = addressee_title + addressee_individual_name + addressee_group_names + addresses + farmer_title + farmer_individual_name + farmer_group_names + farmer_addresses
+        #combined = combined.replace("*", "")
+        
+        addressee_combined = addressee_title + addressee_individual_name + addressee_group_names + addresses
+        farmer_combined = farmer_title + farmer_individual_name + farmer_group_names + farmer_addresses
+        addressee_combined = addressee_combined.replace("*", "")
+        farmer_combined = farmer_combined.replace("*", "")
+        
+        #print("Ref: " + ref)
+        #print("Farmer: " + farmer_combined)
+        #print("Addressee: " + addressee_combined)
+        
+        if len(farmer_combined) > 0:            
+            if raw_info.farmer is None:
+                raw_info.farmer = PartyDetails()
+            raw_info.farmer.add_row(farmer_title, farmer_individual_name, farmer_group_names, farmer_addresses)
 
-                        
-            # Group 8: OS
-            # Input column: V (OS_map_sheet)
-            # Excepting 1 row of data
-            # Return value [Output column: O (OS Sheet)]             
-            OS_map = row['OS_map_sheet']
-            if OS_map != "":
-                if "OS Sheet Number" in farms[ref].keys():
-                    farms[ref]["OS Sheet Number"].update([OS_map])
-                    row_counts[ref]["OS_sheet_number"] += 1
-                else:
-                    farms[ref].update({"OS Sheet Number": {OS_map}})
-                    row_counts[ref].update({"OS_sheet_number":1}) 
+        if len(addressee_combined) > 0:            
+            if raw_info.addressee is None:
+                raw_info.addressee = PartyDetails()
+            raw_info.addressee.add_row(addressee_title, addressee_individual_name, addressee_group_names, addresses)
 
-                #print(farms[ref]["OS Sheet Number"])
-            
-            # Dates
-            field_date = row["field_info_date"]
-            primary_date = row["primary_record_date"]
-            
-            field_date_values, primary_date_values = date_processing(field_date, primary_date, str(row_num))
-            checked_field_date, field_date_warnings = field_date_values
-            checked_primary_date, primary_date_warnings = primary_date_values
-            
-            #print("Checked Field Date: " + checked_field_date)
-            #print("Checked Primary Date: " + checked_primary_date)
-            
-            if checked_field_date != "":
-                if "Field Date" in farms[ref].keys():               
-                    farms[ref]["Field Date"].add(checked_field_date)
-                    row_counts[ref]["Field Date"] += 1
-                else:
-                    farms[ref].update({"Field Date": {checked_field_date}})
-                    row_counts[ref].update({"Field Date":1})
-            
-            if checked_primary_date != "":            
-                if "Primary Date" in farms[ref].keys():                
-                    farms[ref]["Primary Date"].add(checked_primary_date)
-                    row_counts[ref]["Primary Date"] += 1
-                else:
-                    farms[ref].update({"Primary Date": {checked_primary_date}})
-                    row_counts[ref].update({"Primary Date":1})            
-            
+        
+        # Group 7: Acreage
+        # Input column: U (acreage - semi-colon separated list)
+        # Expecting 1 row of data
+        # Return value [Output column: M (Acreage)]
+        # Warning if multiple values     
+        acreage = row.acreage
+        if acreage != "":
+            if farm.acreage is not None:
+                farm.acreage.add(acreage)
+            else:
+                farm.acreage = {acreage}
+            counts.acreage += 1
 
-            try:
-                reference_pattern_check(ref, str(row_num))
-            except ValueError as ve:
-                if "Reference Warnings" in farms[ref].keys():
-                    farms[ref]["Reference Warnings"].update([str(ve)])
-                else:
-                    farms[ref]["Reference Warnings"] = {str(ve)}   
- 
-                                
-            # Warnings
-            if "Reference Warnings" in farms[ref].keys():
-                farms[ref]["Reference Warnings"].update(ref_warnings)
+                    
+        # Group 8: OS
+        # Input column: V (OS_map_sheet)
+        # Excepting 1 row of data
+        # Return value [Output column: O (OS Sheet)]             
+        OS_map = row.OS_map_sheet
+        if OS_map != "":
+            if farm.os_sheet_numbers is not None:
+                farm.os_sheet_numbers.add(OS_map)
             else:
-                farms[ref]["Reference Warnings"] = ref_warnings
-                
-            #print(farms[ref]["Reference Warnings"])
+                farm.os_sheet_numbers = {OS_map}
+            counts.os_sheet_number += 1
 
-            if "Type Warnings" in farms[ref].keys():
-                farms[ref]["Type Warnings"].update(type_warnings)
+            #print(farm.os_sheet_numbers)
+        
+        # Dates
+        field_date = row.field_info_date
+        primary_date = row.primary_record_date
+        
+        field_date_values, primary_date_values = date_processing(field_date, primary_date, str(row_num))
+        checked_field_date, field_date_warnings = field_date_values
+        checked_primary_date, primary_date_warnings = primary_date_values
+        
+        #print("Checked Field Date: " + checked_field_date)
+        #print("Checked Primary Date: " + checked_primary_date)
+        
+        if checked_field_date != "":
+            if farm.field_dates is not None:               
+                farm.field_dates.add(checked_field_date)
             else:
-                farms[ref]["Type Warnings"] = type_warnings
-            
-            farm_num_warning = {"Row " + str(row_num) + ": Error in generated farm number - lettercode/parish number/farm number mismatch"}    
-            if "Farm Number Warnings" in farms[ref].keys() and len(farm_nums) > 1:
-                farms[ref]["Farm Number Warnings"].update(farm_num_warning)
-            elif len(farm_nums) > 1:
-                farms[ref]["Farm Number Warnings"] = farm_num_warning
+                farm.field_dates = {checked_field_date}
+            counts.field_date += 1
+        
+        if checked_primary_date != "":            
+            if farm.primary_dates is not None:                
+                farm.primary_dates.add(checked_primary_date)
             else:
-                farms[ref]["Farm Number Warnings"] = set()
+                farm.primary_dates = {checked_primary_date}
+            counts.primary_date += 1
+        
 
-            acreage_warning = {"Row " + str(row_num) + ": multiple acreage given"}    
-            if "Acreage Warnings" in farms[ref].keys() and ";" in acreage:
-                farms[ref]["Acreage Warnings"].update(acreage_warning)
-            elif ";" in acreage:
-                farms[ref]["Acreage Warnings"] = acreage_warning
+        try:
+            reference_pattern_check(ref, str(row_num))
+        except ValueError as ve:
+            if farm.reference_warnings is not None:
+                farm.reference_warnings.add(nw.get_error_warning(ve, row_num))
             else:
-                farms[ref]["Acreage Warnings"] = set()
+                farm.reference_warnings = {nw.get_error_warning(ve, row_num)}   
 
-            if "Field Date Warnings" in farms[ref].keys():
-                farms[ref]["Field Date Warnings"].update(field_date_warnings)
+                            
+        # Warnings
+        if farm.reference_warnings is not None:
+            farm.reference_warnings.update(ref_warnings)
+        else:
+            farm.reference_warnings = ref_warnings
+            
+        #print(farm.reference_warnings)
+
+        if farm.type_warnings is not None:
+            farm.type_warnings.update(type_warnings)
+        else:
+            farm.type_warnings = type_warnings
+        
+        # the farm number and acreage warnings are only kept if the latest row for the farm has one
+        if len(farm_nums) > 1:
+            farm_num_warning = nw.make_warning("FARM_NUMBER_MISMATCH", row=row_num)
+            if farm.farm_number_warnings is not None:
+                farm.farm_number_warnings.add(farm_num_warning)
             else:
-                farms[ref]["Field Date Warnings"] = field_date_warnings
+                farm.farm_number_warnings = {farm_num_warning}
+        else:
+            farm.farm_number_warnings = set()
 
-            if "Primary Date Warnings" in farms[ref].keys():
-                farms[ref]["Primary Date Warnings"].update(primary_date_warnings)
+        if ";" in acreage:
+            acreage_warning = nw.make_warning("MULTIPLE_ACREAGE", row=row_num)
+            if farm.acreage_warnings is not None:
+                farm.acreage_warnings.add(acreage_warning)
+            else:
+                farm.acreage_warnings = {acreage_warning}
+        else:
+            farm.acreage_warnings = set()
+
+        if farm.field_date_warnings is not None:
+            farm.field_date_warnings.update(field_date_warnings)
+        else:
+            farm.field_date_warnings = field_date_warnings
+
+        if farm.primary_date_warnings is not None:
+            farm.primary_date_warnings.update(primary_date_warnings)
+        else:
+            farm.primary_date_warnings = primary_date_warnings
+
+
+def combine_farm_details(farms, raw_farm_info, previous_details=None, new_details=None):
+    ''' Runs the farm name, landowner and farmer combination passes over the collected raw values and adds the combined values and warnings to the farms
+    
+        If the reference pool has been started (see start_ref_pool) then the references are combined in chunks on the pool.
+    
+        When previous_details or new_details are given, the raw values for each reference are hashed (see processing_manifest.get_details_hash). References whose hash is in previous_details get the combined values saved from the previous run and only the other references go through the combination passes.
+    
+        Keyword Arguments:
+            farms - dictionary of FarmRecord by reference which is updated with the combined values
+            raw_farm_info - dictionary of RawFarmInfo (the uncombined farm name, landowner, farmer and addressee values) by reference
+            previous_details - optional dictionary of combined values from a previous run, with the details hash as the key and a dictionary of the combined values (lists) by output column name as the value
+            new_details - optional dictionary which is updated with the combined values for each reference by details hash, in the same layout as previous_details
+            
+        Returns:
+            No return, the farms dictionary (and new_details if given) is updated in place
+    '''
+    
+    if previous_details is not None or new_details is not None:
+        details_hashes = {}
+        changed_farm_info = {}
+        
+        for ref, farm_data in raw_farm_info.items():
+            details_hashes[ref] = pm.get_details_hash(farm_data.to_dict(), dn.get_algorithm_version())
+            
+            if previous_details is not None and details_hashes[ref] in previous_details:
+                for column, column_values in previous_details[details_hashes[ref]].items():
+                    if column.endswith("Warnings"):
+                        farms[ref].set_column(column, set([nw.from_json(warning) for warning in column_values]))
+                    else:
+                        farms[ref].set_column(column, list(column_values))
             else:
-                farms[ref]["Primary Date Warnings"] = primary_date_warnings
+                changed_farm_info[ref] = farm_data
+        
+        combine_farm_details(farms, changed_farm_info)
+        
+        if new_details is not None:
+            for ref, details_hash in details_hashes.items():
+                new_details[details_hash] = {column: get_saved_column(farms[ref], column) for column in COMBINED_COLUMNS if farms[ref].get_column(column) is not None}
+        
+        return
+    
+    if ref_pool is not None and len(raw_farm_info) > REF_CHUNK_SIZE:
+        refs = list(raw_farm_info.keys())
+        chunks = [{ref: raw_farm_info[ref] for ref in refs[i:i + REF_CHUNK_SIZE]} for i in range(0, len(refs), REF_CHUNK_SIZE)]
+        
+        # map gives the results back in the order of the chunks
+        for combined_details in ref_pool.map(combine_ref_chunk, chunks):
+            add_combined_ref_details(farms, combined_details)
+    else:
+        add_combined_ref_details(farms, get_combined_ref_details(raw_farm_info))
+           
+    #print(farms)   
+    #print(row_counts)
+
+
+def get_saved_column(farm, column):
+    ''' Gets the values of one of the combined columns for a farm in the layout saved in the manifest
+    
+        Keyword Arguments:
+            farm - FarmRecord
+            column - string with the output column name (one of COMBINED_COLUMNS)
+            
+        Returns:
+            List of the values, with each warning as a list (see NFSWarning.to_json)
+    '''
+    
+    if column.endswith("Warnings"):
+        return [warning.to_json() for warning in farm.get_column(column)]
+    
+    return list(farm.get_column(column))
+
 
+def get_combined_ref_details(raw_farm_info):
+    ''' Runs the farm name, landowner and farmer combination passes over the raw values. Run in the current process or, for a chunk of the references, in one of the processes of the reference pool.
+    
+        Keyword Arguments:
+            raw_farm_info - dictionary of RawFarmInfo (the uncombined farm name, landowner, farmer and addressee values) by reference
+            
+        Returns:
+            Tuple with a tuple of the combined values and warnings (dictionaries by reference) from each of get_combined_farm_names_by_ref, get_combined_owner_details_by_ref and get_combined_farmer_details_by_ref
+    '''
+    
     #print(raw_farm_info) 
     # Farm names
     farm_names = {}
     for farm_ref, farm_data in raw_farm_info.items():
-        if "Farm Name" in farm_data.keys():
-            farm_names[farm_ref] = farm_data["Farm Name"]
+        if farm_data.farm_names is not None:
+            farm_names[farm_ref] = farm_data.farm_names
                
     combined_farm_names, combined_farm_name_warnings = get_combined_farm_names_by_ref(farm_names)
     #print(combined_farm_names)
     
-    for ref, combined_farm_name in combined_farm_names.items():
-        farms[ref].update({"Farm Name": [combined_farm_name]})
-        farms[ref].update({"Farm Name Warnings": combined_farm_name_warnings[ref]})
-    
     # Owner names
     owner_details = {}
     for owner_ref, owner_data in raw_farm_info.items():
-        if "Landowner" in owner_data.keys():
-            owner_details[owner_ref] = owner_data["Landowner"]    
+        if owner_data.landowner is not None:
+            owner_details[owner_ref] = owner_data.landowner    
     
     #print(owner_details)
     combined_owner_info, combined_owner_info_warnings = get_combined_owner_details_by_ref(owner_details) 
 
-    for ref, combined_owner_info in combined_owner_info.items():
-        farms[ref].update({"Landowner": [combined_owner_info]})
-        farms[ref].update({"Landowner Warnings": combined_owner_info_warnings[ref]})    
- 
     # Farmer names
     farmer_details = {}
     for farmer_ref, farmer_data in raw_farm_info.items():
-        if "Farmer" in farmer_data.keys():
-            farmer_details[farmer_ref] = farmer_data["Farmer"]   
+        if farmer_data.farmer is not None:
+            farmer_details[farmer_ref] = farmer_data.farmer   
     #print("Farmer details: " + str(farmer_details))
     
     # Addressee names
     addressee_details = {}
     for addressee_ref, addressee_data in raw_farm_info.items():
-        if "Addressee" in addressee_data.keys():
-            addressee_details[addressee_ref] = addressee_data["Addressee"]              
+        if addressee_data.addressee is not None:
+            addressee_details[addressee_ref] = addressee_data.addressee              
     #print("Addressee details: " + str(addressee_details))
     
     combined_farmer_info, combined_farmer_info_warnings = get_combined_farmer_details_by_ref(farmer_details, addressee_details)
     #print("Combined Farmer Info: " + str(combined_farmer_info))
     
-    for ref, combined_farmer_info in combined_farmer_info.items():
-        farms[ref].update({"Farmer": [combined_farmer_info]})
-        farms[ref].update({"Farmer Warnings": combined_farmer_info_warnings[ref]})   
-           
-    #print(farms)   
-    #print(row_counts)
-                
-    return (farms)  
+    return ((combined_farm_names, combined_farm_name_warnings), (combined_owner_info, combined_owner_info_warnings), (combined_farmer_info, combined_farmer_info_warnings))
+
+
+def combine_ref_chunk(raw_farm_info):
+    ''' Task run on the reference pool for a chunk of the references. Runs get_combined_ref_details and then saves the results added to the persistent cache, if one is in use, so that they are in the file before the chunk is handed back and aren't held in the worker's memory.
+    
+        Keyword Arguments:
+            raw_farm_info - dictionary of RawFarmInfo by reference for the chunk
+            
+        Returns:
+            Combined values and warnings (see get_combined_ref_details)
+    '''
+    
+    combined_details = get_combined_ref_details(raw_farm_info)
+    
+    if dn.persistent_cache is not None:
+        dn.persistent_cache.flush()
+    
+    return combined_details
+
+
+def add_combined_ref_details(farms, combined_details):
+    ''' Adds the combined values and warnings from get_combined_ref_details to the farms
+    
+        Keyword Arguments:
+            farms - dictionary of FarmRecord by reference which is updated with the combined values
+            combined_details - tuple returned by get_combined_ref_details
+            
+        Returns:
+            No return, the farms dictionary is updated in place
+    '''
+    
+    (combined_farm_names, combined_farm_name_warnings), (combined_owner_info, combined_owner_info_warnings), (combined_farmer_info, combined_farmer_info_warnings) = combined_details
+    
+    for ref, combined_farm_name in combined_farm_names.items():
+        farms[ref].farm_name = [combined_farm_name]
+        farms[ref].farm_name_warnings = combined_farm_name_warnings[ref]
+    
+    for ref, combined_owner_value in combined_owner_info.items():
+        farms[ref].landowner = [combined_owner_value]
+        farms[ref].landowner_warnings = combined_owner_info_warnings[ref]
+    
+    for ref, combined_farmer_value in combined_farmer_info.items():
+        farms[ref].farmer = [combined_farmer_value]
+        farms[ref].farmer_warnings = combined_farmer_info_warnings[ref]
 
     
 # Group 0: Reference
 # Input columns: A/B (filenames), F (primary_farm_number), G (additional_farms)
 # return "MAF 32 " + box number (string after first hyphen and before underscore, replace hyphens with slashed in columns A and B in source which should match) + "/" + farm number (F or G in source) [Output column: U (Reference)] 
 # Warnings: if generated using column G [Output column: V (Reference Warnings)] 
-def generate_references(box_string, primary_farm_string, additional_farm_string, farm_type, row_num, existing_refs):
+def generate_references(box_string, primary_farm_string, additional_farm_string, farm_type, row_num, ref_allocator):
     ''' Creates a reference string for each farm in the required format: "MAF 32 " + box number (with slashes) + "/" + farm number
     
         Keyword Arguments:
@@ -656,55 +1235,58 @@ def generate_references(box_string, primary_farm_string, additional_farm_string,
             additional_farm_string - semi-colon separated list of additional farm numbers
             farm_type - the name of the form
             row_num - string with number of row in spreadsheet
-            existing_ref - list of existing references 
+            ref_allocator - ReferenceAllocator for the references already in use (see farm_records.py). A collection of the references in use can also be given.
             
         Returns:
-            Tuple containing a list of generated references and a list of warnings
+            Tuple containing a list of generated references and a set of NFSWarning
     '''
     
     ref_list = {}
     warnings = set()
     
+    if not isinstance(ref_allocator, ReferenceAllocator):
+        ref_allocator = ReferenceAllocator(ref_allocator)
+    
     if primary_farm_string == "*":
-        ref = generate_ref("MAF 32/" + box_string + "/" + farm_type, existing_refs)
+        ref = ref_allocator.allocate("MAF 32/" + box_string + "/" + farm_type)
         ref_list[ref] = farm_type
         
     elif primary_farm_string != "" and additional_farm_string == "":
-        ref = generate_ref("MAF 32/" + box_string + "/" + primary_farm_string, existing_refs)           
+        ref = ref_allocator.allocate("MAF 32/" + box_string + "/" + primary_farm_string)           
         ref_list[ref] = "Primary"
        
     elif primary_farm_string == "" and additional_farm_string != "":
         for additional_farm in additional_farm_string.split(";"):
-            ref = generate_ref("MAF 32/" + box_string + "/" + additional_farm.strip(), existing_refs)           
+            ref = ref_allocator.allocate("MAF 32/" + box_string + "/" + additional_farm.strip())           
             ref_list[ref] = "Additional"
-        warnings.add("Row " + row_num + ": Error - Additional farm but no primary farm given")
+        warnings.add(nw.make_warning("ADDITIONAL_NO_PRIMARY", row=row_num))
         
     elif primary_farm_string != "" and additional_farm_string != "":
-        ref = generate_ref("MAF 32/" + box_string + "/" + primary_farm_string, existing_refs)           
+        ref = ref_allocator.allocate("MAF 32/" + box_string + "/" + primary_farm_string)           
         ref_list[ref] = "Primary"
         
         for additional_farm in additional_farm_string.split(";"):
-            ref = generate_ref("MAF 32/" + box_string + "/" + additional_farm.strip(), existing_refs)           
+            ref = ref_allocator.allocate("MAF 32/" + box_string + "/" + additional_farm.strip())           
             ref_list[ref] = "Additional"          
                
-        warnings.add("Row " + row_num + ": Warning - Additional farms present")
+        warnings.add(nw.make_warning("ADDITIONAL_FARMS", row=row_num))
     elif farm_type != "Other" or farm_type != "Cover":        
-        warnings.add("Row " + row_num + ": Note - type is " + farm_type.lower() + " so no farm number specified")
-        ref = generate_ref("MAF 32/" + box_string + "/" + farm_type, existing_refs)
+        warnings.add(nw.make_warning("NO_FARM_NUMBER", farm_type.lower(), row=row_num))
+        ref = ref_allocator.allocate("MAF 32/" + box_string + "/" + farm_type)
         ref_list[ref] = farm_type
         
     #print(row_num + ": box - " + box_string + ", primary farm num - " + primary_farm_string + ", type: " + farm_type + ", ref: " + ref)
    
     if type == "Cover" and primary_farm_string != "*":
-        warnings.add("Row " + row_num + ": Error - Type is cover and farm number is specified")
-        ref = generate_ref("MAF 32/" + box_string + "/" + farm_type, existing_refs)
+        warnings.add(nw.make_warning("COVER_FARM_NUMBER", row=row_num))
+        ref = ref_allocator.allocate("MAF 32/" + box_string + "/" + farm_type)
         ref_list[ref] = farm_type
                
     return (ref_list, warnings)  
 
 
 def generate_ref(base_ref, existing_refs):
-    ''' Check whether the reference already exists and return it or an alternate reference so that the reference is unique
+    ''' Check whether the reference already exists and return it or an alternate reference so that the reference is unique. Tries each suffix from 1, see ReferenceAllocator (farm_records.py) for the version used by generate_references which carries on from the last suffix used.
     
         Keyword Arguments: 
             base_ref - string with the proposed reference 
@@ -805,7 +1387,7 @@ def get_combined_farm_names_by_ref(farm_names):
     for ref in farm_names.keys(): 
         count = len(farm_names[ref])
         if count != 2:
-            warnings[ref].add("Expected 2 rows of data, Got " + str(count) + ".")
+            warnings[ref].add(nw.make_warning("FARM_NAME_ROWS", count))
     
     return (combined_names, warnings)
 
@@ -828,12 +1410,12 @@ def get_combined_owner_details_by_ref(owner_details):
     ''' Combines owner values and flags warnings if unexpected values found
     
         Key Arguments:  
-            owner_details - dictionary with each reference key containing a dictionary with the following: key: 'Title' - list of string values, 'Individual Name' - list of string values, 'Group Names' - list of lists with string values and 'Addresses' - list of lists with string values
+            owner_details - dictionary with a PartyDetails for each reference
             
         Returns:
             Tuple with a dictionary with the combined values for each field by reference and a dictionary with a set of warnings for each reference
     '''
-    return get_combined_details_by_ref(owner_details, ["Title", "Individual Name", "Group Names", "Addresses"], 1)
+    return get_combined_details_by_ref({ref: details.to_dict() for ref, details in owner_details.items()}, ["Title", "Individual Name", "Group Names", "Addresses"], 1)
 
 
 # Group 6: Farmer
@@ -851,8 +1433,8 @@ def get_combined_farmer_details_by_ref(farmer_details, addressee_details):
     ''' Combines farmer values and flags warnings if unexpected values found
     
         Key Arguments:  
-            farmer_details - dictionary with each reference key containing a dictionary with the following: key: 'Title' - list of string values, 'Individual Name' - list of string values, 'Group Names' - list of lists with string values and 'Addresses' - list of lists with string values
-            addressee_details - dictionary with each reference key containing a dictionary with the following: key: 'Title' - list of string values, 'Individual Name' - list of string values, 'Group Names' - list of lists with string values and 'Addresses' - list of lists with string values
+            farmer_details - dictionary with a PartyDetails for each reference
+            addressee_details - dictionary with a PartyDetails for each reference
                         
         Returns:
             Tuple with a dictionary with the combined values for each field by reference and a dictionary with a set of warnings for each reference
@@ -887,15 +1469,15 @@ def get_combined_farmer_details_by_ref(farmer_details, addressee_details):
         combined_details = {}
         combined_details[ref] = {}
         warnings[ref] = set()
-        farmer_title = farmer_details[ref]["Title"]
-        farmer_name = farmer_details[ref]["Individual Name"]
-        farmer_groups = farmer_details[ref]["Group Names"]
-        farmer_addy = farmer_details[ref]["Addresses"]
+        farmer_title = farmer_details[ref].titles
+        farmer_name = farmer_details[ref].individual_names
+        farmer_groups = farmer_details[ref].group_names
+        farmer_addy = farmer_details[ref].addresses
         
-        addressee_title = addressee_details[ref]["Title"]
-        addressee_name = addressee_details[ref]["Individual Name"]
-        addressee_groups = addressee_details[ref]["Group Names"]
-        addressee_addy = addressee_details[ref]["Addresses"]   
+        addressee_title = addressee_details[ref].titles
+        addressee_name = addressee_details[ref].individual_names
+        addressee_groups = addressee_details[ref].group_names
+        addressee_addy = addressee_details[ref].addresses   
         
         #print("\nRef: " + str(ref))
         #print("Farmer name: " + str(farmer_name))
@@ -953,12 +1535,14 @@ def get_combined_farmer_details_by_ref(farmer_details, addressee_details):
         #print("Details: " + str(combined_details[ref]))
         
         split_details = False
-        for component in components:
+        # the four components are scored together, and the lowest similarity is kept for the warning
+        similarity_ranges = get_similarity_ranges([combined_details[ref][component] for component in components])
+        for component, similarity_range in zip(components, similarity_ranges):
             threshold = 80
-            min = get_similarity_range(combined_details[ref][component], get_max=False)
+            min = similarity_range[0]
             #print(component + ": " + str(min))
             if min < threshold:
-                warnings[ref].add("Warning: Similarity (" + str(min) + ") below threshold (" + str(threshold) + ") for " + component)   
+                warnings[ref].add(nw.make_warning("SIMILARITY_BELOW_THRESHOLD", min, threshold, component))   
                 split_details = True
                 #print(ref + ": Adding similarity warning for " + component)
                 
@@ -971,8 +1555,7 @@ def get_combined_farmer_details_by_ref(farmer_details, addressee_details):
             #print("For " + ref + " combining values with combined farmer/addressee with " + str(combined_details))      
             combined_values, combined_warnings = get_combined_details_by_ref(combined_details, components)
         
-        warnings = dic_merge(warnings, combined_warnings)
-        values = dic_merge(values, combined_values)
+        add_ref_results(values, warnings, combined_values, combined_warnings)
         
         #print("Values: " + str(values))
 
@@ -982,16 +1565,16 @@ def get_combined_farmer_details_by_ref(farmer_details, addressee_details):
         combined_details[ref] = {}
         warnings[ref] = set()
         
-        farmer_title = farmer_details[ref]["Title"]
-        farmer_name = farmer_details[ref]["Individual Name"]
-        farmer_groups = farmer_details[ref]["Group Names"]
-        farmer_addy = farmer_details[ref]["Addresses"]
+        farmer_title = farmer_details[ref].titles
+        farmer_name = farmer_details[ref].individual_names
+        farmer_groups = farmer_details[ref].group_names
+        farmer_addy = farmer_details[ref].addresses
         
         combined_details[ref].update({"Title": farmer_title})
         combined_details[ref].update({"Individual Name": farmer_name})  
         combined_details[ref].update({"Group Names": farmer_groups})
         combined_details[ref].update({"Addresses": farmer_addy})  
-        warnings[ref].add("No addressee values given")
+        warnings[ref].add(nw.make_warning("NO_ADDRESSEE"))
         
         #print("\nFarmer only")
         #print("Ref: " + str(ref))
@@ -1002,24 +1585,23 @@ def get_combined_farmer_details_by_ref(farmer_details, addressee_details):
         
         combined_values, combined_warnings = get_combined_details_by_ref(combined_details, components)
         #print("Combined Values:" + str(combined_values))
-        warnings = dic_merge(warnings, combined_warnings)
-        values = dic_merge(values, combined_values)
+        add_ref_results(values, warnings, combined_values, combined_warnings)
         #print("Values:" + str(values))
     
     for ref in list(addressee_only):
         combined_details = {}
         combined_details[ref] = {}
         warnings[ref] = set()
-        addressee_title = addressee_details[ref]["Title"]
-        addressee_name = addressee_details[ref]["Individual Name"]
-        addressee_groups = addressee_details[ref]["Group Names"]
-        addressee_addy = addressee_details[ref]["Addresses"]   
+        addressee_title = addressee_details[ref].titles
+        addressee_name = addressee_details[ref].individual_names
+        addressee_groups = addressee_details[ref].group_names
+        addressee_addy = addressee_details[ref].addresses   
         
         combined_details[ref].update({"Title": addressee_title})
         combined_details[ref].update({"Individual Name": addressee_name})  
         combined_details[ref].update({"Group Names": addressee_groups})
         combined_details[ref].update({"Addresses": addressee_addy}) 
-        warnings[ref].add("No farmer values given") 
+        warnings[ref].add(nw.make_warning("NO_FARMER")) 
 
         #print("\nAddressee only")
         #print("Ref: " + str(ref))
@@ -1030,8 +1612,7 @@ def get_combined_farmer_details_by_ref(farmer_details, addressee_details):
         
         combined_values, combined_warnings = get_combined_details_by_ref(combined_details, components)
         #print("Combined Values:" + str(combined_values))
-        warnings = dic_merge(warnings, combined_warnings)
-        values = dic_merge(values, combined_values)
+        add_ref_results(values, warnings, combined_values, combined_warnings)
         #print("Values:" + str(values))
         
     
@@ -1193,15 +1774,15 @@ def get_combined_details_by_ref(details, components, expected_count = -1):
     
             
         if len(count) != 1: #Check how many distinct counts are in the set - should only be one as should be the same number of values for each component
-            warnings[ref].add("Mismatch in number of expected answers.")    
+            warnings[ref].add(nw.make_warning("ANSWER_COUNT_MISMATCH"))    
         
         count_list = list(count)  
         # if a positive value is give for expected_count then check the if there is more than one value in the list or if the first (should be only) value does not match the expected_count 
         if expected_count > 0 and (count_list[0] != expected_count or len(count_list) != 1):
             if len(count_list) != 1:
-                warnings[ref].add("Expected " + str(expected_count) + " row of data, Got " + str(count_list.sort()[0]) + "-" + str(count_list.sort()[-1] + "."))             
+                warnings[ref].add(nw.make_warning("EXPECTED_ROWS_RANGE", expected_count, count_list.sort()[0], count_list.sort()[-1]))             
             else:
-                warnings[ref].add("Expected " + str(expected_count) + " row of data, Got " + str(count_list[0]) + ".")
+                warnings[ref].add(nw.make_warning("EXPECTED_ROWS", expected_count, count_list[0]))
                 
                 
     for ref in details.keys():       
@@ -1257,7 +1838,7 @@ def generate_name(title_value, name_value, group_value, addy_value):
             addy_value - string or list of strings giving the address value(s)
                             
         Returns:
-            Tuple with string with the combined value, and a set of warnings   
+            Tuple with string with the combined value, and a set of NFSWarning   
     
     '''
     
@@ -1277,7 +1858,7 @@ def generate_name(title_value, name_value, group_value, addy_value):
             elif len(temp) == 1:
                 title_value = list(temp)[0]                
             else:
-                warnings.add("Error: multiple names found when one expected")
+                warnings.add(nw.make_warning("MULTIPLE_NAMES"))
                 title_value = "/".join(title_value) 
         
     if isinstance(name_value, list):
@@ -1287,7 +1868,7 @@ def generate_name(title_value, name_value, group_value, addy_value):
         elif len(temp) == 1:
             name_value = list(temp)[0]
         else:
-            warnings.add("Error: multiple names found when one expected")
+            warnings.add(nw.make_warning("MULTIPLE_NAMES"))
             name_value = "/".join(name_value) 
 
     #if isinstance(group_value, list):
@@ -1309,12 +1890,12 @@ def generate_name(title_value, name_value, group_value, addy_value):
         #print("Name: " + name)
         
         if isinstance(group_value, list) and True in [True for group in group_value if group != "*" and group != ""]:
-            warnings.add("Error: values found in both name (" + name_value + ") and groups (" + ";".join(group_value) + ")")    
+            warnings.add(nw.make_warning("NAME_AND_GROUPS", name_value, ";".join(group_value)))    
 
         # Address            
         address = ""
         if isinstance(addy_value, list) and len(addy_value) > 1:
-            warnings.add("Error: multiple addresses found when one expected") 
+            warnings.add(nw.make_warning("MULTIPLE_ADDRESSES")) 
             address = "/".join(addy_value)  
         elif isinstance(addy_value, list):
             address = addy_value[0]
@@ -1333,7 +1914,7 @@ def generate_name(title_value, name_value, group_value, addy_value):
         #print("Groups: " + str(group_value) + ", addys: " + str(addy_value))      
         if isinstance(group_value, list) and isinstance(addy_value, list): 
             if len(group_value) != len(addy_value):
-                warnings.add("Error: Length of group names (" + str(len(group_value))+ ") and addresses (" + str(len(addy_value)) + ") different") 
+                warnings.add(nw.make_warning("GROUP_ADDRESS_COUNT", len(group_value), len(addy_value))) 
             
             for i, group in enumerate(group_value):
                 group = group.strip()
@@ -1346,7 +1927,7 @@ def generate_name(title_value, name_value, group_value, addy_value):
                     group_names.append(group + ", " + addy)
                 else:
                     group_names.append(group)  
-                    warnings.add("Warning: No address with " + group)   
+                    warnings.add(nw.make_warning("GROUP_NO_ADDRESS", group))   
                     
             if len(addy_value) > len(group_value):
                 for i in range(len(group_value) - 1, len(addy_value)):
@@ -1354,11 +1935,11 @@ def generate_name(title_value, name_value, group_value, addy_value):
                     if addy.strip() == "*":
                         addy = "[..?]"
                     group_names.append("[..?], " + addy)
-                    warnings.add("Warning: No group name with " + addy)                
+                    warnings.add(nw.make_warning("ADDRESS_NO_GROUP", addy))                
                 
         else:
             #print("get_combined_details_by_ref: Expecting lists for group and address values got " + str(group_value) + " and " + str(addy_value))
-            warnings.add("Error: Expecting lists for group and address values got " + str(group_value) + " and " + str(addy_value) + ". Not able to process")
+            warnings.add(nw.make_warning("GROUP_ADDRESS_VALUES", str(group_value), str(addy_value)))
             
         combined_string = "; ".join(group_names) 
     else:
@@ -1431,6 +2012,26 @@ def dic_merge(dic1, dic2):
     return merged_dic
 
 
+
+def add_ref_results(values, warnings, new_values, new_warnings):
+    ''' Adds the combined values and warnings for one or more references to the results collected so far. Unlike dic_merge the results are updated in place, so collecting the results for each reference in turn doesn't copy the results for all the references before it.
+    
+        Key Arguments:
+            values - dictionary of combined values by reference which is updated with the new values
+            warnings - dictionary of sets of warnings by reference which is updated with the new warnings
+            new_values - dictionary of combined values by reference to be added. Replaces any existing value for the reference
+            new_warnings - dictionary of sets of warnings by reference to be added to any existing warnings for the reference
+            
+        Returns:
+            No return, values and warnings are updated in place
+    '''
+    
+    values.update(new_values)
+    
+    for ref, ref_warnings in new_warnings.items():
+        warnings.setdefault(ref, set()).update(ref_warnings)
+
+
 # Group 9: Field Date
 # Input column: W (field_info_date)
 # Expecting 1 row of data
@@ -1461,39 +2062,30 @@ def date_processing(field_date, primary_dates, row_num):
             Tuple of tuples. The first tuple contains a string with the field date value and a set of warnings related to the field dates, the second tuple contains the same but for the primary dates.
     '''
     
+    # the dates are parsed by date_parsing.parse_date rather than date_check so that the cached text of each date is used instead of formatting it again
     if not(field_date == "" or field_date == "*"):
-        checked_field_date, field_date_warnings = date_check(field_date, row_num)
+        checked_field_date, checked_field_date_str, warning_specs = dp.parse_date(field_date)
+        field_date_warnings = dp.get_date_warnings(warning_specs, row_num)
     else:
         checked_field_date = ""
+        checked_field_date_str = ""
         field_date_warnings = set()
     
     primary_date_warnings = set()
     primary_date_list = []
     
-    if type(checked_field_date) is datetime.datetime:
-        checked_field_date_str = checked_field_date.strftime('%d %B %Y')
-        #print("Checked field date is datetime. String version is " + checked_field_date_str)
-    else:
-        checked_field_date_str = checked_field_date
-        #print("Checked field date is not datetime. String version is " + checked_field_date_str)
-    
     if len(primary_dates.split(";")) > 1:
-        primary_date_warnings.add("Row " + row_num + ": Multiple dates listed.")
+        primary_date_warnings.add(nw.make_warning("MULTIPLE_DATES", row=row_num))
     
     for primary_date in primary_dates.split(";"):
         if not(primary_date == "" or primary_date == "*"):
-            checked_primary_date, pdate_warning = date_check(primary_date, row_num)
+            checked_primary_date, checked_primary_date_str, warning_specs = dp.parse_date(primary_date)
             
-            if type(checked_primary_date) is datetime.datetime:
-                checked_primary_date_str = checked_primary_date.strftime('%d %B %Y')
-            else:
-                checked_primary_date_str = checked_primary_date
-            
-            primary_date_warnings.update(pdate_warning)
+            primary_date_warnings.update(dp.get_date_warnings(warning_specs, row_num))
             primary_date_list += [checked_primary_date_str]            
             
             if type(checked_primary_date) is datetime.datetime and type(checked_field_date) is datetime.datetime and checked_primary_date < checked_field_date:
-                date_warning = "Row " + row_num + ": Error - Primary Date (" + checked_primary_date_str + ") earlier than Field date (" + checked_field_date_str + ")"
+                date_warning = nw.make_warning("PRIMARY_BEFORE_FIELD", checked_primary_date_str, checked_field_date_str, row=row_num)
                 field_date_warnings.add(date_warning)
                 primary_date_warnings.add(date_warning)
                    
@@ -1501,70 +2093,33 @@ def date_processing(field_date, primary_dates, row_num):
     
 
 def date_check(potential_date, row_num):    
-    ''' Checks if the date, given as a string, is a valid date
+    ''' Checks if the date, given as a string, is a valid date. The date is parsed by date_parsing.parse_date, which keeps the result for each date string.
     
         Key Arguments:
             potential_date - string containing the date value for checking
             row_num - string with the number of the row in the source spreadsheet
             
         Returns:
-            Tuple with either the date as a date object or the original string if it isn't a valid date and a set with any warnings
+            Tuple with either the date as a date object or the original string if it isn't a valid date and a set with any NFSWarning
     '''
     
-    warnings = set()
-    potential_date = potential_date.strip()
-
-    #print(row_num + ": " + potential_date)
-    try:
-        if "-" in potential_date:
-            day = int(potential_date.split("-")[0])
-            month = potential_date.split("-")[1]
-            year = potential_date.split("-")[2]
-        elif " " in potential_date:
-            day = int(potential_date.split(" ")[0])
-            month = potential_date.split(" ")[1]
-            year = potential_date.split(" ")[2]
-        elif "/" in potential_date:
-            day = int(potential_date.split("/")[0])
-            month = potential_date.split("/")[1]
-            year = potential_date.split("/")[2]   
-        else:
-            raise ValueError("Date format not recognized")
-            
-    except ValueError as ve:
-        warnings.add("Row " + row_num + ": Error - Date (" + potential_date + ") is not recognized as a valid date in the expected format (" + str(ve) + "). Further date checks cannot be carried out.")
-        return (potential_date, warnings)   
+    date, date_string, warning_specs = dp.parse_date(potential_date)
         
-          
-    if len(year) == 2:
-        year = int(year)
-        year += 1900
-    elif len(year) != 4:
-        warnings.add("Row " + row_num + ": Error - Date (" + potential_date + ") is not recognized as within the expected range.")
-        
-    year = int(year)
+    return (date, dp.get_date_warnings(warning_specs, row_num))
+
+
+def date_check_column(potential_dates, row_nums):    
+    ''' Checks a column of dates in one go (see date_check). Each distinct date string is only parsed once.
     
-    if month.isdigit():
-        month_number = int(month)
-    else:
-        try:
-            month_number = datetime.datetime.strptime(month, '%B').month
-        except ValueError as ve:
-            try:
-                month_number = datetime.datetime.strptime(month, '%b').month
-            except ValueError as ve:
-                month_number = 0    
+        Key Arguments:
+            potential_dates - list of strings containing the date values for checking
+            row_nums - list with the number of the row in the source spreadsheet for each date
             
-            warnings.add("Row " + row_num + ": Warning - Month (" + month + ") is not in the expected format.") 
-                    
-    try:
-        date = datetime.datetime(year=year,month=month_number,day=int(day))  
-         
-    except ValueError as ve:
-        warnings.add("Row " + row_num + ": Error - Date (" + potential_date + ") is not recognized as a valid date in the expected format (" + str(ve) + "). Further date checks cannot be carried out.")
-        date = potential_date
-        
-    return (date, warnings)
+        Returns:
+            List with a tuple for each date as returned by date_check
+    '''
+    
+    return [(date, dp.get_date_warnings(warning_specs, row_num)) for (date, date_string, warning_specs), row_num in zip(dp.parse_dates(potential_dates), row_nums)]
             
 
 
@@ -1580,34 +2135,7 @@ def get_similarity_range(values, get_min = True, get_max = True):
             Returns either a number representing either the highest or lowest similarity or a tuple with both lowest and highest values
     '''
     
-    #print("Min: " + str(get_min))
-    #print("Max: " + str(get_max))
-    #print("Checking: " + str(values))
-    
-    flattened_values = []
-    for value in values:
-        if isinstance(value, str) and (value.strip() and value.strip() != "*"):
-            flattened_values.append(value)
-        elif isinstance(value, list):
-            value = [x for x in value if x.strip() and x.strip() != "*"]
-            flattened_values += value
-    
-    values_set = set(flattened_values)
-    
-    if len(values_set) == 1:
-        min = 100
-        max = 100
-    else:
-        max = 0
-        min = 100
-        for i, value1 in enumerate(list(values_set)):
-            for j, value2 in enumerate(list(values_set)):
-                if i != j:
-                    ratio = fuzz.ratio(value1, value2)
-                    if ratio > max:
-                        max = ratio
-                    if ratio < min:
-                        min = ratio
+    min, max = get_similarity_ranges([values])[0]
     
     #print("Min: " + str(min))
     #print("Max: " + str(max))
@@ -1618,8 +2146,97 @@ def get_similarity_range(values, get_min = True, get_max = True):
         return min
     else:
         return max
+
+
+def get_similarity_ranges(value_groups):
+    ''' Gets the lowest and highest similarity between the values in each of a number of groups (e.g. the title, individual name, group name and address values for a farm). Each pair of distinct values in a group is scored once, and if there are at least SIMILARITY_BATCH_THRESHOLD pairs the pairs from all the groups are scored together in a single call to process.cpdist.
+    
+        Keyword arguments:
+            value_groups - list of values for each group, each a list of strings or lists of strings (see get_distinct_values)
+            
+        Outputs:
+            List with a tuple of the lowest and highest similarity for each group. A group with one distinct value gives (100, 100) and a group with none gives (100, 0).
+    '''
+    
+    distinct_groups = [list(get_distinct_values(values)) for values in value_groups]
+    
+    first_values = []
+    second_values = []
+    for distinct_values in distinct_groups:
+        for i in range(0, len(distinct_values)):
+            for j in range(i + 1, len(distinct_values)):
+                first_values.append(distinct_values[i])
+                second_values.append(distinct_values[j])
+    
+    # cpdist takes longer to set up than scoring a few pairs one at a time
+    if len(first_values) >= SIMILARITY_BATCH_THRESHOLD:
+        ratios = process.cpdist(first_values, second_values, scorer=fuzz.ratio, dtype="float64").tolist()
+    else:
+        ratios = [fuzz.ratio(first_value, second_value) for first_value, second_value in zip(first_values, second_values)]
+    
+    similarity_ranges = []
+    pair_start = 0
+    for distinct_values in distinct_groups:
+        if len(distinct_values) == 1:
+            similarity_ranges.append((100, 100))
+        else:
+            pair_end = pair_start + len(distinct_values) * (len(distinct_values) - 1) // 2
+            # 100 and 0 are the values given when there are no pairs to compare
+            similarity_ranges.append((min([100] + ratios[pair_start:pair_end]), max([0] + ratios[pair_start:pair_end])))
+            pair_start = pair_end
+    
+    return similarity_ranges
+
+
+def is_similarity_below(values, threshold):
+    ''' Checks whether any pair of the values is less similar than the threshold. Stops at the first pair that is, and each comparison stops as soon as the pair can't reach the threshold, so it is quicker than get_similarity_range when the lowest similarity itself isn't needed.
+    
+        Keyword arguments:
+            values - list of strings or lists of strings (see get_distinct_values)
+            threshold - number between 0 and 100
+            
+        Outputs:
+            Boolean, True if the similarity of any pair of distinct values is below the threshold
+    '''
+    
+    if threshold <= 0:
+        return False
+    
+    distinct_values = list(get_distinct_values(values))
+    
+    for i in range(0, len(distinct_values)):
+        for j in range(i + 1, len(distinct_values)):
+            # with a score_cutoff fuzz.ratio gives 0 for any pair below the cutoff
+            if fuzz.ratio(distinct_values[i], distinct_values[j], score_cutoff=threshold) == 0:
+                return True
+    
+    return False
+
+
+def get_distinct_values(values):
+    ''' Gets the distinct values to compare for get_similarity_range, leaving out blank values and values of "*"
+    
+        Keyword arguments:
+            values - list of strings or lists of strings (e.g. the group names for each row)
+            
+        Outputs:
+            Set of strings
+    '''
+    
+    flattened_values = []
+    for value in values:
+        if isinstance(value, str) and (value.strip() and value.strip() != "*"):
+            flattened_values.append(value)
+        elif isinstance(value, list):
+            value = [x for x in value if x.strip() and x.strip() != "*"]
+            flattened_values += value
+    
+    return set(flattened_values)
         
   
 
-processing_folder = "processing"
-load_spreadsheet_data(processing_folder)
\ No newline at end of file
+if __name__ == "__main__":
+    # Needed so that the worker processes start correctly in the frozen (PyInstaller) build on Windows
+    multiprocessing.freeze_support()
+    
+    sys.exit(main())
\ No newline at end of file
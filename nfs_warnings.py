@@ -0,0 +1,213 @@
+# Warnings for the QA results
+#
+#   The checks record each problem they find as an NFSWarning with a code, the row number (for the row checks) and the
+#   values that go into the message, rather than as the full text of the message. The text for each code is kept once in
+#   WARNING_TEMPLATES and is only put together when the warning is written out (see output_writers.get_output_values),
+#   so the sets of warnings for each reference hold small objects that share their text and can be counted or filtered
+#   by code or severity without looking at the text.
+#
+#   Severities: Error, Warning, Note
+#   Saved layout (manifest and persistent cache): [code, row, [params]]
+#
+
+# Functions:
+#   make_warning(code, *params, row=None)
+#   get_error_warning(error, row_num)
+#   from_json(value)
+#   count_warnings(warnings)
+#   filter_warnings(warnings, codes=None, severities=None)
+
+# Classes:
+#   NFSWarning(code, row=None, params=())
+#   WarningError(warning)
+
+from collections import Counter
+from dataclasses import dataclass
+
+# Severity and message template for each warning code. {row} is replaced with the row number and {0}, {1}, ... with the params of the warning.
+WARNING_TEMPLATES = {
+    # Filenames (filename_pattern_check, filename_checks, extract_farms_by_box)
+    "FILENAME_COVER_PATTERN": ("Warning", "Row {row}: {0} matches expected cover pattern. Error is this is not a cover."),
+    "FILENAME_PROVISIONAL": ("Warning", "Row {row}: {0} does not match expected pattern. Provisional values have been extracted to use in the reference but their accuracy cannot be guaranteed."),
+    "FILENAME_PATTERN": ("Error", "Row {row}: {0} does not match expected pattern. Further checks on filenames could not be carried out and an accurate reference could not be generated."),
+    "FILENAME_BLANK": ("Error", "Row {row}: Error - Blank filename found. Further checks on the filename could not be carried out and an accurate reference could not be generated."),
+    "FILENAME_MISMATCH": ("Warning", "Row {row}: Mismatch in the file names: {0}, {1}"),
+    "FILENAME_NOT_CONSECUTIVE": ("Warning", "Row {row}: File names ({0} and {1}) are not consecutive"),
+    "FILENAME_SINGLE": ("Warning", "Row {row}: Only one file name given ({0})"),
+    "FILENAME_COVER_TWO": ("Warning", "Row {row}: Type is cover but two file names given ({0})"),
+    "FILENAMES_MISSING": ("Error", "Row {row}: Error - File names missing"),
+    "BOX_SPLIT": ("Warning", "Row {row}: Warning - Rows for box {0} found after the box was completed. These rows have been output separately, with a new reference for any farm already output"),
+    "CHECK_FAILED": ("Error", "{0}"),
+
+    # References (reference_pattern_check, generate_references)
+    "REFERENCE_PATTERN": ("Warning", "Row {row}: {0} does not match expected pattern. Further work with this reference may contain inaccuracies."),
+    "REFERENCE_BLANK": ("Error", "Row {row}: Error - Blank reference found. Further work with this reference could not be carried out and farm information could not be generated."),
+    "ADDITIONAL_NO_PRIMARY": ("Error", "Row {row}: Error - Additional farm but no primary farm given"),
+    "ADDITIONAL_FARMS": ("Warning", "Row {row}: Warning - Additional farms present"),
+    "NO_FARM_NUMBER": ("Note", "Row {row}: Note - type is {0} so no farm number specified"),
+    "COVER_FARM_NUMBER": ("Error", "Row {row}: Error - Type is cover and farm number is specified"),
+
+    # Types, farm numbers and acreage (doc_type_check, add_farm_row)
+    "UNKNOWN_TYPE": ("Error", "Row {row}: Unknown document type ({0}) found."),
+    "MULTIPLE_FORMS": ("Warning", "Row {row}: Warning - Multiple '{0}' forms for {1}"),
+    "FARM_NUMBER_MISMATCH": ("Error", "Row {row}: Error in generated farm number - lettercode/parish number/farm number mismatch"),
+    "MULTIPLE_ACREAGE": ("Warning", "Row {row}: multiple acreage given"),
+
+    # Dates (date_processing, date_check)
+    "MULTIPLE_DATES": ("Warning", "Row {row}: Multiple dates listed."),
+    "PRIMARY_BEFORE_FIELD": ("Error", "Row {row}: Error - Primary Date ({0}) earlier than Field date ({1})"),
+    "DATE_FORMAT": ("Error", "Row {row}: Error - Date ({0}) is not recognized as a valid date in the expected format ({1}). Further date checks cannot be carried out."),
+    "DATE_RANGE": ("Error", "Row {row}: Error - Date ({0}) is not recognized as within the expected range."),
+    "MONTH_FORMAT": ("Warning", "Row {row}: Warning - Month ({0}) is not in the expected format."),
+
+    # Combined farm names, landowners and farmers (get_combined_..._by_ref)
+    "FARM_NAME_ROWS": ("Warning", "Expected 2 rows of data, Got {0}."),
+    "EXPECTED_ROWS": ("Warning", "Expected {0} row of data, Got {1}."),
+    "EXPECTED_ROWS_RANGE": ("Warning", "Expected {0} row of data, Got {1}-{2}."),
+    "ANSWER_COUNT_MISMATCH": ("Warning", "Mismatch in number of expected answers."),
+    "SIMILARITY_BELOW_THRESHOLD": ("Warning", "Warning: Similarity ({0}) below threshold ({1}) for {2}"),
+    "NO_ADDRESSEE": ("Note", "No addressee values given"),
+    "NO_FARMER": ("Note", "No farmer values given"),
+
+    # Names (generate_name)
+    "MULTIPLE_NAMES": ("Error", "Error: multiple names found when one expected"),
+    "NAME_AND_GROUPS": ("Error", "Error: values found in both name ({0}) and groups ({1})"),
+    "MULTIPLE_ADDRESSES": ("Error", "Error: multiple addresses found when one expected"),
+    "GROUP_ADDRESS_COUNT": ("Error", "Error: Length of group names ({0}) and addresses ({1}) different"),
+    "GROUP_NO_ADDRESS": ("Warning", "Warning: No address with {0}"),
+    "ADDRESS_NO_GROUP": ("Warning", "Warning: No group name with {0}"),
+    "GROUP_ADDRESS_VALUES": ("Error", "Error: Expecting lists for group and address values got {0} and {1}. Not able to process"),
+
+    # Normalisation (data_normalisation.component_compare and the functions it calls)
+    "MULTIPLE_VARIATIONS": ("Warning", "Warning: Attempting to combine multiple (>2) variations."),
+    "COMBINING_INITIALS": ("Note", "Note: Combining initial and names."),
+    "COMBINING_VARIATIONS": ("Note", "Note: Combining variations."),
+    "COMBINING_OFFSET_VARIATIONS": ("Note", "Note: Combining multi-length or offset variations."),
+    "SUBSTRING_COUNT": ("Warning", "2. WARNING! - substr_count is > 1 in combine_two_words. This code hasn't been implemented yet!"),
+    "NO_ANCHOR_POINTS": ("Warning", "Could not find any strong anchor points. '{0}' and '{1}' appear to be distinct values."),
+}
+
+
+@dataclass(frozen=True, slots=True)
+class NFSWarning:
+    ''' A warning found by the checks. Warnings with the same code, row and params are equal, so each is only kept once in a set of warnings. str() gives the text of the warning.
+
+        Keyword arguments:
+            code - string with the warning code, one of the keys of WARNING_TEMPLATES
+            row - optional integer with the number of the row in the spreadsheet, None for the warnings from combining the values of a farm
+            params - optional tuple with the values that go into the message
+    '''
+
+    code: str
+    row: int = None
+    params: tuple = ()
+
+    @property
+    def severity(self):
+        ''' The severity of the warning (Error, Warning or Note), from WARNING_TEMPLATES '''
+
+        return WARNING_TEMPLATES[self.code][0]
+
+    def __str__(self):
+        return WARNING_TEMPLATES[self.code][1].format(*[str(param) for param in self.params], row=self.row)
+
+    def to_json(self):
+        ''' Gets the warning in the layout saved in the manifest and the persistent cache
+
+            Returns:
+                List with the code, the row and a list of the params
+        '''
+
+        return [self.code, self.row, list(self.params)]
+
+
+class WarningError(ValueError):
+    ''' ValueError raised by the checks that stop further checks on a value (e.g. filename_pattern_check), carrying the warning to be added. str() gives the text of the warning.
+
+        Keyword arguments:
+            warning - NFSWarning
+    '''
+
+    def __init__(self, warning):
+        super().__init__(str(warning))
+        self.warning = warning
+
+
+def make_warning(code, *params, row=None):
+    ''' Creates a warning
+
+        Keyword Arguments:
+            code - string with the warning code, one of the keys of WARNING_TEMPLATES
+            params - the values that go into the message
+            row - optional integer or string with the number of the row in the spreadsheet
+
+        Returns:
+            NFSWarning. Throws ValueError if the code isn't recognised
+    '''
+
+    if code not in WARNING_TEMPLATES:
+        raise ValueError("Unknown warning code '" + str(code) + "'")
+
+    if row is not None:
+        row = int(row)
+
+    return NFSWarning(code, row, params)
+
+
+def get_error_warning(error, row_num):
+    ''' Gets the warning for a ValueError caught by the checks. Errors raised with a warning (WarningError) give that warning, any other ValueError (e.g. from converting part of a filename to a number) gives a CHECK_FAILED warning with the text of the error.
+
+        Keyword Arguments:
+            error - ValueError
+            row_num - integer or string with the number of the row in the spreadsheet
+
+        Returns:
+            NFSWarning
+    '''
+
+    if isinstance(error, WarningError):
+        return error.warning
+
+    return make_warning("CHECK_FAILED", str(error), row=row_num)
+
+
+def from_json(value):
+    ''' Creates a warning from the layout saved in the manifest and the persistent cache (see NFSWarning.to_json)
+
+        Keyword Arguments:
+            value - list with the code, the row and a list of the params
+
+        Returns:
+            NFSWarning
+    '''
+
+    code, row, params = value
+    return NFSWarning(code, row, tuple(params))
+
+
+def count_warnings(warnings):
+    ''' Counts warnings by code, e.g. to summarise the warnings for a file
+
+        Keyword Arguments:
+            warnings - iterable of NFSWarning
+
+        Returns:
+            collections.Counter with the number of warnings for each code
+    '''
+
+    return Counter(warning.code for warning in warnings)
+
+
+def filter_warnings(warnings, codes=None, severities=None):
+    ''' Gets the warnings with the given codes and/or severities
+
+        Keyword Arguments:
+            warnings - iterable of NFSWarning
+            codes - optional collection of warning codes. If None warnings with any code are kept.
+            severities - optional collection of severities (Error, Warning, Note). If None warnings with any severity are kept.
+
+        Returns:
+            List of NFSWarning
+    '''
+
+    return [warning for warning in warnings if (codes is None or warning.code in codes) and (severities is None or warning.severity in severities)]
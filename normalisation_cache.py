@@ -0,0 +1,270 @@
+# Caches for the results of the data normalisation functions
+#
+#   The same name, title and address variations come up again and again across farms and files so the combined values
+#   and warnings are kept and reused rather than being recalculated each time.
+#
+
+# Classes:
+#   LRUCache(maxsize=10000)
+#       get(key)
+#       put(key, value)
+#       resize(maxsize)
+#       clear()
+#       info()
+#   PersistentCache(path, version, max_entries=100000)
+#       get(key)
+#       put(key, value)
+#       flush()
+#       close()
+#       info()
+
+from collections import OrderedDict
+import hashlib, json, sqlite3, time
+
+
+class LRUCache:
+    ''' Bounded cache that drops the least recently used entry once it is full, and keeps counts of hits, misses and evictions
+
+        Keyword arguments:
+            maxsize - integer with the maximum number of entries to keep. 10000 by default. If 0 nothing is cached.
+    '''
+
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        ''' Gets the value stored for the key and marks it as the most recently used
+
+            Keyword arguments:
+                key - hashable key for the entry
+
+            Returns:
+                The stored value or None if the key is not in the cache
+        '''
+
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return self.entries[key]
+        else:
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        ''' Stores the value for the key, dropping the least recently used entries if the cache is full
+
+            Keyword arguments:
+                key - hashable key for the entry
+                value - value to be stored. Values should not be changed once stored so mutable values should be copied before they are handed out.
+
+            Returns:
+                No return
+        '''
+
+        if self.maxsize <= 0:
+            return
+
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def resize(self, maxsize):
+        ''' Changes the maximum number of entries, dropping the least recently used entries if there are now too many
+
+            Keyword arguments:
+                maxsize - integer with the new maximum number of entries
+
+            Returns:
+                No return
+        '''
+
+        self.maxsize = maxsize
+
+        while len(self.entries) > max(self.maxsize, 0):
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        ''' Removes all the entries and resets the counters
+
+            Returns:
+                No return
+        '''
+
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def info(self):
+        ''' Gets the current counters for the cache
+
+            Returns:
+                Dictionary with the number of hits, misses and evictions and the current and maximum size
+        '''
+
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions, "size": len(self.entries), "maxsize": self.maxsize}
+
+
+class PersistentCache:
+    ''' Cache of normalisation results saved in an SQLite file so that they can be reused by later runs (e.g. when a file is rerun after a few rows have been corrected). 
+    
+        Entries are looked up by a hash of the key and the version of the normalisation code, so results from an older version are never used and are removed when the cache is opened. Once there are more than max_entries the least recently used entries are removed when the cache is flushed.
+
+        Several processes (the file workers and the reference pool) can use the same file at once, so the file is only locked for writing while the cache is flushed. Lookups only read the file. New entries and the times entries were last used are kept in memory and written in one short transaction every FLUSH_THRESHOLD changes and when the cache is flushed or closed.
+
+        Keyword arguments:
+            path - string or path to the SQLite file. Created if it doesn't exist.
+            version - string with the version of the normalisation code the results were created with
+            max_entries - integer with the maximum number of entries to keep. 100000 by default.
+    '''
+
+    # Number of new entries and lookups kept in memory before they are written to the file
+    FLUSH_THRESHOLD = 1000
+
+    def __init__(self, path, version, max_entries=100000):
+        self.path = path
+        self.version = version
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # JSON value by hashed key for the entries added since the last flush
+        self.new_entries = {}
+        # time last used by hashed key for the entries found since the last flush
+        self.used = {}
+        # hashed key by key for the lookups that weren't found, as the result is usually stored once it has been worked out
+        self.missed_keys = {}
+
+        # transactions are started and committed explicitly (isolation_level=None) so the file is never left locked between flushes. A long timeout as other processes may be flushing at the same time.
+        self.connection = sqlite3.connect(str(path), timeout=60, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, version TEXT NOT NULL, value TEXT NOT NULL, last_used REAL NOT NULL)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)")
+        if self.connection.execute("SELECT 1 FROM results WHERE version != ? LIMIT 1", (version,)).fetchone() is not None:
+            self.connection.execute("DELETE FROM results WHERE version != ?", (version,))
+        
+        # number of entries in the file, counted once here and then kept up to date with the entries added by this process
+        self.size = self.connection.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def get(self, key):
+        ''' Gets the value stored for the key and marks it as used. The file is only read, the time it was used is saved when the cache is flushed.
+
+            Keyword arguments:
+                key - key for the entry. Must be made up of values that can be saved as JSON (strings, numbers, booleans, lists and tuples).
+
+            Returns:
+                The stored value (as loaded from JSON so tuples are returned as lists) or None if the key is not in the cache
+        '''
+
+        hashed_key = self.hash_key(key)
+        value = self.new_entries.get(hashed_key)
+
+        if value is None:
+            row = self.connection.execute("SELECT value FROM results WHERE key = ?", (hashed_key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                self.missed_keys[key] = hashed_key
+                return None
+            value = row[0]
+            self.used[hashed_key] = time.time()
+            if len(self.used) + len(self.new_entries) >= self.FLUSH_THRESHOLD:
+                self.flush()
+
+        self.hits += 1
+
+        return json.loads(value)
+
+    def put(self, key, value):
+        ''' Stores the value for the key. The entry is kept in memory and saved to the file when the cache is flushed or closed.
+
+            Keyword arguments:
+                key - key for the entry. Must be made up of values that can be saved as JSON.
+                value - value to be stored. Must be a value that can be saved as JSON.
+
+            Returns:
+                No return
+        '''
+
+        hashed_key = self.missed_keys.pop(key, None)
+        if hashed_key is None:
+            hashed_key = self.hash_key(key)
+
+        self.new_entries[hashed_key] = json.dumps(value)
+        if len(self.used) + len(self.new_entries) >= self.FLUSH_THRESHOLD:
+            self.flush()
+
+    def flush(self):
+        ''' Saves the new entries and the times entries were last used to the file in one transaction, and removes the least recently used entries if there are too many
+
+            Returns:
+                No return
+        '''
+
+        if len(self.new_entries) == 0 and len(self.used) == 0:
+            return
+
+        now = time.time()
+
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            # entries added by another process since they were looked up here are left as they are (they have the same value) and only marked as used
+            cursor = self.connection.executemany("INSERT OR IGNORE INTO results (key, version, value, last_used) VALUES (?, ?, ?, ?)", [(hashed_key, self.version, value, now) for hashed_key, value in self.new_entries.items()])
+            self.size += max(cursor.rowcount, 0)
+            self.connection.executemany("UPDATE results SET last_used = ? WHERE key = ?", [(last_used, hashed_key) for hashed_key, last_used in self.used.items()])
+
+            # the size doesn't include the entries added by other processes, so the file is only counted when this process's count goes over the limit
+            if self.size > self.max_entries:
+                self.size = self.connection.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+                if self.size > self.max_entries:
+                    self.connection.execute("DELETE FROM results WHERE key IN (SELECT key FROM results ORDER BY last_used LIMIT ?)", (self.size - self.max_entries,))
+                    self.evictions += self.size - self.max_entries
+                    self.size = self.max_entries
+
+            self.connection.execute("COMMIT")
+        except BaseException:
+            self.connection.execute("ROLLBACK")
+            raise
+
+        self.new_entries = {}
+        self.used = {}
+        self.missed_keys = {}
+
+    def close(self):
+        ''' Saves any changes and closes the file
+
+            Returns:
+                No return
+        '''
+
+        self.flush()
+        self.connection.close()
+
+    def info(self):
+        ''' Gets the current counters for the cache
+
+            Returns:
+                Dictionary with the number of hits, misses and evictions for this run and the current and maximum number of entries (including those not saved yet)
+        '''
+
+        size = self.connection.execute("SELECT COUNT(*) FROM results").fetchone()[0] + len(self.new_entries)
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions, "size": size, "maxsize": self.max_entries}
+
+    def hash_key(self, key):
+        ''' Creates the hash used to store the entry from the key and the version of the normalisation code
+
+            Keyword arguments:
+                key - key for the entry
+
+            Returns:
+                String with the hex digest of the hash
+        '''
+
+        return hashlib.sha256(json.dumps([self.version, key]).encode("utf-8")).hexdigest()
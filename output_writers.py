@@ -0,0 +1,252 @@
+# Writers for the QA results
+#
+#   Each writer takes the path of the output file and the farm values from extract_farms (or the boxes from
+#   extract_farms_by_box) and saves them with the columns in the order of OUTPUT_HEADINGS. The csv, JSON Lines and
+#   Parquet writers write the farms out as they are received rather than holding the whole file in memory.
+#
+#   Output formats: xlsx, csv, jsonl, parquet (needs pyarrow)
+#
+#   save_output writes the file under a temporary name and moves it into place once it is complete, so a program
+#   reading the output folder never sees a partly written file.
+#
+
+# Functions:
+#   get_output_writer(output_format)
+#   save_output(output_writer, output_file, values)
+#   output_excel(output_file, values)
+#   output_csv(output_file, values)
+#   output_jsonl(output_file, values)
+#   output_parquet(output_file, values, batch_size=1000)
+#   iterate_farm_values(values)
+#   get_output_values(farm_values)
+
+import csv, json, os
+from pathlib import Path
+from farm_records import FarmRecord
+
+# Columns of the output, in order, and their widths in the spreadsheet
+OUTPUT_HEADINGS = ["Reference", "Reference Warnings", "Filenames", "Filename Warnings", "Type", "Type Warnings", "Farm Number", "Farm Number Warnings", "Farm Name", "Farm Name Warnings", "Landowner", "Landowner Warnings", "Farmer", "Farmer Warnings", "Acreage", "Acreage Warnings", "OS Sheet Number", "Field Date", "Field Date Warnings", "Primary Date", "Primary Date Warnings"]
+OUTPUT_COLUMN_WIDTHS = [20, 20, 30, 20, 15, 20, 15, 20, 30, 20, 30, 20, 30, 20,15, 20, 15, 15, 20, 15, 20]
+
+
+def get_output_writer(output_format):
+    ''' Gets the function used to save the QA results in the given format. All the writers take the path of the output file and the farm values.
+
+        Keyword Arguments:
+            output_format - string with the format of the output. One of the keys of OUTPUT_WRITERS (xlsx, csv, jsonl or parquet), which is also used as the file extension
+
+        Returns:
+            Function to write the output. Throws ValueError if the format isn't recognised
+    '''
+
+    if output_format not in OUTPUT_WRITERS:
+        raise ValueError("Unknown output format '" + str(output_format) + "'. Expected one of: " + ", ".join(OUTPUT_WRITERS.keys()))
+
+    return OUTPUT_WRITERS[output_format]
+
+
+def save_output(output_writer, output_file, values):
+    ''' Saves the output with one of the writers. The writer saves a temporary file next to the output file (the output file name with ".tmp" added), which then replaces the output file in one step. If the writer fails the temporary file is removed and any earlier output file is left as it was.
+
+        Keyword Arguments:
+            output_writer - function to write the output (see get_output_writer)
+            output_file - path to the output file
+            values - dictionary of farm values by reference, or an iterable of these dictionaries (see output_excel)
+
+        Returns:
+            No return but throws any exception raised by the writer, or OSError if the output file can't be replaced
+    '''
+
+    temp_file = Path(str(output_file) + ".tmp")
+
+    try:
+        output_writer(temp_file, values)
+        os.replace(temp_file, output_file)
+    except BaseException:
+        temp_file.unlink(missing_ok=True)
+        raise
+
+    print("Saving " + str(output_file))
+
+
+def output_excel(output_file, values):
+    ''' Saves a spreadsheet containing the processed values for QA checking. The spreadsheet is written in openpyxl's write-only mode, one row per farm, so only the current row is held in memory until the file is saved. openpyxl is only imported when a spreadsheet is saved, as it takes longer to import than the rest of the code.
+
+        keyword Arguments:
+            output_file - path to output file
+            values - dictionary of values to be output. The keys are the unique reference for each farm and the values are the FarmRecord for the farm (see farm_records.py) or a dictionary of its values with the column name as the keys. An iterable of these dictionaries (e.g. the boxes from extract_farms_by_box) can also be given and each is written as it is received.
+
+        Outputs:
+            No return but throws OSError if the specified file can't be saved.
+    '''
+
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font, Alignment
+    from openpyxl.utils import get_column_letter
+
+    wb = Workbook(write_only=True)
+    sheet = wb.create_sheet()
+
+    # the styles are set up once on template cells and then shared by all the cells, rather than being looked up in the workbook's style lists for every cell
+    heading_style = WriteOnlyCell(sheet)
+    heading_style.font = Font(bold=True)
+    value_style = WriteOnlyCell(sheet)
+    value_style.alignment = Alignment(wrap_text=True, vertical='top')
+
+    heading_row = []
+    for i in range(0, len(OUTPUT_HEADINGS)):
+        sheet.column_dimensions[get_column_letter(i+1)].width = OUTPUT_COLUMN_WIDTHS[i]
+
+        heading_cell = WriteOnlyCell(sheet, OUTPUT_HEADINGS[i])
+        heading_cell._style = heading_style._style
+        heading_row.append(heading_cell)
+
+    sheet.append(heading_row)
+
+    for ref, farm_values in iterate_farm_values(values):
+        #print(ref + ": " + ", ".join(farm_values))
+        row = [ref]
+
+        for column_values in get_output_values(farm_values):
+            if column_values is not None:
+                value_cell = WriteOnlyCell(sheet, ",\n".join(column_values))
+                value_cell._style = value_style._style
+                row.append(value_cell)
+            else:
+                row.append(None)
+
+        sheet.append(row)
+
+    try:
+        wb.save(output_file)
+    except OSError as e:
+        print("Error in saving spreadsheet: " + str(e))
+        raise
+
+
+def output_csv(output_file, values):
+    ''' Saves a csv file containing the processed values, one row per farm with a heading row. The cells contain the same text as the spreadsheet, with multiple values separated by ",\\n". Each farm is written as soon as it is received.
+
+        Keyword Arguments:
+            output_file - path to output file
+            values - dictionary of farm values by reference, or an iterable of these dictionaries (see output_excel)
+
+        Returns:
+            No return but throws OSError if the specified file can't be saved.
+    '''
+
+    try:
+        with open(output_file, "w", newline='', encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(OUTPUT_HEADINGS)
+
+            for ref, farm_values in iterate_farm_values(values):
+                row = [ref]
+                for column_values in get_output_values(farm_values):
+                    row.append(",\n".join(column_values) if column_values is not None else "")
+                writer.writerow(row)
+
+    except OSError as e:
+        print("Error in saving csv file: " + str(e))
+        raise
+
+
+def output_jsonl(output_file, values):
+    ''' Saves a JSON Lines file containing the processed values. Each line is an object for one farm with the column names as keys, in the same order as the spreadsheet. The reference is a string and the other columns are lists of values (null if the column has no values for the farm). Each farm is written as soon as it is received.
+
+        Keyword Arguments:
+            output_file - path to output file
+            values - dictionary of farm values by reference, or an iterable of these dictionaries (see output_excel)
+
+        Returns:
+            No return but throws OSError if the specified file can't be saved.
+    '''
+
+    try:
+        with open(output_file, "w", encoding="utf-8") as f:
+            for ref, farm_values in iterate_farm_values(values):
+                record = dict(zip(OUTPUT_HEADINGS, [ref] + get_output_values(farm_values)))
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    except OSError as e:
+        print("Error in saving JSON Lines file: " + str(e))
+        raise
+
+
+def output_parquet(output_file, values, batch_size=1000):
+    ''' Saves a Parquet file containing the processed values, with the same columns as the JSON Lines output (the reference as a string and the other columns as lists of strings). The farms are written in row groups of batch_size as they are received. Needs pyarrow, which is only imported when this format is used.
+
+        Keyword Arguments:
+            output_file - path to output file
+            values - dictionary of farm values by reference, or an iterable of these dictionaries (see output_excel)
+            batch_size - optional integer with the number of farms held before they are written. 1000 by default.
+
+        Returns:
+            No return but throws OSError if the specified file can't be saved and ImportError if pyarrow isn't installed
+    '''
+
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError("pyarrow is needed for Parquet output (conda install pyarrow): " + str(e)) from e
+
+    schema = pa.schema([pa.field(OUTPUT_HEADINGS[0], pa.string())] + [pa.field(column, pa.list_(pa.string())) for column in OUTPUT_HEADINGS[1:]])
+
+    try:
+        with pq.ParquetWriter(str(output_file), schema) as writer:
+            columns = [[] for column in OUTPUT_HEADINGS]
+
+            for ref, farm_values in iterate_farm_values(values):
+                for column, value in zip(columns, [ref] + get_output_values(farm_values)):
+                    column.append(value)
+
+                if len(columns[0]) >= batch_size:
+                    writer.write_batch(pa.record_batch(columns, schema=schema))
+                    columns = [[] for column in OUTPUT_HEADINGS]
+
+            if len(columns[0]) > 0:
+                writer.write_batch(pa.record_batch(columns, schema=schema))
+
+    except OSError as e:
+        print("Error in saving Parquet file: " + str(e))
+        raise
+
+
+def iterate_farm_values(values):
+    ''' Gives the farms to be output one at a time, whether they are held in a single dictionary or handed over in batches
+
+        Keyword Arguments:
+            values - dictionary of farm records (see farm_records.py) or nested dictionary of farm values by reference, or an iterable (e.g. a generator) of these dictionaries
+
+        Returns:
+            Generator giving a tuple with the reference and the dictionary of values for each farm, with the column names as the keys
+    '''
+
+    if isinstance(values, dict):
+        values = [values]
+
+    for farm_batch in values:
+        for ref, farm_values in farm_batch.items():
+            # the output column names are only needed here, so the farm records from extract_farms are turned into dictionaries one at a time
+            if isinstance(farm_values, FarmRecord):
+                farm_values = farm_values.to_columns()
+            yield (ref, farm_values)
+
+
+def get_output_values(farm_values):
+    ''' Puts the values for a farm in the order of the output columns (after the reference). The warnings (see nfs_warnings.py) are turned into their text here, so the text of each warning is only put together when it is written out.
+
+        Keyword Arguments:
+            farm_values - dictionary of values for the farm with the column name as the keys
+
+        Returns:
+            List with a list of strings for each column, or None if the farm has no values for that column
+    '''
+
+    return [[str(value) for value in farm_values[column]] if column in farm_values else None for column in OUTPUT_HEADINGS[1:]]
+
+
+# Writers for each output format. The key is also used as the file extension.
+OUTPUT_WRITERS = {"xlsx": output_excel, "csv": output_csv, "jsonl": output_jsonl, "parquet": output_parquet}
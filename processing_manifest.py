@@ -0,0 +1,107 @@
+# Manifest of processed files
+#
+#   Records a hash of each csv file that has been processed and of the values that were combined for each reference
+#   (the farm names, landowner, farmer and addressee details from the rows for that reference), along with the combined
+#   values and warnings. A rerun can then skip the files that haven't changed and, for files that have changed, reuse
+#   the combined values for the references whose rows haven't changed.
+#
+#   Manifest layout (JSON):
+#       {"version": normalisation version,
+#        "files": {csv filename: {"hash": file hash, "output_file": output filename,
+#                                 "references": {details hash: {output column: [values]}}}}}
+#
+#   The warnings columns hold each warning as [code, row, [params]] (see nfs_warnings.NFSWarning.to_json).
+#
+
+# Functions:
+#   load_manifest(manifest_file, version)
+#   save_manifest(manifest_file, manifest)
+#   get_file_hash(csv_file, settings)
+#   get_details_hash(details, version)
+
+import hashlib, json, os
+from pathlib import Path
+
+# Name of the manifest file saved in the output folder
+MANIFEST_FILE = "manifest.json"
+
+
+def load_manifest(manifest_file, version):
+    ''' Loads the manifest from a previous run. If there is no manifest, it can't be read or it was created by a different version of the normalisation code then an empty manifest is returned so that every file is processed in full.
+
+        Keyword Arguments:
+            manifest_file - path to the manifest file
+            version - string with the version of the normalisation code (data_normalisation.ALGORITHM_VERSION)
+
+        Returns:
+            Dictionary with the version and the entry for each file by filename
+    '''
+
+    manifest = {"version": version, "files": {}}
+
+    try:
+        with open(manifest_file, encoding="utf-8") as f:
+            saved_manifest = json.load(f)
+    except FileNotFoundError:
+        return manifest
+    except (OSError, ValueError) as e:
+        print("Error in reading manifest (" + str(manifest_file) + "), all files will be processed: " + str(e))
+        return manifest
+
+    if isinstance(saved_manifest, dict) and saved_manifest.get("version") == version and isinstance(saved_manifest.get("files"), dict):
+        manifest["files"] = saved_manifest["files"]
+
+    return manifest
+
+
+def save_manifest(manifest_file, manifest):
+    ''' Saves the manifest. It is written to a temporary file first and then moved into place so that a run that is stopped part way through doesn't leave a partly written manifest.
+
+        Keyword Arguments:
+            manifest_file - path to the manifest file
+            manifest - dictionary with the manifest values
+
+        Returns:
+            No return but throws OSError if the manifest can't be saved
+    '''
+
+    temp_file = Path(str(manifest_file) + ".tmp")
+
+    with open(temp_file, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False)
+
+    os.replace(temp_file, manifest_file)
+
+
+def get_file_hash(csv_file, settings):
+    ''' Creates a hash of the contents of a csv file and the settings that affect its output (e.g. the output format), so that a file is processed again if either has changed
+
+        Keyword Arguments:
+            csv_file - path to the csv file
+            settings - list of values that affect the output. Must be values that can be saved as JSON.
+
+        Returns:
+            String with the hex digest of the hash. Throws OSError if the file can't be read
+    '''
+
+    file_hash = hashlib.sha256(json.dumps(settings).encode("utf-8"))
+
+    with open(csv_file, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            file_hash.update(chunk)
+
+    return file_hash.hexdigest()
+
+
+def get_details_hash(details, version):
+    ''' Creates a hash of the uncombined values for a reference (the farm names, landowner, farmer and addressee details from its rows) and the version of the normalisation code
+
+        Keyword Arguments:
+            details - dictionary with the uncombined values for the reference
+            version - string with the version of the normalisation code
+
+        Returns:
+            String with the hex digest of the hash
+    '''
+
+    return hashlib.sha256(json.dumps([version, details], sort_keys=True).encode("utf-8")).hexdigest()
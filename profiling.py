@@ -0,0 +1,381 @@
+# Timings and counters for the processing stages
+#
+#   When enabled the functions for each stage are replaced with wrapped versions that record the number of calls and
+#   the wall time spent in them, and the fuzz, process, Indel and difflib modules used by data_normalisation are
+#   replaced with versions that count the calls. Nothing is changed until enable() is called, so there is no cost when
+#   profiling isn't used. The times are inclusive (e.g. the combination passes include the time spent in
+#   data_normalisation) and the CSV read is the time spent getting the next row from the csv reader.
+#
+#   Stages: CSV read, filename_checks, generate_references, date_processing, Farm name combination, Owner combination,
+#           Farmer combination, extract_farms and the output writer (output_excel, output_csv, ...)
+#   Counters: fuzz.ratio (including the comparisons made by process.cdist), process.cdist, Indel.opcodes,
+#             difflib.Differ.compare, difflib.SequenceMatcher
+#
+
+# Functions:
+#   enable(pipeline)
+#   disable()
+#   is_enabled()
+#   reset()
+#   get_report()
+#   print_summary(title="")
+#   save_report(output_file)
+#   get_report_file(output_file)
+#   record_stage(stage, seconds)
+#   count(counter, amount=1)
+#   time_stage(stage, function)
+#   time_rows(rows)
+#   time_rows_argument(function)
+#   counted(counter, function)
+#   counted_cdist(cdist, counted_ratio, ratio)
+#   patch(owner, name, replacement)
+
+# Classes:
+#   CountingModule(module, replacements)
+#   CountingDiffer
+
+import difflib, json, time
+from pathlib import Path
+import data_normalisation as dn
+import output_writers as ow
+
+enabled = False
+
+# Number of calls and total seconds for each stage
+stage_times = {}
+
+# Counts of the calls to the fuzz and difflib functions
+counters = {}
+
+# Original values replaced by enable(), as (owner, name, original) so they can be put back by disable()
+patched = []
+
+# Functions in nfs_document_checks timed for each stage as (function name, stage)
+STAGE_FUNCTIONS = [("filename_checks", "filename_checks"),
+                   ("generate_references", "generate_references"),
+                   ("date_processing", "date_processing"),
+                   ("get_combined_farm_names_by_ref", "Farm name combination"),
+                   ("get_combined_owner_details_by_ref", "Owner combination"),
+                   ("get_combined_farmer_details_by_ref", "Farmer combination")]
+
+
+def enable(pipeline):
+    ''' Replaces the stage functions and the fuzz, process, Indel and difflib modules used by data_normalisation with the timed and counted versions. Does nothing if profiling is already enabled.
+
+        Keyword Arguments:
+            pipeline - the nfs_document_checks module. It is passed in rather than imported as it may be running as __main__.
+
+        Returns:
+            No return
+    '''
+
+    global enabled
+
+    if enabled:
+        return
+
+    for name, stage in STAGE_FUNCTIONS:
+        patch(pipeline, name, time_stage(stage, getattr(pipeline, name)))
+
+    # extract_farms is timed as a whole and the csv rows it is given are timed as the CSV read
+    patch(pipeline, "extract_farms", time_stage("extract_farms", time_rows_argument(pipeline.extract_farms)))
+    patch(pipeline, "extract_farms_by_box", time_rows_argument(pipeline.extract_farms_by_box))
+
+    for output_format, output_writer in list(ow.OUTPUT_WRITERS.items()):
+        timed_writer = time_stage(output_writer.__name__, output_writer)
+        patch(ow.OUTPUT_WRITERS, output_format, timed_writer)
+        if output_writer is pipeline.output_excel:
+            patch(pipeline, "output_excel", timed_writer)
+
+    ratio = dn.fuzz.ratio
+    counted_ratio = counted("fuzz.ratio", ratio)
+    patch(dn, "process", CountingModule(dn.process, {"cdist": counted_cdist(dn.process.cdist, counted_ratio, ratio)}))
+    patch(dn, "fuzz", CountingModule(dn.fuzz, {"ratio": counted_ratio}))
+    patch(dn, "Indel", CountingModule(dn.Indel, {"opcodes": counted("Indel.opcodes", dn.Indel.opcodes)}))
+    patch(dn, "difflib", CountingModule(difflib, {"Differ": CountingDiffer, "SequenceMatcher": counted("difflib.SequenceMatcher", difflib.SequenceMatcher)}))
+
+    enabled = True
+
+
+def disable():
+    ''' Puts back the original functions and modules
+
+        Returns:
+            No return
+    '''
+
+    global enabled
+
+    while len(patched) > 0:
+        owner, name, original = patched.pop()
+        if isinstance(owner, dict):
+            owner[name] = original
+        else:
+            setattr(owner, name, original)
+
+    enabled = False
+
+
+def is_enabled():
+    ''' Checks whether profiling is enabled
+
+        Returns:
+            Boolean, True if enable() has been called
+    '''
+
+    return enabled
+
+
+def reset():
+    ''' Clears the timings and counters, e.g. before each file is processed
+
+        Returns:
+            No return
+    '''
+
+    stage_times.clear()
+    counters.clear()
+
+
+def get_report():
+    ''' Gets the current timings and counters
+
+        Returns:
+            Dictionary with the calls and seconds for each stage and the count for each counter
+    '''
+
+    return {"stages": {stage: dict(values) for stage, values in stage_times.items()}, "counters": dict(counters)}
+
+
+def print_summary(title=""):
+    ''' Prints the current timings and counters as a table
+
+        Keyword Arguments:
+            title - optional string printed above the table (e.g. the name of the file)
+
+        Returns:
+            No return
+    '''
+
+    # tabulate is only imported when a summary is printed so that it doesn't add to the start up time
+    from tabulate import tabulate
+
+    table = [[stage, values["calls"], values["seconds"], values["seconds"] * 1000 / values["calls"] if values["calls"] > 0 else 0] for stage, values in stage_times.items()]
+    table += [[counter, value, None, None] for counter, value in counters.items()]
+
+    if title != "":
+        print("Profile: " + title)
+    print(tabulate(table, headers=["stage/counter", "calls", "seconds", "ms per call"], floatfmt=".3f", tablefmt="grid"))
+
+
+def save_report(output_file):
+    ''' Saves the current timings and counters as JSON next to the output file (see get_report_file)
+
+        Keyword Arguments:
+            output_file - path to the output file the report is for
+
+        Returns:
+            Path to the saved report. Throws OSError if it can't be saved
+    '''
+
+    report_file = get_report_file(output_file)
+
+    with open(report_file, "w", encoding="utf-8") as f:
+        json.dump(get_report(), f, indent=2)
+
+    return report_file
+
+
+def get_report_file(output_file):
+    ''' Gets the path of the JSON report for an output file, e.g. output/file.profile.json for output/file.xlsx
+
+        Keyword Arguments:
+            output_file - path to the output file
+
+        Returns:
+            Path to the report
+    '''
+
+    return Path(output_file).with_suffix(".profile.json")
+
+
+def record_stage(stage, seconds):
+    ''' Adds a call and its time to the totals for the stage
+
+        Keyword Arguments:
+            stage - string with the name of the stage
+            seconds - float with the time taken
+
+        Returns:
+            No return
+    '''
+
+    if stage in stage_times:
+        stage_times[stage]["calls"] += 1
+        stage_times[stage]["seconds"] += seconds
+    else:
+        stage_times[stage] = {"calls": 1, "seconds": seconds}
+
+
+def count(counter, amount=1):
+    ''' Adds to a counter
+
+        Keyword Arguments:
+            counter - string with the name of the counter
+            amount - optional integer to add, 1 by default
+
+        Returns:
+            No return
+    '''
+
+    counters[counter] = counters.get(counter, 0) + amount
+
+
+def time_stage(stage, function):
+    ''' Wraps a function so that each call is recorded against the stage
+
+        Keyword Arguments:
+            stage - string with the name of the stage
+            function - function to be wrapped
+
+        Returns:
+            Wrapped function
+    '''
+
+    def timed_function(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            record_stage(stage, time.perf_counter() - start)
+
+    timed_function.__name__ = function.__name__
+    timed_function.__wrapped__ = function
+    return timed_function
+
+
+def time_rows(rows):
+    ''' Wraps an iterable of csv rows so that the time taken to get each row is recorded as the CSV read stage
+
+        Keyword Arguments:
+            rows - iterable of rows (e.g. from input_rows.read_rows)
+
+        Returns:
+            Generator giving the same rows
+    '''
+
+    iterator = iter(rows)
+
+    while True:
+        start = time.perf_counter()
+        try:
+            row = next(iterator)
+        except StopIteration:
+            record_stage("CSV read", time.perf_counter() - start)
+            return
+        record_stage("CSV read", time.perf_counter() - start)
+        yield row
+
+
+def time_rows_argument(function):
+    ''' Wraps extract_farms or extract_farms_by_box so that the csv rows passed to it are timed (see time_rows)
+
+        Keyword Arguments:
+            function - function taking the csv rows as the first argument
+
+        Returns:
+            Wrapped function
+    '''
+
+    def timed_rows_function(full_csv, *args, **kwargs):
+        return function(time_rows(full_csv), *args, **kwargs)
+
+    timed_rows_function.__name__ = function.__name__
+    timed_rows_function.__wrapped__ = function
+    return timed_rows_function
+
+
+def counted(counter, function):
+    ''' Wraps a function (or class) so that each call is counted
+
+        Keyword Arguments:
+            counter - string with the name of the counter
+            function - function to be wrapped
+
+        Returns:
+            Wrapped function
+    '''
+
+    def counted_function(*args, **kwargs):
+        count(counter)
+        return function(*args, **kwargs)
+
+    counted_function.__name__ = function.__name__
+    counted_function.__wrapped__ = function
+    return counted_function
+
+
+def counted_cdist(cdist, counted_ratio, ratio):
+    ''' Wraps process.cdist so that each call is counted, along with the number of ratios it works out. If the scorer is the counted fuzz.ratio then the original is passed on so that cdist still scores the pairs in compiled code.
+
+        Keyword Arguments:
+            cdist - the original process.cdist function
+            counted_ratio - the counted version of fuzz.ratio
+            ratio - the original fuzz.ratio function
+
+        Returns:
+            Wrapped function
+    '''
+
+    def counted_cdist_function(queries, choices, *args, **kwargs):
+        count("process.cdist")
+        if kwargs.get("scorer") is counted_ratio:
+            kwargs["scorer"] = ratio
+            count("fuzz.ratio", len(queries) * len(choices))
+        return cdist(queries, choices, *args, **kwargs)
+
+    return counted_cdist_function
+
+
+def patch(owner, name, replacement):
+    ''' Replaces a module attribute (or dictionary entry) and keeps the original so that it can be put back by disable()
+
+        Keyword Arguments:
+            owner - module or dictionary
+            name - string with the attribute name or dictionary key
+            replacement - new value
+
+        Returns:
+            No return
+    '''
+
+    if isinstance(owner, dict):
+        patched.append((owner, name, owner[name]))
+        owner[name] = replacement
+    else:
+        patched.append((owner, name, getattr(owner, name)))
+        setattr(owner, name, replacement)
+
+
+class CountingModule:
+    ''' Stands in for a module, giving the replacement for any of the named attributes and the module's own value for everything else
+
+        Keyword arguments:
+            module - the module being replaced
+            replacements - dictionary of replacement values by attribute name
+    '''
+
+    def __init__(self, module, replacements):
+        self._module = module
+        self.__dict__.update(replacements)
+
+    def __getattr__(self, name):
+        return getattr(self._module, name)
+
+
+class CountingDiffer(difflib.Differ):
+    ''' difflib.Differ which counts the calls to compare '''
+
+    def compare(self, a, b):
+        count("difflib.Differ.compare")
+        return super().compare(a, b)
@@ -0,0 +1,422 @@
+# Split the processing of the csv files across several machines
+#
+#   plan - reads the csv files in the processing folder and splits their rows into shards. The rows are grouped by
+#       file and MAF 32 box (the box given by filename_checks, as used for the references) and the groups are shared
+#       out so that each shard has about the same number of rows. Boxes whose rows give the same farm reference (which
+#       extract_farms would put together in one farm) are kept in the same shard, so a reference is never split across
+#       shards. A manifest is saved for each shard with the row numbers it covers, along with a plan of the whole run.
+#   work - processes the rows of one shard through extract_farms, keeping their row numbers from the csv file, and
+#       saves the output values for each farm in a JSON Lines file next to the shard manifest. Each shard can be run on
+#       a different machine as long as it can read the csv files (--processing-folder gives their location there).
+#   merge - checks that every shard has been processed and that each reference only comes from one shard, then puts
+#       the farms for each csv file back in the order of a single run and saves them with the output writers.
+#   local - runs the whole flow on this machine, with a separate process for each shard acting as a node.
+#
+#   The output files are the same as processing the csv files with load_spreadsheet_data.
+#
+#   Shard manifest layout (JSON): {"version": normalisation version, "shard": shard number,
+#                                  "files": {csv filename: {"path": csv path, "hash": file hash, "boxes": [boxes],
+#                                                           "rows": [[first row, last row], ...]}}}
+#   Shard results layout (JSON Lines): {"version": normalisation version, "shard": shard number} on the first line, then
+#                                      {"file": csv filename, "ref": reference, "row": first row, "values": {output column: [values]}}
+#
+#   Usage: python shards.py plan <processing folder> <shard folder> [--shards 4]
+#          python shards.py work <shard manifest> [--processing-folder <folder>]
+#          python shards.py merge <shard folder> <output folder> [--format xlsx]
+#          python shards.py local <processing folder> <shard folder> <output folder> [--shards 4] [--format xlsx]
+#
+
+# Functions:
+#   plan_shards(processing_folder, shard_folder, shard_count=4)
+#   get_row_groups(csv_file)
+#   get_row_ranges(row_nums)
+#   process_shard(shard_file, processing_folder=None)
+#   get_shard_rows(csv_file, row_ranges)
+#   merge_shards(shard_folder, output_folder, output_format="xlsx")
+#   load_shard_results(results_file, version)
+#   run_local(processing_folder, shard_folder, output_folder, shard_count=4, output_format="xlsx")
+#   save_json(json_file, values)
+#   main(argv=None)
+
+import argparse, contextlib, io, json, os, subprocess, sys
+from pathlib import Path
+
+import data_normalisation as dn
+import nfs_document_checks as nfs
+import processing_manifest as pm
+from farm_records import ReferenceAllocator
+from input_rows import read_rows
+from output_writers import get_output_writer, get_output_values, iterate_farm_values, save_output, OUTPUT_HEADINGS, OUTPUT_WRITERS
+
+# Name of the plan saved in the shard folder
+PLAN_FILE = "plan.json"
+
+
+def plan_shards(processing_folder, shard_folder, shard_count=4):
+    ''' Splits the rows of the csv files in the processing folder into shards and saves a manifest for each shard and the plan in the shard folder. The groups of rows (see get_row_groups) are given out largest first, each to the shard with the fewest rows so far.
+
+        Keyword Arguments:
+            processing_folder - path to the folder containing the csv files
+            shard_folder - path to the folder the shard manifests are saved in. Created if it doesn't exist.
+            shard_count - optional integer with the number of shards, 4 by default
+
+        Returns:
+            List of paths to the shard manifests. Throws ValueError if any of the csv files are missing input columns
+    '''
+
+    shard_folder = Path(shard_folder)
+    shard_folder.mkdir(parents=True, exist_ok=True)
+    version = dn.get_algorithm_version()
+
+    plan = {"version": version, "files": {}, "shards": []}
+    shards = [{"version": version, "shard": i + 1, "files": {}} for i in range(0, shard_count)]
+    shard_sizes = [0] * shard_count
+    groups = []
+
+    for csv_file in sorted(Path(processing_folder).glob("*.csv")):
+        print("Planning file:" + csv_file.stem)
+        file_details = {"path": str(csv_file.resolve()), "hash": pm.get_file_hash(csv_file, [version])}
+        plan["files"][csv_file.name] = file_details
+
+        for boxes, row_nums in get_row_groups(csv_file):
+            groups.append((csv_file.name, file_details, boxes, row_nums))
+
+    for csv_filename, file_details, boxes, row_nums in sorted(groups, key=lambda group: len(group[3]), reverse=True):
+        i = shard_sizes.index(min(shard_sizes))
+        shard_sizes[i] += len(row_nums)
+
+        shard_file = shards[i]["files"].setdefault(csv_filename, dict(file_details, boxes=[], rows=[]))
+        shard_file["boxes"] += boxes
+        shard_file["rows"] += get_row_ranges(row_nums)
+
+    shard_files = []
+
+    for shard in shards:
+        for shard_file in shard["files"].values():
+            shard_file["boxes"].sort()
+            shard_file["rows"].sort()
+
+        shard_filename = "shard_" + str(shard["shard"]) + ".json"
+        save_json(Path(shard_folder, shard_filename), shard)
+        plan["shards"].append(shard_filename)
+        shard_files.append(Path(shard_folder, shard_filename))
+        print("Shard " + str(shard["shard"]) + ": " + str(shard_sizes[shard["shard"] - 1]) + " rows from " + str(len(shard["files"])) + " file(s)")
+
+    save_json(Path(shard_folder, PLAN_FILE), plan)
+
+    return shard_files
+
+
+def get_row_groups(csv_file):
+    ''' Groups the rows of a csv file by MAF 32 box. The references for each row are worked out in the same way as add_farm_row (without the suffixes given to repeated references, which add_farm_row drops), and any boxes whose rows give the same reference are put in the same group.
+
+        Keyword Arguments:
+            csv_file - path to the csv file
+
+        Returns:
+            List with a tuple for each group, containing a list of the boxes and a list of the row numbers in the group. Throws ValueError if the file is missing input columns
+    '''
+
+    box_rows = {}
+    ref_boxes = {}
+    # box that each box has been grouped with, following the links until a box is grouped with itself
+    box_groups = {}
+
+    def get_group(box):
+        while box_groups[box] != box:
+            box = box_groups[box]
+        return box
+
+    with open(csv_file, newline='') as f:
+        with contextlib.redirect_stdout(io.StringIO()):
+            for row_num, row in enumerate(read_rows(f), 2):
+                ref_component, filename_warnings = nfs.filename_checks(row.filename_1.strip(), row.filename_2.strip(), row.document_type, str(row_num))
+                box_rows.setdefault(ref_component, []).append(row_num)
+                box_groups.setdefault(ref_component, ref_component)
+
+                farm_refs, ref_warnings = nfs.generate_references(ref_component.replace("-","/"), row.primary_farm_number.strip(), row.additional_farms.strip(), row.document_type.strip(), str(row_num), ReferenceAllocator(()))
+
+                for ref in farm_refs.keys():
+                    ref_box = ref_boxes.setdefault(ref.split("-")[0], ref_component)
+                    if get_group(ref_box) != get_group(ref_component):
+                        box_groups[get_group(ref_box)] = get_group(ref_component)
+
+    groups = {}
+
+    for box, row_nums in box_rows.items():
+        boxes, group_rows = groups.setdefault(get_group(box), ([], []))
+        boxes.append(box)
+        group_rows += row_nums
+
+    return [(boxes, sorted(row_nums)) for boxes, row_nums in groups.values()]
+
+
+def get_row_ranges(row_nums):
+    ''' Gets the runs of consecutive row numbers, to keep the shard manifests short as the rows for a box are usually together
+
+        Keyword Arguments:
+            row_nums - sorted list of integer row numbers
+
+        Returns:
+            List of [first row, last row] for each run
+    '''
+
+    row_ranges = []
+
+    for row_num in row_nums:
+        if len(row_ranges) > 0 and row_ranges[-1][1] == row_num - 1:
+            row_ranges[-1][1] = row_num
+        else:
+            row_ranges.append([row_num, row_num])
+
+    return row_ranges
+
+
+def process_shard(shard_file, processing_folder=None):
+    ''' Processes the rows of a shard and saves the output values for each farm in a JSON Lines file with the same name as the shard manifest. The results file is written under a temporary name and moved into place once it is complete.
+
+        Keyword Arguments:
+            shard_file - path to the shard manifest
+            processing_folder - optional path to the folder containing the csv files on this machine. None by default, in which case the paths in the shard manifest are used.
+
+        Returns:
+            Path to the results file. Throws ValueError if a csv file has changed since the shard was planned and OSError if a csv file can't be read or the results can't be saved
+    '''
+
+    with open(shard_file, encoding="utf-8") as f:
+        shard = json.load(f)
+
+    if shard["version"] != dn.get_algorithm_version():
+        raise ValueError("Shard " + str(shard["shard"]) + " was planned with normalisation version " + str(shard["version"]) + " but this is version " + dn.get_algorithm_version())
+
+    results_file = Path(shard_file).with_suffix(".jsonl")
+    temp_file = Path(str(results_file) + ".tmp")
+    print("Processing shard " + str(shard["shard"]))
+
+    try:
+        with open(temp_file, "w", encoding="utf-8") as results:
+            results.write(json.dumps({"version": shard["version"], "shard": shard["shard"]}) + "\n")
+
+            for csv_filename, file_details in shard["files"].items():
+                csv_file = Path(processing_folder, csv_filename) if processing_folder is not None else Path(file_details["path"])
+
+                if pm.get_file_hash(csv_file, [shard["version"]]) != file_details["hash"]:
+                    raise ValueError(csv_filename + " has changed since the shards were planned")
+
+                print("Processing file:" + csv_file.stem + " (" + str(len(file_details["boxes"])) + " box(es))")
+                row_counts = {}
+
+                with open(csv_file, newline='') as f:
+                    row_nums, rows = get_shard_rows(read_rows(f), file_details["rows"])
+                    farms = nfs.extract_farms(rows, row_nums=row_nums, row_counts=row_counts)
+
+                for ref, farm_values in iterate_farm_values(farms):
+                    values = {column: column_values for column, column_values in zip(OUTPUT_HEADINGS[1:], get_output_values(farm_values)) if column_values is not None}
+                    results.write(json.dumps({"file": csv_filename, "ref": ref, "row": row_counts[ref].row, "values": values}, ensure_ascii=False) + "\n")
+
+        os.replace(temp_file, results_file)
+    except BaseException:
+        temp_file.unlink(missing_ok=True)
+        raise
+
+    print("Saving " + str(results_file))
+
+    return results_file
+
+
+def get_shard_rows(rows, row_ranges):
+    ''' Picks out the rows of a csv file that are in a shard
+
+        Keyword Arguments:
+            rows - iterable of InputRow for every row of the csv file
+            row_ranges - list of [first row, last row] for the rows in the shard, in order
+
+        Returns:
+            Tuple containing a list of the row numbers and a list of the InputRow for the rows in the shard
+    '''
+
+    row_nums = []
+    shard_rows = []
+    range_iterator = iter(row_ranges)
+    row_range = next(range_iterator, None)
+
+    for row_num, row in enumerate(rows, 2):
+        while row_range is not None and row_num > row_range[1]:
+            row_range = next(range_iterator, None)
+
+        if row_range is None:
+            break
+
+        if row_num >= row_range[0]:
+            row_nums.append(row_num)
+            shard_rows.append(row)
+
+    return (row_nums, shard_rows)
+
+
+def merge_shards(shard_folder, output_folder, output_format="xlsx"):
+    ''' Combines the results of the shards into an output file for each csv file in the plan. The farms are put in the order of their first row, which is the order extract_farms gives for the whole file.
+
+        Keyword Arguments:
+            shard_folder - path to the folder with the plan, shard manifests and shard results
+            output_folder - path to the folder the output files are saved in
+            output_format - optional string with the format of the output files, "xlsx" by default (see output_writers.py)
+
+        Returns:
+            List of paths to the output files. Throws ValueError if the output format isn't recognised, a shard hasn't been processed, the shards were processed with a different normalisation version or a reference is found in more than one shard
+    '''
+
+    output_writer = get_output_writer(output_format)
+
+    with open(Path(shard_folder, PLAN_FILE), encoding="utf-8") as f:
+        plan = json.load(f)
+
+    missing_results = [shard_filename for shard_filename in plan["shards"] if not Path(shard_folder, shard_filename).with_suffix(".jsonl").exists()]
+    if len(missing_results) > 0:
+        raise ValueError("Shard(s) not processed yet: " + ", ".join(missing_results))
+
+    file_farms = {csv_filename: {} for csv_filename in plan["files"].keys()}
+    ref_shards = {}
+
+    for shard_filename in plan["shards"]:
+        for farm in load_shard_results(Path(shard_folder, shard_filename).with_suffix(".jsonl"), plan["version"]):
+            farm_key = (farm["file"], farm["ref"])
+            if farm_key in ref_shards:
+                raise ValueError("Reference " + farm["ref"] + " for " + farm["file"] + " found in both " + ref_shards[farm_key] + " and " + shard_filename + ". Plan the shards again.")
+
+            ref_shards[farm_key] = shard_filename
+            file_farms[farm["file"]][farm["ref"]] = farm
+
+    output_files = []
+
+    for csv_filename, farms in file_farms.items():
+        # the farms from each shard are already in the order of their first row, and a row's farms are all in the same shard, so a stable sort keeps the order extract_farms gives
+        farm_values = {farm["ref"]: farm["values"] for farm in sorted(farms.values(), key=lambda farm: farm["row"])}
+        output_file = Path(output_folder, Path(csv_filename).stem + "." + output_format)
+        save_output(output_writer, output_file, farm_values)
+        output_files.append(output_file)
+
+    return output_files
+
+
+def load_shard_results(results_file, version):
+    ''' Reads the farms from the results of a shard
+
+        Keyword Arguments:
+            results_file - path to the shard results (JSON Lines)
+            version - string with the normalisation version of the plan
+
+        Returns:
+            Generator giving a dictionary with the file, reference, first row and output values of each farm. Throws ValueError if the shard was processed with a different normalisation version
+    '''
+
+    with open(results_file, encoding="utf-8") as f:
+        header = json.loads(f.readline())
+
+        if header["version"] != version:
+            raise ValueError(Path(results_file).name + " was processed with normalisation version " + str(header["version"]) + " but the plan is for version " + str(version))
+
+        for line in f:
+            yield json.loads(line)
+
+
+def run_local(processing_folder, shard_folder, output_folder, shard_count=4, output_format="xlsx"):
+    ''' Runs the plan, work and merge steps on this machine, with each shard processed at the same time in its own python process as if on a separate machine
+
+        Keyword Arguments:
+            processing_folder - path to the folder containing the csv files
+            shard_folder - path to the folder for the shard manifests and results
+            output_folder - path to the folder the output files are saved in
+            shard_count - optional integer with the number of shards (and processes), 4 by default
+            output_format - optional string with the format of the output files, "xlsx" by default
+
+        Returns:
+            List of paths to the output files. Throws ValueError if any of the shards fail (see merge_shards)
+    '''
+
+    get_output_writer(output_format)
+    shard_files = plan_shards(processing_folder, shard_folder, shard_count)
+    workers = [subprocess.Popen([sys.executable, str(Path(__file__).resolve()), "work", str(shard_file)]) for shard_file in shard_files]
+
+    failed_shards = [shard_file.name for shard_file, worker in zip(shard_files, workers) if worker.wait() != 0]
+    if len(failed_shards) > 0:
+        raise ValueError("Shard(s) failed: " + ", ".join(failed_shards))
+
+    return merge_shards(shard_folder, output_folder, output_format)
+
+
+def save_json(json_file, values):
+    ''' Saves a shard manifest or plan. It is written to a temporary file first and then moved into place (see processing_manifest.save_manifest).
+
+        Keyword Arguments:
+            json_file - path to the file
+            values - dictionary to save
+
+        Returns:
+            No return but throws OSError if the file can't be saved
+    '''
+
+    temp_file = Path(str(json_file) + ".tmp")
+
+    with open(temp_file, "w", encoding="utf-8") as f:
+        json.dump(values, f, ensure_ascii=False)
+
+    os.replace(temp_file, json_file)
+
+
+def main(argv=None):
+    ''' Runs one of the steps from the command line (see the usage at the top of the file)
+
+        Keyword Arguments:
+            argv - optional list of command line arguments. None by default, in which case sys.argv is used
+
+        Returns:
+            Integer exit code, 1 if the step failed otherwise 0
+    '''
+
+    parser = argparse.ArgumentParser(description="Split the processing of the csv files in a processing folder across several machines")
+    steps = parser.add_subparsers(dest="step", required=True)
+
+    plan_parser = steps.add_parser("plan", help="split the rows of the csv files into shards")
+    plan_parser.add_argument("processing_folder", help="folder containing the csv files")
+    plan_parser.add_argument("shard_folder", help="folder the shard manifests are saved in")
+    plan_parser.add_argument("--shards", type=int, default=4, help="number of shards (4 by default)")
+
+    work_parser = steps.add_parser("work", help="process one shard")
+    work_parser.add_argument("shard_file", help="shard manifest (shard_<n>.json)")
+    work_parser.add_argument("--processing-folder", help="folder containing the csv files on this machine, if not at the paths in the shard manifest")
+
+    merge_parser = steps.add_parser("merge", help="combine the results of the shards into the output files")
+    merge_parser.add_argument("shard_folder", help="folder with the shard manifests and results")
+    merge_parser.add_argument("output_folder", help="folder the output files are saved in. Created if it doesn't exist.")
+    merge_parser.add_argument("-f", "--format", choices=list(OUTPUT_WRITERS.keys()), default="xlsx", help="format of the output files (xlsx by default)")
+
+    local_parser = steps.add_parser("local", help="plan, process and merge the shards on this machine, with a process for each shard")
+    local_parser.add_argument("processing_folder", help="folder containing the csv files")
+    local_parser.add_argument("shard_folder", help="folder for the shard manifests and results")
+    local_parser.add_argument("output_folder", help="folder the output files are saved in. Created if it doesn't exist.")
+    local_parser.add_argument("--shards", type=int, default=4, help="number of shards and processes (4 by default)")
+    local_parser.add_argument("-f", "--format", choices=list(OUTPUT_WRITERS.keys()), default="xlsx", help="format of the output files (xlsx by default)")
+
+    args = parser.parse_args(argv)
+
+    try:
+        if args.step == "plan":
+            plan_shards(args.processing_folder, args.shard_folder, args.shards)
+        elif args.step == "work":
+            process_shard(args.shard_file, args.processing_folder)
+        elif args.step == "merge":
+            Path(args.output_folder).mkdir(parents=True, exist_ok=True)
+            merge_shards(args.shard_folder, args.output_folder, args.format)
+        else:
+            Path(args.output_folder).mkdir(parents=True, exist_ok=True)
+            run_local(args.processing_folder, args.shard_folder, args.output_folder, args.shards, args.format)
+    except (OSError, ValueError) as e:
+        print("Error in " + args.step + ": " + str(e))
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())